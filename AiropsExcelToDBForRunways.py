@@ -1,18 +1,29 @@
+import argparse
+import logging
 import os
 import sqlite3
+import sys
 import pandas as pd
 
+from airops_common import (
+    CHANGED, INSERTED, KEY_SEP, RejectLog, apply_delta, classify_rows, ensure_fingerprint_table, has_ident,
+    insert_sql, log_delta, map_excel_columns, read_excel_cached, record_fingerprints, row_hashes, row_keys,
+    stream_into_table, usable_rows,
+)
 
-def create_runway_table_schema(db_path: str, table_name: str):
-    if os.path.exists(db_path):
-        os.remove(db_path)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+# Columns identifying one runway, backed by a unique index for upserts
+RUNWAY_KEY_COLS = ["LandingFacilityIcaoIdentifier", "RunwayIdentifier"]
+
+# Rows per executemany batch in streaming mode
+CHUNK_ROWS = 5000
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
 
+def runway_table_sql(table_name: str) -> str:
     # SQL schema for the Runways table (you can update this if the schema changes)
-    create_sql = f"""
-    CREATE TABLE "{table_name}" (
+    return f"""
+    CREATE TABLE IF NOT EXISTS "{table_name}" (
         _id INTEGER PRIMARY KEY,
         RecordType TEXT,
         CustomerAreaCode TEXT,
@@ -52,46 +63,172 @@ def create_runway_table_schema(db_path: str, table_name: str):
         CycleDate TEXT
     );
     """
-    cursor.execute(create_sql)
+
+
+def create_runway_table_schema(db_path: str, table_name: str):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(runway_table_sql(table_name))
     conn.commit()
     conn.close()
     print(f"✅ Created new DB and table: {db_path}")
 
 
-def insert_excel_to_runway_table(
+def mapped_columns(df: pd.DataFrame, table_columns: list, column_mapping: dict) -> list:
+    return [db_col for excel_col, db_col in column_mapping.items()
+            if excel_col in df.columns and db_col in table_columns]
+
+
+def ensure_runway_key_index(conn: sqlite3.Connection, table_name: str):
+    key = ", ".join(RUNWAY_KEY_COLS)
+    try:
+        conn.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS "{table_name}_runway_key" ON "{table_name}" ({key})')
+    except sqlite3.IntegrityError:
+        # e.g. a DB filled by the old append-only import; which copy to keep is not ours to decide
+        dups = conn.execute(
+            f'SELECT {key}, COUNT(*) FROM "{table_name}" GROUP BY {key} HAVING COUNT(*) > 1'
+        ).fetchall()
+        examples = ", ".join(f"{a}/{r} ({n}x)" for a, r, n in dups[:5])
+        raise sqlite3.IntegrityError(
+            f"'{table_name}' holds {len(dups)} runways more than once, e.g. {examples}; "
+            f"remove the extra rows or rebuild the DB without --incremental/--upsert"
+        ) from None
+
+
+def upsert_sql(table_name: str, columns: list) -> str:
+    # Only the given columns are overwritten; anything filled in later (e.g. declination) is kept
+    updates = ", ".join(f'"{c}" = excluded."{c}"' for c in columns if c not in RUNWAY_KEY_COLS)
+    action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+    return f'{insert_sql(table_name, columns)} ON CONFLICT ({", ".join(RUNWAY_KEY_COLS)}) {action}'
+
+
+def upsert_rows(conn: sqlite3.Connection, table_name: str, rows: pd.DataFrame) -> int:
+    """Returns the number of rows inserted or updated."""
+    return conn.executemany(
+        upsert_sql(table_name, list(rows.columns)),
+        rows.astype(object).where(rows.notna(), None).itertuples(index=False, name=None)
+    ).rowcount
+
+
+def sync_excel_to_runway_table(
     excel_path: str,
     db_path: str,
     table_name: str,
     column_mapping: dict
 ):
-    df = pd.read_excel(excel_path)
+    """
+    Apply only the runways inserted, changed or deleted in the sheet since the
+    last sync; into a fresh table this is the full import, in sheet order.
+    Rows without a runway key or repeating an earlier one go to the audit table.
+    """
+    df = read_excel_cached(excel_path)
 
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    conn.execute(runway_table_sql(table_name))
+    ensure_runway_key_index(conn, table_name)
+    table_columns = [col[1] for col in conn.execute(f"PRAGMA table_info('{table_name}')")]
 
-    # Get table column names
-    cursor.execute(f"PRAGMA table_info('{table_name}')")
-    table_columns = [col[1] for col in cursor.fetchall()]
+    # _id is left to SQLite so new rows never collide with existing ones
+    db_df = map_excel_columns(df, table_columns, column_mapping).drop(columns="_id")
+    cols = mapped_columns(df, table_columns, column_mapping)
+    counts = apply_delta(
+        conn, os.path.basename(excel_path), table_name, db_df, db_df[RUNWAY_KEY_COLS], RUNWAY_KEY_COLS,
+        lambda c, rows: upsert_rows(c, table_name, rows[cols])
+    )
+    conn.commit()
+    conn.close()
+
+    log_delta(counts)
+
+
+def upsert_excel_to_runway_table(
+    excel_path: str,
+    db_path: str,
+    table_name: str,
+    column_mapping: dict
+):
+    """
+    Insert the sheet's runways into the existing table, or update them in place
+    when the (airport, runway) key is already there. Runways not in the sheet are
+    left alone. The workbook is still read and hashed in full, but only rows
+    whose row fingerprint differs from the last import of the same workbook
+    (sync or upsert) are written, so the database work follows the delta.
+    Rows without a full key or repeating an earlier one go to the audit table.
+    """
+    df = read_excel_cached(excel_path)
+    source = os.path.basename(excel_path)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute(runway_table_sql(table_name))
+    ensure_runway_key_index(conn, table_name)
+    ensure_fingerprint_table(conn)
+    table_columns = [col[1] for col in conn.execute(f"PRAGMA table_info('{table_name}')")]
+
+    # Hashed like sync_excel_to_runway_table's rows, so either mode recognises the other's import
+    db_df = map_excel_columns(df, table_columns, column_mapping).drop(columns="_id")
+    cols = mapped_columns(df, table_columns, column_mapping)
 
-    # Create an empty DataFrame with all columns
-    db_df = pd.DataFrame(columns=table_columns)
+    # A row without a full key could never be matched again; a repeated key would be upserted twice
+    audit = RejectLog(source)
+    keys = row_keys(db_df[RUNWAY_KEY_COLS])
+    shown = keys.str.replace(KEY_SEP, '/')
+    partial = db_df[RUNWAY_KEY_COLS].isna().any(axis=1) & has_ident(keys)
+    audit.add_mask(partial, shown, shown, 'key', 'missing key, row skipped')
+    usable = pd.Series(False, index=db_df.index)
+    usable[~partial] = usable_rows(keys[~partial], audit)
 
-    # Fill mapped columns
-    for excel_col, db_col in column_mapping.items():
-        if excel_col in df.columns and db_col in table_columns:
-            db_df[db_col] = df[excel_col]
+    fingerprints = classify_rows(conn, source, keys[usable], row_hashes(db_df[usable]))
+    todo = fingerprints[fingerprints['Status'].isin([INSERTED, CHANGED])].sort_values('Row')
+    rows = db_df.loc[todo['Row'].astype(int).tolist(), cols]
 
-    # Fill missing columns with NULL (pd.NA)
-    db_df = db_df.fillna(value=pd.NA)
+    # New rows get rowids above the current maximum, so finding them is a range scan of the delta
+    last = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table_name}"').fetchone()[0]
+    upserted = upsert_rows(conn, table_name, rows)
+    added = pd.read_sql_query(
+        f'SELECT rowid AS TargetRowid, {", ".join(RUNWAY_KEY_COLS)} FROM "{table_name}" WHERE rowid > ?',
+        conn, params=(last,)
+    )
+    # Only rows an import inserted are owned by it; updating a runway does not make it ours
+    owned = dict(zip(row_keys(added[RUNWAY_KEY_COLS]), added['TargetRowid']))
+    record_fingerprints(conn, source, todo['RowKey'], todo['RowHash'], [
+        owned.get(key) if pd.isna(stored) else stored for key, stored in zip(todo['RowKey'], todo['TargetRowid'])
+    ])
+    audit.flush(conn)
+    conn.commit()
+    conn.close()
 
-    # Add _id column (primary key)
-    db_df["_id"] = range(1, len(db_df) + 1)
+    inserted = len(added)
+    print(f"✅ Upserted {len(rows)} rows into '{table_name}': {inserted} inserted, {upserted - inserted} updated, "
+          f"{int(usable.sum()) - len(rows)} unchanged"
+          f"{f', {len(df) - int(usable.sum())} rejected' if len(df) > usable.sum() else ''}")
 
-    # Insert into SQLite
-    db_df.to_sql(table_name, conn, if_exists='append', index=False)
+
+def stream_excel_to_runway_table(
+    excel_path: str,
+    db_path: str,
+    table_name: str,
+    column_mapping: dict,
+    chunk_rows: int = CHUNK_ROWS
+):
+    """
+    Insert every row of the sheet through excel_loader.stream_into_table, in
+    ``chunk_rows`` batches inside one transaction, so memory stays flat whatever
+    the sheet size. Rows without a runway key or repeating an earlier one go to
+    the audit table, as in the sync mode.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute(runway_table_sql(table_name))
+    db_columns = [col[1] for col in conn.execute(f"PRAGMA table_info('{table_name}')") if col[1] != "_id"]
+    with conn:
+        total, read = stream_into_table(conn, excel_path, table_name, column_mapping, db_columns,
+                                        RUNWAY_KEY_COLS, chunk_rows)
+        ensure_runway_key_index(conn, table_name)
     conn.close()
 
-    print(f"✅ Inserted {len(db_df)} rows into '{table_name}'")
+    print(f"✅ Streamed {total} rows into '{table_name}' ({read - total} rows rejected)")
 
 
 # ============================
@@ -99,6 +236,15 @@ def insert_excel_to_runway_table(
 # ============================
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the runway table from an Airops Excel export")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep the existing DB and apply only the rows changed since the last run")
+    parser.add_argument("--stream", action="store_true",
+                        help="rebuild by streaming the sheet in fixed-size chunks (flat memory for very large sheets)")
+    parser.add_argument("--upsert", action="store_true",
+                        help="keep the existing DB and insert or update the sheet's runways; others are untouched")
+    args = parser.parse_args()
+
     # Input Excel file path
     excel_path = os.path.expanduser("~/Desktop/Runways.xlsx")
 
@@ -123,6 +269,18 @@ if __name__ == "__main__":
         "Gradient": "RunwayGradient"
     }
 
-    # Run process
-    create_runway_table_schema(db_path, table_name)
-    insert_excel_to_runway_table(excel_path, db_path, table_name, column_mapping)
+    # Run process; a full rebuild is a sync into a fresh DB, so it records fingerprints too
+    try:
+        if args.upsert:
+            upsert_excel_to_runway_table(excel_path, db_path, table_name, column_mapping)
+        elif args.stream:
+            create_runway_table_schema(db_path, table_name)
+            stream_excel_to_runway_table(excel_path, db_path, table_name, column_mapping)
+        else:
+            if not args.incremental:
+                create_runway_table_schema(db_path, table_name)
+            sync_excel_to_runway_table(excel_path, db_path, table_name, column_mapping)
+    except sqlite3.IntegrityError as e:
+        # Raised by ensure_runway_key_index on a DB that already holds duplicate runways
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
@@ -1,17 +1,22 @@
+import argparse
+import logging
 import sqlite3
 import pandas as pd
 import os
 
-def create_database_with_schema(db_path: str, table_name: str):
-    # Delete the file if it already exists
-    if os.path.exists(db_path):
-        os.remove(db_path)
+from airops_common import apply_delta, insert_sql, log_delta, map_excel_columns, read_excel_cached, stream_into_table
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+# Column identifying one airport
+AIRPORT_KEY_COLS = ["LandingFacilityIcaoIdentifier"]
 
-    create_table_sql = f"""
-    CREATE TABLE "{table_name}" (
+# Rows per executemany batch in streaming mode
+CHUNK_ROWS = 5000
+
+def airport_table_sql(table_name: str) -> str:
+    return f"""
+    CREATE TABLE IF NOT EXISTS "{table_name}" (
         _id INTEGER PRIMARY KEY,
         RecordType TEXT,
         CustomerAreaCode TEXT,
@@ -49,51 +54,89 @@ def create_database_with_schema(db_path: str, table_name: str):
         Declination REAL
     );
     """
-    cursor.execute(create_table_sql)
+
+def create_database_with_schema(db_path: str, table_name: str):
+    # Delete the file if it already exists
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(airport_table_sql(table_name))
     conn.commit()
     conn.close()
     print(f"📦 Created new database and table at: {db_path}")
 
 
-def insert_excel_to_sqlite(
+def insert_rows(conn: sqlite3.Connection, table_name: str, rows: pd.DataFrame):
+    conn.executemany(
+        insert_sql(table_name, list(rows.columns)),
+        rows.astype(object).where(rows.notna(), None).itertuples(index=False, name=None)
+    )
+
+
+def sync_excel_to_sqlite(
     excel_path: str,
     db_path: str,
     table_name: str,
     column_mapping: dict
 ):
-    df = pd.read_excel(excel_path)
+    """
+    Apply only the airports inserted, changed or deleted in the sheet since the
+    last sync; into a fresh table this is the full import, in sheet order.
+    Rows without an airport ident or repeating an earlier one go to the audit table.
+    """
+    df = read_excel_cached(excel_path)
 
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Get all columns from the table
-    cursor.execute(f"PRAGMA table_info('{table_name}')")
-    table_info = cursor.fetchall()
-    db_columns = [col[1] for col in table_info]
-
-    # Prepare the DataFrame for insert
-    db_df = pd.DataFrame(columns=db_columns)
-
-    # Fill mapped columns
-    for excel_col, db_col in column_mapping.items():
-        if excel_col in df.columns and db_col in db_columns:
-            db_df[db_col] = df[excel_col]
+    conn.execute(airport_table_sql(table_name))
+    db_columns = [col[1] for col in conn.execute(f"PRAGMA table_info('{table_name}')")]
+
+    # _id is left to SQLite so new rows never collide with existing ones
+    db_df = map_excel_columns(df, db_columns, column_mapping).drop(columns="_id")
+    counts = apply_delta(
+        conn, os.path.basename(excel_path), table_name, db_df, db_df[AIRPORT_KEY_COLS], AIRPORT_KEY_COLS,
+        lambda c, rows: insert_rows(c, table_name, rows)
+    )
+    conn.commit()
+    conn.close()
 
-    # Assign default None to remaining columns (already defaulted)
-    db_df = db_df.fillna(value=pd.NA)
+    log_delta(counts)
 
-    # Auto-generate _id as row index + 1
-    db_df["_id"] = range(1, len(db_df) + 1)
 
-    # Insert into the database
-    db_df.to_sql(table_name, conn, if_exists='append', index=False)
+def stream_excel_to_sqlite(
+    excel_path: str,
+    db_path: str,
+    table_name: str,
+    column_mapping: dict,
+    chunk_rows: int = CHUNK_ROWS
+):
+    """
+    Insert every row of the sheet through excel_loader.stream_into_table, in
+    ``chunk_rows`` batches inside one transaction, so memory stays flat whatever
+    the sheet size. Rows without an airport ident or repeating an earlier one go to
+    the audit table, as in the sync mode.
+    """
+    conn = sqlite3.connect(db_path)
+    conn.execute(airport_table_sql(table_name))
+    db_columns = [col[1] for col in conn.execute(f"PRAGMA table_info('{table_name}')") if col[1] != "_id"]
+    with conn:
+        total, read = stream_into_table(conn, excel_path, table_name, column_mapping, db_columns,
+                                        AIRPORT_KEY_COLS, chunk_rows)
     conn.close()
 
-    print(f"✅ Inserted {len(db_df)} rows into '{table_name}' successfully.")
+    print(f"✅ Streamed {total} rows into '{table_name}' ({read - total} rows rejected)")
 
 
 # === USAGE ===
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the airport table from an Airops Excel export")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep the existing DB and apply only the rows changed since the last run")
+    parser.add_argument("--stream", action="store_true",
+                        help="rebuild by streaming the sheet in fixed-size chunks (flat memory for very large sheets)")
+    args = parser.parse_args()
+
     # Customize these paths
     excel_file_path = os.path.expanduser("~/Desktop/Airports.xlsx")
     sqlite_db_path = os.path.expanduser("~/Desktop/output_new.db")
@@ -111,6 +154,11 @@ if __name__ == "__main__":
         "Transition Level": "TransitionLevel"
     }
 
-    # Create DB and insert data
-    create_database_with_schema(sqlite_db_path, table_name)
-    insert_excel_to_sqlite(excel_file_path, sqlite_db_path, table_name, column_mapping)
+    # Create DB and insert data; a full rebuild is a sync into a fresh DB, so it records fingerprints too
+    if args.stream:
+        create_database_with_schema(sqlite_db_path, table_name)
+        stream_excel_to_sqlite(excel_file_path, sqlite_db_path, table_name, column_mapping)
+    else:
+        if not args.incremental:
+            create_database_with_schema(sqlite_db_path, table_name)
+        sync_excel_to_sqlite(excel_file_path, sqlite_db_path, table_name, column_mapping)
@@ -1,9 +1,14 @@
+import argparse
 import pandas as pd
 import sqlite3
 import os
 import logging
-import re
-from typing import Optional, Tuple
+
+from coordinates import as_optional, dms_to_decimal_series, normalize_dms_series
+from audit_log import Progress, RejectLog
+from excel_loader import load_embedded_csv, log_rejected
+from row_fingerprints import apply_delta, log_delta
+from navaid_dedup import EMPTY, EXACT, DEGMIN, NEW, DuplicateIndex, NavaidColumns, classify_navaids
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
@@ -17,177 +22,136 @@ KEY_COLS = {
     'name':      'name',
 }
 
-# Regex to parse DMS: allow N, S, E, or W, e.g. “N 52° 04' 28.00"
-DMS_RE = re.compile(
-    r"""^\s*([NSEW])\s*    # Hemisphere
-        (\d+)[°\s]+       # Degrees
-        (\d+)[\'\s]+      # Minutes
-        ([0-9.]+)"?       # Seconds
-        \s*$""",
-    re.VERBOSE
-)
-
-def normalize_dms_string(dms_str: str) -> Optional[str]:
-    """Strip everything except the hemisphere letter and digits."""
-    if not dms_str:
-        return None
-    norm = re.sub(r'[^A-Za-z0-9]', '', dms_str)
-    return norm or None
-
-def dms_to_decimal(dms_str: str) -> Optional[float]:
-    """Convert a DMS string to decimal degrees."""
-    if not dms_str:
-        return None
-    m = DMS_RE.match(dms_str)
-    if not m:
-        return None
-    hemi, deg, mins, secs = m.groups()
-    dd = float(deg) + float(mins) / 60 + float(secs) / 3600
-    return -dd if hemi in ('S', 'W') else dd
-
-def deg_min(value: float) -> Tuple[int, int]:
-    """Return (degrees, minutes) from a decimal-degree value."""
-    a = abs(value)
-    d = int(a)
-    m = int((a - d) * 60)
-    return d, m
-
-def load_excel(excel_path: str) -> pd.DataFrame:
-    """Read and normalize the Excel data."""
-    raw = pd.read_excel(excel_path, header=None, dtype=str)
-    header = raw.iloc[0, 0]
-    cols = [c.strip().strip('"').strip("'") for c in header.split(',')]
-    records = []
-    for i in range(1, len(raw)):
-        line = raw.iloc[i, 0]
-        if pd.isna(line):
-            continue
-        vals = [v.strip().strip('"').strip("'") for v in str(line).split(',')]
-        if len(vals) != len(cols):
-            logging.warning(f"Skipping malformed row {i+1}: expected {len(cols)} values but got {len(vals)}")
-            continue
-        records.append(vals)
-    df = pd.DataFrame(records, columns=cols)
-    df.columns = [c.lower().strip() for c in df.columns]
-    return df
-
-def merge_into_sqlite(df: pd.DataFrame, db_path: str):
-    table = 'primary_D_B_base_Navaid - NDB Navaid'
-    conn = sqlite3.connect(db_path, timeout=30)
-    conn.execute('PRAGMA busy_timeout = 30000;')
-    cursor = conn.cursor()
+NDB_TABLE = 'primary_D_B_base_Navaid - NDB Navaid'
+NDB_COLS = NavaidColumns('NDBIdentifier', 'NDBLatitude', 'NDBLongitude',
+                         'NDBLatitude_WGS84', 'NDBLongitude_WGS84')
+SOURCE = 'ndb.xlsx'
 
+def prepare_ndb(df: pd.DataFrame) -> dict:
+    """Normalised and decimal coordinates of the sheet, aligned with ``df``; needs no database."""
     # Ensure required columns exist
     for key, col in KEY_COLS.items():
         if col not in df.columns:
             raise KeyError(f"Missing column '{col}' (available: {df.columns.tolist()})")
 
-    total = skipped_empty = skipped_exact = skipped_degmin = inserted = 0
-
-    for _, row in df.iterrows():
-        total += 1
-        ndb_id = row[KEY_COLS['id']] or ''
-        if not ndb_id:
-            skipped_empty += 1
-            logging.warning("Skipping row with empty ID")
-            continue
-
-        raw_lat = row[KEY_COLS['latitude']] or ''
-        raw_lon = row[KEY_COLS['longitude']] or ''
+    return {
+        'lat_norms': normalize_dms_series(df[KEY_COLS['latitude']]),
+        'lon_norms': normalize_dms_series(df[KEY_COLS['longitude']]),
+        'lat_decs':  dms_to_decimal_series(df[KEY_COLS['latitude']]),
+        'lon_decs':  dms_to_decimal_series(df[KEY_COLS['longitude']]),
+    }
+
+def merge_ndb_into(conn: sqlite3.Connection, df: pd.DataFrame):
+    """Merge the sheet into the NDB table on ``conn`` without committing; rejections go to the audit table."""
+    audit = RejectLog(SOURCE)
+    write_ndb(conn, df, prepare_ndb(df), audit)
+    audit.flush(conn)
+
+def write_ndb(conn: sqlite3.Connection, df: pd.DataFrame, prepared: dict, audit: RejectLog = None):
+    """
+    Insert the sheet's new NDBs, converted by prepare_ndb, on ``conn`` without
+    committing. Unusable values are recorded in ``audit``; without one they are
+    only summarised in the log.
+    """
+    table = NDB_TABLE
+    cursor = conn.cursor()
+    own_audit = audit is None
+    if own_audit:
+        audit = RejectLog(SOURCE)
+    lat_norms, lon_norms = prepared['lat_norms'], prepared['lon_norms']
+    lat_decs, lon_decs = prepared['lat_decs'], prepared['lon_decs']
+
+    # Exact-DMS and deg/min duplicates against the table and earlier sheet rows
+    index = DuplicateIndex.from_table(conn, table, NDB_COLS)
+    labels, counts = classify_navaids(
+        index, df[KEY_COLS['id']], lat_norms, lon_norms, lat_decs, lon_decs
+    )
+    if counts[EMPTY]:
+        logging.warning(f"Skipping {counts[EMPTY]} rows with empty ID")
+    lat_decs = as_optional(lat_decs)
+    lon_decs = as_optional(lon_decs)
+
+    rows = []
+    progress = Progress("NDB navaids", counts[NEW])
+    for idx, row in df[labels == NEW].iterrows():
+        progress.tick()
+        ndb_id   = row[KEY_COLS['id']]
         freq_str = row[KEY_COLS['frequency']] or ''
         name     = row[KEY_COLS['name']] or None
 
-        lat_norm = normalize_dms_string(raw_lat)
-        lon_norm = normalize_dms_string(raw_lon)
-        lat_dec  = dms_to_decimal(raw_lat)
-        lon_dec  = dms_to_decimal(raw_lon)
-
-        # 1) Exact normalized DMS-string duplicate
-        cursor.execute(f"""
-            SELECT 1 FROM "{table}"
-             WHERE NDBIdentifier = ?
-               AND NDBLatitude   = ?
-               AND NDBLongitude  = ?
-             LIMIT 1
-        """, (ndb_id, lat_norm, lon_norm))
-        if cursor.fetchone():
-            skipped_exact += 1
-            continue
-
-        # 2) Deg/min duplicate for same NDBIdentifier
-        if lat_dec is not None and lon_dec is not None:
-            cursor.execute(f"""
-                SELECT NDBLatitude_WGS84, NDBLongitude_WGS84
-                  FROM "{table}"
-                 WHERE NDBIdentifier = ?
-            """, (ndb_id,))
-            for ext_lat_raw, ext_lon_raw in cursor.fetchall():
-                try:
-                    ext_lat = float(ext_lat_raw)
-                    ext_lon = float(ext_lon_raw)
-                except (TypeError, ValueError):
-                    continue
-                nd, nm = deg_min(lat_dec)
-                od, om = deg_min(ext_lat)
-                if nd == od and nm == om:
-                    ld, lm = deg_min(lon_dec)
-                    od2, om2 = deg_min(ext_lon)
-                    if ld == od2 and lm == om2:
-                        skipped_degmin += 1
-                        break
-            else:
-                pass
-
-            if skipped_exact + skipped_degmin + skipped_empty + inserted == total:
-                continue
-
         # Frequency ×10
         try:
             freq = int(float(freq_str) * 10) if freq_str else None
         except ValueError:
-            logging.warning(f"Invalid frequency '{freq_str}' for '{ndb_id}' → NULL")
+            audit.add(idx, ndb_id, 'frequency', freq_str, 'invalid frequency, NULL used')
             freq = None
 
-        # Insert row
-        cursor.execute(f"""
-            INSERT INTO "{table}"
-              (NDBIdentifier,
-               NDBLatitude,
-               NDBLongitude,
-               NDBFrequency,
-               NDBName,
-               NDBLatitude_WGS84,
-               NDBLongitude_WGS84)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
+        rows.append((
             ndb_id,
-            lat_norm,
-            lon_norm,
+            lat_norms[idx],
+            lon_norms[idx],
             freq,
             name,
-            lat_dec,
-            lon_dec,
+            lat_decs[idx],
+            lon_decs[idx],
         ))
-        inserted += 1
 
-    conn.commit()
-    conn.close()
+    cursor.executemany(f"""
+        INSERT INTO "{table}"
+          (NDBIdentifier,
+           NDBLatitude,
+           NDBLongitude,
+           NDBFrequency,
+           NDBName,
+           NDBLatitude_WGS84,
+           NDBLongitude_WGS84)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    progress.finish()
+    if own_audit:
+        audit.log_summary()
 
     # Summary
-    logging.info(f"Total rows read:          {total}")
-    logging.info(f"Skipped (empty ID):       {skipped_empty}")
-    logging.info(f"Skipped (exact dup):      {skipped_exact}")
-    logging.info(f"Skipped (deg/min dup):    {skipped_degmin}")
-    logging.info(f"Inserted new rows:        {inserted}")
+    logging.info(f"Total rows read:          {len(df)}")
+    logging.info(f"Skipped (empty ID):       {counts[EMPTY]}")
+    logging.info(f"Skipped (exact dup):      {counts[EXACT]}")
+    logging.info(f"Skipped (deg/min dup):    {counts[DEGMIN]}")
+    logging.info(f"Inserted new rows:        {len(rows)}")
+
+def sync_ndb_into(conn: sqlite3.Connection, df: pd.DataFrame):
+    """Merge only the rows changed since the last sync into the NDB table on ``conn`` without committing."""
+    keys = pd.DataFrame({
+        'id':  df[KEY_COLS['id']],
+        'lat': normalize_dms_series(df[KEY_COLS['latitude']]),
+        'lon': normalize_dms_series(df[KEY_COLS['longitude']]),
+    })
+    log_delta(apply_delta(conn, SOURCE, NDB_TABLE, df, keys,
+                          [NDB_COLS.ident, NDB_COLS.lat, NDB_COLS.lon], merge_ndb_into))
+
+def merge_into_sqlite(df: pd.DataFrame, db_path: str, incremental: bool = False):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA busy_timeout = 30000;')
+    if incremental:
+        sync_ndb_into(conn, df)
+    else:
+        merge_ndb_into(conn, df)
+    conn.commit()
+    conn.close()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Merge ndb.xlsx into the worldwide database")
+    parser.add_argument('--incremental', action='store_true',
+                        help='apply only rows inserted, changed or deleted since the last --incremental run')
+    args = parser.parse_args()
+
     EXCEL = os.path.expanduser('~/Downloads/navdb/ndb.xlsx')
     DB    = os.path.expanduser('~/Dev/MCDUDatabaseWorldwide.db')
 
     logging.info("Loading Excel data…")
-    df = load_excel(EXCEL)
+    df, rejected = load_embedded_csv(EXCEL, header_row=0)
+    log_rejected(rejected, len(df.columns))
     logging.info(f"Loaded {len(df)} rows; columns: {df.columns.tolist()}")
 
     logging.info("Merging into SQLite database…")
-    merge_into_sqlite(df, DB)
+    merge_into_sqlite(df, DB, incremental=args.incremental)
     logging.info("Done.")
@@ -1,9 +1,17 @@
+import argparse
 import pandas as pd
 import sqlite3
 import os
 import logging
-import re
-from typing import Optional, Tuple
+
+from coordinates import (
+    as_optional, dms_to_decimal_series, format_variation_series,
+    invalid_number_mask, normalize_dms_series, to_number_series,
+)
+from audit_log import Progress, RejectLog
+from excel_loader import load_embedded_csv, log_rejected
+from row_fingerprints import apply_delta, log_delta
+from navaid_dedup import EMPTY, EXACT, DEGMIN, NEW, DuplicateIndex, NavaidColumns, classify_navaids
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
@@ -21,212 +29,160 @@ KEY_COLS = {
     'name':        'name',
 }
 
-# Regex to parse DMS: allow N, S, E, or W
-DMS_RE = re.compile(
-    r"""^\s*([NSEW])\s*    # Hemisphere
-        (\d+)[°\s]+       # Degrees
-        (\d+)[\'\s]+      # Minutes
-        ([0-9.]+)"?       # Seconds
-        \s*$""",
-    re.VERBOSE
-)
-
-def normalize_dms_string(dms_str: str) -> Optional[str]:
-    if not dms_str:
-        return None
-    norm = re.sub(r'[^A-Za-z0-9]', '', dms_str)
-    return norm or None
-
-def dms_to_decimal(dms_str: str) -> Optional[float]:
-    if not dms_str:
-        return None
-    m = DMS_RE.match(dms_str)
-    if not m:
-        return None
-    hemi, deg, mins, secs = m.groups()
-    dd = float(deg) + float(mins) / 60 + float(secs) / 3600
-    return -dd if hemi in ('S', 'W') else dd
-
-def deg_min(value: float) -> Tuple[int, int]:
-    a = abs(value)
-    d = int(a)
-    m = int((a - d) * 60)
-    return d, m
-
-def format_declination(val_str: str) -> Optional[str]:
-    if not val_str:
-        return None
-    try:
-        v = float(val_str)
-    except ValueError:
-        logging.warning(f"Invalid declination '{val_str}'; using NULL")
-        return None
-    hemi = 'E' if v >= 0 else 'W'
-    mag = int(abs(v) * 10)
-    return f"{hemi}{mag:04d}"
-
-def load_excel(excel_path: str) -> pd.DataFrame:
-    raw = pd.read_excel(excel_path, header=None, dtype=str)
-    header = raw.iloc[0, 0]
-    cols = [c.strip().strip('"').strip("'").lower() for c in header.split(',')]
-    records = []
-    for i in range(1, len(raw)):
-        line = raw.iloc[i, 0]
-        if pd.isna(line):
-            continue
-        vals = [v.strip().strip('"').strip("'") for v in str(line).split(',')]
-        if len(vals) != len(cols):
-            logging.warning(f"Skipping malformed row {i+1}: expected {len(cols)} values but got {len(vals)}")
-            continue
-        records.append(vals)
-    df = pd.DataFrame(records, columns=cols)
-    return df
-
-def merge_vhf(df: pd.DataFrame, db_path: str):
-    table = 'primary_D__base_Navaid - VHF Navaid'
-    conn = sqlite3.connect(db_path, timeout=30)
-    conn.execute('PRAGMA busy_timeout = 30000;')
-    cursor = conn.cursor()
+VHF_TABLE = 'primary_D__base_Navaid - VHF Navaid'
+VHF_COLS = NavaidColumns('VORIdentifier', 'VORLatitude', 'VORLongitude',
+                         'VORLatitude_WGS84', 'VORLongitude_WGS84')
+SOURCE = 'Navaids.xlsx'
 
+def prepare_vhf(df: pd.DataFrame) -> dict:
+    """
+    Column-wise conversions of the sheet that need no database: normalised and
+    decimal coordinates and formatted declinations, aligned with ``df``.
+    """
     # Verify required columns
     for key, col in KEY_COLS.items():
         if col not in df.columns:
             raise KeyError(f"Missing column '{col}' (found: {df.columns.tolist()})")
 
-    total_rows = skipped_empty = skipped_exact = skipped_degmin = inserted = 0
-
-    for _, row in df.iterrows():
-        total_rows += 1
-        vid = row[KEY_COLS['id']] or ''
-        if not vid:
-            skipped_empty += 1
-            logging.warning("Skipping row with empty VORIdentifier")
-            continue
-
-        raw_lat = row[KEY_COLS['vor_lat']] or ''
-        raw_lon = row[KEY_COLS['vor_lon']] or ''
-        norm_lat = normalize_dms_string(raw_lat)
-        norm_lon = normalize_dms_string(raw_lon)
-        dec_lat = dms_to_decimal(raw_lat)
-        dec_lon = dms_to_decimal(raw_lon)
-
-        # 1) Exact DMS-string duplicate
-        cursor.execute(f"""
-            SELECT 1 FROM "{table}"
-             WHERE VORIdentifier = ?
-               AND VORLatitude   = ?
-               AND VORLongitude  = ?
-             LIMIT 1
-        """, (vid, norm_lat, norm_lon))
-        if cursor.fetchone():
-            skipped_exact += 1
-            continue
-
-        # 2) Deg/min duplicate for same Identifier
-        if dec_lat is not None and dec_lon is not None:
-            cursor.execute(f"""
-                SELECT VORLatitude_WGS84, VORLongitude_WGS84
-                  FROM "{table}"
-                 WHERE VORIdentifier = ?
-            """, (vid,))
-            for ext_lat_raw, ext_lon_raw in cursor.fetchall():
-                # Coerce to float, skip non-numeric
-                try:
-                    ext_lat = float(ext_lat_raw)
-                    ext_lon = float(ext_lon_raw)
-                except (TypeError, ValueError):
-                    continue
-
-                nd, nm = deg_min(dec_lat)
-                od, om = deg_min(ext_lat)
-                if nd == od and nm == om:
-                    ld, lm = deg_min(dec_lon)
-                    od2, om2 = deg_min(ext_lon)
-                    if ld == od2 and lm == om2:
-                        skipped_degmin += 1
-                        break
-            else:
-                # no break → not duplicate by deg/min
-                pass
-
-            # if we incremented skipped_degmin just now, skip insert
-            if skipped_degmin + skipped_exact + skipped_empty + inserted == total_rows:
-                continue
+    norm = {k: normalize_dms_series(df[KEY_COLS[k]]) for k in ('vor_lat', 'vor_lon', 'dme_lat', 'dme_lon')}
+    return {
+        'norm':  norm,
+        'dec':   {k: dms_to_decimal_series(df[KEY_COLS[k]]) for k in norm},
+        'decls': format_variation_series(df[KEY_COLS['declination']]),
+    }
+
+def merge_vhf_into(conn: sqlite3.Connection, df: pd.DataFrame):
+    """Merge the sheet into the VHF table on ``conn`` without committing; rejections go to the audit table."""
+    audit = RejectLog(SOURCE)
+    write_vhf(conn, df, prepare_vhf(df), audit)
+    audit.flush(conn)
+
+def write_vhf(conn: sqlite3.Connection, df: pd.DataFrame, prepared: dict, audit: RejectLog = None):
+    """
+    Insert the sheet's new navaids, converted by prepare_vhf, on ``conn`` without
+    committing. Unusable values are recorded in ``audit``; without one they are
+    only summarised in the log.
+    """
+    table = VHF_TABLE
+    cursor = conn.cursor()
+    own_audit = audit is None
+    if own_audit:
+        audit = RejectLog(SOURCE)
+    norm, dec, decls = prepared['norm'], prepared['dec'], prepared['decls']
+
+    # Exact-DMS and deg/min duplicates against the table and earlier sheet rows
+    index = DuplicateIndex.from_table(conn, table, VHF_COLS)
+    labels, counts = classify_navaids(
+        index, df[KEY_COLS['id']], norm['vor_lat'], norm['vor_lon'], dec['vor_lat'], dec['vor_lon']
+    )
+    if counts[EMPTY]:
+        logging.warning(f"Skipping {counts[EMPTY]} rows with empty VORIdentifier")
+    new = labels == NEW
+
+    bad_decl = new & invalid_number_mask(df[KEY_COLS['declination']], to_number_series(df[KEY_COLS['declination']]))
+    audit.add_mask(bad_decl, df[KEY_COLS['id']], df[KEY_COLS['declination']],
+                   'declination', 'invalid declination, NULL used')
+    dec = {k: as_optional(v) for k, v in dec.items()}
+
+    rows = []
+    progress = Progress("VHF navaids", int(new.sum()))
+    for idx, row in df[new].iterrows():
+        vid = row[KEY_COLS['id']]
+        progress.tick()
 
         # Convert other fields
         try:
             vor_freq = int(float(row[KEY_COLS['vor_freq']]) * 100)
         except:
-            logging.warning(f"Invalid frequency '{row[KEY_COLS['vor_freq']]}' for '{vid}'; using NULL")
+            audit.add(idx, vid, 'frequency', row[KEY_COLS['vor_freq']], 'invalid frequency, NULL used')
             vor_freq = None
 
-        decl = format_declination(row[KEY_COLS['declination']])
         try:
             elev = float(row[KEY_COLS['elevation']])
         except:
-            logging.warning(f"Invalid elevation '{row[KEY_COLS['elevation']]}' for '{vid}'; using NULL")
+            audit.add(idx, vid, 'elevation', row[KEY_COLS['elevation']], 'invalid elevation, NULL used')
             elev = None
 
-        raw_dme_lat = row[KEY_COLS['dme_lat']] or ''
-        raw_dme_lon = row[KEY_COLS['dme_lon']] or ''
-        norm_dme_lat = normalize_dms_string(raw_dme_lat)
-        norm_dme_lon = normalize_dms_string(raw_dme_lon)
-        dec_dme_lat = dms_to_decimal(raw_dme_lat)
-        dec_dme_lon = dms_to_decimal(raw_dme_lon)
-
         name = row[KEY_COLS['name']] or None
 
-        cursor.execute(f"""
-            INSERT INTO "{table}"
-              (VORIdentifier,
-               VORFrequency,
-               VORLatitude,
-               VORLongitude,
-               DMELatitude,
-               DMELongitude,
-               StationDeclination,
-               DMEElevation,
-               VORName,
-               DMELongitude_WGS84,
-               DMELatitude_WGS84,
-               VORLongitude_WGS84,
-               VORLatitude_WGS84)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        rows.append((
             vid,
             vor_freq,
-            norm_lat,
-            norm_lon,
-            norm_dme_lat,
-            norm_dme_lon,
-            decl,
+            norm['vor_lat'][idx],
+            norm['vor_lon'][idx],
+            norm['dme_lat'][idx],
+            norm['dme_lon'][idx],
+            decls[idx],
             elev,
             name,
-            dec_dme_lon,
-            dec_dme_lat,
-            dec_lon,
-            dec_lat,
+            dec['dme_lon'][idx],
+            dec['dme_lat'][idx],
+            dec['vor_lon'][idx],
+            dec['vor_lat'][idx],
         ))
-        inserted += 1
 
-    conn.commit()
-    conn.close()
+    cursor.executemany(f"""
+        INSERT INTO "{table}"
+          (VORIdentifier,
+           VORFrequency,
+           VORLatitude,
+           VORLongitude,
+           DMELatitude,
+           DMELongitude,
+           StationDeclination,
+           DMEElevation,
+           VORName,
+           DMELongitude_WGS84,
+           DMELatitude_WGS84,
+           VORLongitude_WGS84,
+           VORLatitude_WGS84)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    progress.finish()
+    if own_audit:
+        audit.log_summary()
 
     # Summary logging
-    logging.info(f"Total rows read:           {total_rows}")
-    logging.info(f"Skipped (empty ID):        {skipped_empty}")
-    logging.info(f"Skipped (exact DMS dup):   {skipped_exact}")
-    logging.info(f"Skipped (deg/min dup):     {skipped_degmin}")
-    logging.info(f"Inserted new rows:         {inserted}")
+    logging.info(f"Total rows read:           {len(df)}")
+    logging.info(f"Skipped (empty ID):        {counts[EMPTY]}")
+    logging.info(f"Skipped (exact DMS dup):   {counts[EXACT]}")
+    logging.info(f"Skipped (deg/min dup):     {counts[DEGMIN]}")
+    logging.info(f"Inserted new rows:         {len(rows)}")
+
+def sync_vhf_into(conn: sqlite3.Connection, df: pd.DataFrame):
+    """Merge only the rows changed since the last sync into the VHF table on ``conn`` without committing."""
+    keys = pd.DataFrame({
+        'id':  df[KEY_COLS['id']],
+        'lat': normalize_dms_series(df[KEY_COLS['vor_lat']]),
+        'lon': normalize_dms_series(df[KEY_COLS['vor_lon']]),
+    })
+    log_delta(apply_delta(conn, SOURCE, VHF_TABLE, df, keys,
+                          [VHF_COLS.ident, VHF_COLS.lat, VHF_COLS.lon], merge_vhf_into))
+
+def merge_vhf(df: pd.DataFrame, db_path: str, incremental: bool = False):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA busy_timeout = 30000;')
+    if incremental:
+        sync_vhf_into(conn, df)
+    else:
+        merge_vhf_into(conn, df)
+    conn.commit()
+    conn.close()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Merge Navaids.xlsx into the worldwide database")
+    parser.add_argument('--incremental', action='store_true',
+                        help='apply only rows inserted, changed or deleted since the last --incremental run')
+    args = parser.parse_args()
+
     EXCEL_FILE = os.path.expanduser('~/Downloads/navdb/Navaids.xlsx')
     DB_FILE    = os.path.expanduser('~/Dev/MCDUDatabaseWorldwide.db')
 
     logging.info("Loading Excel data…")
-    df = load_excel(EXCEL_FILE)
+    df, rejected = load_embedded_csv(EXCEL_FILE, header_row=0)
+    log_rejected(rejected, len(df.columns))
     logging.info(f"Loaded {len(df)} valid rows; columns: {df.columns.tolist()}")
 
     logging.info("Merging VHF Navaids…")
-    merge_vhf(df, DB_FILE)
+    merge_vhf(df, DB_FILE, incremental=args.incremental)
     logging.info("Merge complete.")
@@ -1,9 +1,16 @@
+import argparse
 import pandas as pd
 import sqlite3
 import os
 import logging
-import re
-from typing import Optional
+
+from coordinates import (
+    as_optional, dms_to_decimal_series, format_variation_series,
+    invalid_number_mask, normalize_dms_series, to_number_series,
+)
+from audit_log import RejectLog
+from excel_loader import load_embedded_csv, log_rejected
+from row_fingerprints import apply_delta, log_delta
 
 # Configure logging
 logging.basicConfig(level=logging.INFO,
@@ -22,77 +29,47 @@ EXCEL_COLS = {
     'name':       'name',
 }
 
-# Regex to parse DMS strings
-DMS_RE = re.compile(
-    r"""^\s*([NSEW])\s*      # Hemisphere
-        (\d+)[°\s]+         # Degrees
-        (\d+)[\'\s]+        # Minutes
-        ([0-9.]+)"?         # Seconds
-        \s*$""", 
-    re.VERBOSE
-)
-
-def normalize_dms_string(s: str) -> Optional[str]:
-    if not s:
-        return None
-    return re.sub(r'[^A-Za-z0-9]', '', s) or None
-
-def dms_to_decimal(s: str) -> Optional[float]:
-    if not s:
-        return None
-    m = DMS_RE.match(s)
-    if not m:
-        return None
-    hemi, deg, mins, secs = m.groups()
-    dd = float(deg) + float(mins)/60 + float(secs)/3600
-    return -dd if hemi in ('S','W') else dd
-
-def format_magvar(s: str) -> Optional[str]:
-    if not s:
-        return None
-    try:
-        v = float(s)
-    except ValueError:
-        logging.warning(f"Invalid magnetic variation '{s}'; NULL")
-        return None
-    hemi = 'E' if v >= 0 else 'W'
-    mag = int(abs(v)*10)
-    return f"{hemi}{mag:04d}"
-
-def load_excel(path: str) -> pd.DataFrame:
-    """
-    Load Airports.xlsx, using row 2 (index 1) as header,
-    data from row 3 onward. Skip malformed rows.
-    """
-    raw = pd.read_excel(path, header=None, dtype=str)
-    # row index 1 -> second row in file
-    header_row = raw.iloc[1, 0]
-    cols = [c.strip().strip('"').strip("'").lower() for c in header_row.split(',')]
-    records = []
-    for i in range(2, len(raw)):  # start at index 2 (third row)
-        line = raw.iloc[i, 0]
-        if pd.isna(line):
-            continue
-        parts = [p.strip().strip('"').strip("'") for p in str(line).split(',')]
-        if len(parts) != len(cols):
-            logging.warning(f"Skipping malformed row {i+1}: expected {len(cols)} values but got {len(parts)}")
-            continue
-        records.append(parts)
-    return pd.DataFrame(records, columns=cols)
-
 def find_col(df: pd.DataFrame, substr: str) -> str:
     for c in df.columns:
         if substr in c:
             return c
     raise KeyError(f"Missing column containing '{substr}' (got {df.columns.tolist()})")
 
-def merge_airports(df: pd.DataFrame, db_path: str):
-    table = "primary_P_A_base_Airport - Reference Points"
-    conn = sqlite3.connect(db_path, timeout=30)
-    conn.execute("PRAGMA busy_timeout = 30000;")
-    cur = conn.cursor()
-
-    # Map DataFrame columns
+TABLE = "primary_P_A_base_Airport - Reference Points"
+SOURCE = "Airports.xlsx"
+STAGE = "temp.airport_stage"
+
+# Target columns, in staging-table order
+TARGET_COLS = [
+    'LandingFacilityIcaoIdentifier',
+    'AirportReferencePtLatitude',
+    'AirportReferencePtLongitude',
+    'AirportElevation',
+    'MagneticVariation',
+    'SpeedLimitAltitude',
+    'TransitionsAltitude',
+    'TransitionLevel',
+    'AirportName',
+    'AirportReferencePtLongitude_WGS84',
+    'AirportReferencePtLatitude_WGS84',
+]
+
+INT_RE = r'^\s*[+-]?\d+\s*$'
+
+def int_series(s: pd.Series) -> pd.Series:
+    """int() for a whole column (NaN where int() would raise)."""
+    text = s.astype('string')
+    return pd.to_numeric(text.where(text.str.match(INT_RE).fillna(False)), errors='coerce')
+
+def prepare_airports(df: pd.DataFrame, audit: RejectLog = None) -> pd.DataFrame:
+    """
+    Convert the Excel frame into TARGET_COLS rows, one per input row, in input order.
+    Values that could not be converted are recorded in ``audit``; without one
+    they are only summarised in the log.
+    """
+    own_audit = audit is None
+    if own_audit:
+        audit = RejectLog(SOURCE)
     col = {
         'id':         find_col(df, EXCEL_COLS['id']),
         'lat':        find_col(df, EXCEL_COLS['latitude']),
@@ -105,105 +82,135 @@ def merge_airports(df: pd.DataFrame, db_path: str):
         'name':       find_col(df, EXCEL_COLS['name']),
     }
 
-    total = skipped_empty = skipped_dup = inserted = 0
-
-    for _, row in df.iterrows():
-        total += 1
-        ident = row[col['id']] or ''
-        if not ident:
-            skipped_empty += 1
-            logging.warning("Skipping row with empty ICAO identifier")
-            continue
-
-        # Duplicate check: skip if identifier already exists
-        cur.execute(f"""
-            SELECT 1 FROM "{table}"
-             WHERE LandingFacilityIcaoIdentifier = ?
-             LIMIT 1
-        """, (ident,))
-        if cur.fetchone():
-            skipped_dup += 1
-            continue
-
-        raw_lat = row[col['lat']] or ''
-        raw_lon = row[col['lon']] or ''
-        norm_lat = normalize_dms_string(raw_lat)
-        norm_lon = normalize_dms_string(raw_lon)
-        dec_lat = dms_to_decimal(raw_lat)
-        dec_lon = dms_to_decimal(raw_lon)
-
-        elev = None
-        try:
-            elev = float(row[col['elev']])
-        except:
-            logging.warning(f"Invalid elevation '{row[col['elev']]}' for '{ident}'")
-
-        magvar = format_magvar(row[col['magvar']])
-        speed_alt = None
-        try:
-            speed_alt = int(row[col['speed_alt']])
-        except:
-            logging.warning(f"Invalid speed limit altitude '{row[col['speed_alt']]}' for '{ident}'")
-
-        trans_alt = None
-        try:
-            trans_alt = int(row[col['trans_alt']])
-        except:
-            logging.warning(f"Invalid transition altitude '{row[col['trans_alt']]}' for '{ident}'")
-
-        trans_lvl = None
-        try:
-            trans_lvl = int(row[col['trans_lvl']])
-        except:
-            logging.warning(f"Invalid transition level '{row[col['trans_lvl']]}' for '{ident}'")
-
-        name = row[col['name']] or None
-
-        cur.execute(f"""
-            INSERT INTO "{table}"
-              (LandingFacilityIcaoIdentifier,
-               AirportReferencePtLatitude,
-               AirportReferencePtLongitude,
-               AirportElevation,
-               MagneticVariation,
-               SpeedLimitAltitude,
-               TransitionsAltitude,
-               TransitionLevel,
-               AirportName,
-               AirportReferencePtLongitude_WGS84,
-               AirportReferencePtLatitude_WGS84)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            ident,
-            norm_lat,
-            norm_lon,
-            elev,
-            magvar,
-            speed_alt,
-            trans_alt,
-            trans_lvl,
-            name,
-            dec_lon,
-            dec_lat
-        ))
-        inserted += 1
-
-    conn.commit()
-    conn.close()
-
+    idents = df[col['id']].fillna('')
+    named = idents != ''
+
+    magvar = to_number_series(df[col['magvar']])
+    audit.add_mask(named & invalid_number_mask(df[col['magvar']], magvar), idents, df[col['magvar']],
+                   'magnetic variation', 'invalid magnetic variation, NULL used')
+
+    elev = to_number_series(df[col['elev']])
+    speed_alt = int_series(df[col['speed_alt']])
+    trans_alt = int_series(df[col['trans_alt']])
+    trans_lvl = int_series(df[col['trans_lvl']])
+    for label, key, parsed in (
+        ('elevation', 'elev', elev),
+        ('speed limit altitude', 'speed_alt', speed_alt),
+        ('transition altitude', 'trans_alt', trans_alt),
+        ('transition level', 'trans_lvl', trans_lvl),
+    ):
+        audit.add_mask(named & parsed.isna(), idents, df[col[key]], label, f'invalid {label}, NULL used')
+    if own_audit:
+        audit.log_summary()
+
+    return pd.DataFrame({
+        'LandingFacilityIcaoIdentifier':     idents,
+        'AirportReferencePtLatitude':        normalize_dms_series(df[col['lat']]),
+        'AirportReferencePtLongitude':       normalize_dms_series(df[col['lon']]),
+        'AirportElevation':                  as_optional(elev),
+        'MagneticVariation':                 format_variation_series(df[col['magvar']]),
+        'SpeedLimitAltitude':                as_optional(speed_alt.astype('Int64')),
+        'TransitionsAltitude':               as_optional(trans_alt.astype('Int64')),
+        'TransitionLevel':                   as_optional(trans_lvl.astype('Int64')),
+        'AirportName':                       df[col['name']].astype(object).where(df[col['name']].fillna('') != '', None),
+        'AirportReferencePtLongitude_WGS84': as_optional(dms_to_decimal_series(df[col['lon']])),
+        'AirportReferencePtLatitude_WGS84':  as_optional(dms_to_decimal_series(df[col['lat']])),
+    }, columns=TARGET_COLS)
+
+def merge_staged_airports(conn: sqlite3.Connection, staged: pd.DataFrame):
+    """
+    Insert the staged rows whose identifier is not in TABLE yet; for an identifier
+    repeated in the sheet only its first row is inserted. Runs in the caller's
+    transaction. Returns (total, skipped_empty, skipped_dup, inserted).
+    """
+    cur = conn.cursor()
+    cols = ', '.join(TARGET_COLS)
+
+    cur.execute(f"DROP TABLE IF EXISTS {STAGE}")
+    cur.execute(f"CREATE TABLE {STAGE} (Seq INTEGER PRIMARY KEY, {cols})")
+    cur.executemany(
+        f"INSERT INTO {STAGE} VALUES (?, {', '.join('?' * len(TARGET_COLS))})",
+        ((seq, *row) for seq, row in enumerate(staged.itertuples(index=False, name=None)))
+    )
+    cur.execute("CREATE INDEX temp.airport_stage_ident ON airport_stage (LandingFacilityIcaoIdentifier, Seq)")
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS "idx_airport_reference_points_ident"
+            ON "{TABLE}" (LandingFacilityIcaoIdentifier)
+    """)
+
+    # A row is new if its identifier is not in TABLE and no earlier staged row has it
+    new_row = f"""
+        NOT EXISTS (SELECT 1 FROM "{TABLE}" t
+                     WHERE t.LandingFacilityIcaoIdentifier = s.LandingFacilityIcaoIdentifier)
+        AND NOT EXISTS (SELECT 1 FROM {STAGE} e
+                         WHERE e.LandingFacilityIcaoIdentifier = s.LandingFacilityIcaoIdentifier
+                           AND e.Seq < s.Seq)
+    """
+    total, skipped_empty, skipped_dup = cur.execute(f"""
+        SELECT COUNT(*),
+               COALESCE(SUM(s.LandingFacilityIcaoIdentifier = ''), 0),
+               COALESCE(SUM(s.LandingFacilityIcaoIdentifier <> '' AND NOT ({new_row})), 0)
+          FROM {STAGE} s
+    """).fetchone()
+
+    cur.execute(f"""
+        INSERT INTO "{TABLE}" ({cols})
+        SELECT {cols}
+          FROM {STAGE} s
+         WHERE s.LandingFacilityIcaoIdentifier <> ''
+           AND {new_row}
+         ORDER BY s.Seq
+    """)
+    inserted = cur.rowcount
+    cur.execute(f"DROP TABLE {STAGE}")
+    return total, skipped_empty, skipped_dup, inserted
+
+def merge_airports_into(conn: sqlite3.Connection, df: pd.DataFrame):
+    """Merge the sheet into TABLE on ``conn`` without committing; rejections go to the audit table."""
+    audit = RejectLog(SOURCE)
+    write_airports(conn, df, prepare_airports(df, audit))
+    audit.flush(conn)
+
+def write_airports(conn: sqlite3.Connection, df: pd.DataFrame, staged: pd.DataFrame):
+    """Merge rows converted by prepare_airports into TABLE on ``conn`` and log the counts."""
+    total, skipped_empty, skipped_dup, inserted = merge_staged_airports(conn, staged)
+    if skipped_empty:
+        logging.warning(f"Skipped {skipped_empty} rows with empty ICAO identifier")
     logging.info(f"Total rows read:       {total}")
     logging.info(f"Skipped (empty ID):    {skipped_empty}")
     logging.info(f"Skipped (duplicates):  {skipped_dup}")
     logging.info(f"Inserted new rows:     {inserted}")
 
+def sync_airports_into(conn: sqlite3.Connection, df: pd.DataFrame):
+    """Merge only the rows changed since the last sync into TABLE on ``conn`` without committing."""
+    keys = df[[find_col(df, EXCEL_COLS['id'])]]
+    log_delta(apply_delta(conn, SOURCE, TABLE, df, keys,
+                          ['LandingFacilityIcaoIdentifier'], merge_airports_into))
+
+def merge_airports(df: pd.DataFrame, db_path: str, incremental: bool = False):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA busy_timeout = 30000;")
+    if incremental:
+        sync_airports_into(conn, df)
+    else:
+        merge_airports_into(conn, df)
+    conn.commit()
+    conn.close()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge Airports.xlsx into the worldwide database")
+    parser.add_argument("--incremental", action="store_true",
+                        help="apply only rows inserted, changed or deleted since the last --incremental run")
+    args = parser.parse_args()
+
     EXCEL = os.path.expanduser("~/Downloads/navdb/Airports.xlsx")
     DB    = os.path.expanduser("~/Dev/MCDUDatabaseWorldwide.db")
 
     logging.info("Loading Excel data…")
-    df = load_excel(EXCEL)
+    df, rejected = load_embedded_csv(EXCEL, header_row=1)
+    log_rejected(rejected, len(df.columns))
     logging.info(f"Loaded {len(df)} valid rows; columns: {df.columns.tolist()}")
 
     logging.info("Merging Airport reference points…")
-    merge_airports(df, DB)
+    merge_airports(df, DB, incremental=args.incremental)
     logging.info("Done.")
@@ -0,0 +1,122 @@
+import csv
+import logging
+import sqlite3
+import time
+from collections import Counter, namedtuple
+
+import pandas as pd
+
+# Rejection/audit sink for the Excel merges. Instead of a log line per bad
+# cell or skipped row, the merges append compact records here and the whole
+# batch is written once -- to the AUDIT_TABLE of the target database and/or
+# a CSV file -- with a single summary line per (field, reason) on the console.
+# Progress through the remaining per-row loops is reported by Progress at a
+# fixed interval with a rows/second rate rather than per row.
+
+AUDIT_TABLE = "import_audit"
+
+AuditRecord = namedtuple('AuditRecord', 'row ident field value reason')
+
+# Seconds between progress lines
+PROGRESS_EVERY = 5.0
+
+
+class RejectLog:
+    def __init__(self, source: str):
+        self.source = source
+        self.records = []
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, row, ident, field: str, value, reason: str):
+        self.records.append(AuditRecord(row, ident, field, value, reason))
+
+    def add_mask(self, mask: pd.Series, idents: pd.Series, values: pd.Series, field: str, reason: str):
+        """One record per True entry of ``mask``; row numbers are the index of ``mask``."""
+        mask = mask.fillna(False).astype(bool)
+        self.records.extend(
+            AuditRecord(row, ident, field, value, reason)
+            for row, ident, value in zip(mask.index[mask], idents[mask], values[mask])
+        )
+
+    def extend(self, other: 'RejectLog'):
+        self.records.extend(other.records)
+
+    def log_summary(self):
+        for (field, reason), n in sorted(Counter((r.field, r.reason) for r in self.records).items()):
+            logging.warning(f"{self.source}: {n} rows with {reason} ({field})")
+
+    def write_sqlite(self, conn: sqlite3.Connection):
+        """Append the records to AUDIT_TABLE on ``conn`` without committing."""
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS "{AUDIT_TABLE}" (
+                Source   TEXT,
+                Row      INTEGER,
+                Ident    TEXT,
+                Field    TEXT,
+                Value    TEXT,
+                Reason   TEXT,
+                LoggedAt TEXT DEFAULT (datetime('now'))
+            )
+        """)
+        conn.executemany(
+            f'INSERT INTO "{AUDIT_TABLE}" (Source, Row, Ident, Field, Value, Reason) VALUES (?, ?, ?, ?, ?, ?)',
+            ((self.source, _int_or_none(r.row), _text(r.ident), r.field, _text(r.value), r.reason)
+             for r in self.records)
+        )
+
+    def write_csv(self, path: str):
+        """Append the records to ``path``, writing a header if the file is new or empty."""
+        with open(path, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if f.tell() == 0:
+                writer.writerow(('source',) + AuditRecord._fields)
+            writer.writerows((self.source, *r) for r in self.records)
+
+    def flush(self, conn: sqlite3.Connection = None, csv_path: str = None):
+        """Write the records once, log the summary and start over."""
+        if conn is not None:
+            self.write_sqlite(conn)
+        if csv_path:
+            self.write_csv(csv_path)
+        self.log_summary()
+        self.records = []
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value)
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Progress:
+    """Periodic 'label: done/total rows (n rows/s)' lines for a long loop."""
+
+    def __init__(self, label: str, total: int, every: float = PROGRESS_EVERY):
+        self.label = label
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.start = self.last = time.perf_counter()
+
+    def tick(self, n: int = 1):
+        self.done += n
+        now = time.perf_counter()
+        if now - self.last >= self.every:
+            self.last = now
+            self._log(now)
+
+    def finish(self):
+        self._log(time.perf_counter())
+
+    def _log(self, now: float):
+        rate = self.done / (now - self.start) if now > self.start else 0.0
+        logging.info(f"{self.label}: {self.done}/{self.total} rows ({rate:,.0f} rows/s)")
@@ -0,0 +1,171 @@
+import re
+import numpy as np
+import pandas as pd
+from typing import Optional, Tuple
+
+# Coordinate codec shared by the migration scripts. The scalar functions are
+# the ones previously copied into every script; the *_series variants do the
+# same work on whole pandas columns with vectorised string extraction.
+# Run this module directly to benchmark one against the other.
+
+# Regex to parse DMS: allow N, S, E, or W, e.g. “N 52° 04' 28.00"
+DMS_PATTERN = r"""^\s*([NSEW])\s*(\d+)[°\s]+(\d+)['\s]+([0-9.]+)"?\s*$"""
+DMS_RE = re.compile(DMS_PATTERN)
+
+NON_ALNUM = r'[^A-Za-z0-9]'
+
+
+# ——— Scalar ———
+
+def normalize_dms_string(dms_str: str) -> Optional[str]:
+    """Strip everything except the hemisphere letter and digits."""
+    if not dms_str:
+        return None
+    norm = re.sub(NON_ALNUM, '', dms_str)
+    return norm or None
+
+
+def dms_to_decimal(dms_str: str) -> Optional[float]:
+    """Convert a DMS string to decimal degrees."""
+    if not isinstance(dms_str, str) or not dms_str:
+        return None
+    m = DMS_RE.match(dms_str)
+    if not m:
+        return None
+    hemi, deg, mins, secs = m.groups()
+    dd = float(deg) + float(mins) / 60 + float(secs) / 3600
+    return -dd if hemi in ('S', 'W') else dd
+
+
+def deg_min(value: float) -> Tuple[int, int]:
+    """Return (degrees, minutes) from a decimal-degree value."""
+    a = abs(value)
+    d = int(a)
+    m = int((a - d) * 60)
+    return d, m
+
+
+def format_variation(val_str: str) -> Optional[str]:
+    """Encode a signed variation/declination in degrees as E/W + tenths, e.g. 'W0123'."""
+    if not val_str:
+        return None
+    try:
+        v = float(val_str)
+    except ValueError:
+        return None
+    hemi = 'E' if v >= 0 else 'W'
+    mag = int(abs(v) * 10)
+    return f"{hemi}{mag:04d}"
+
+
+# ——— Vectorised ———
+
+def _as_text(s: pd.Series) -> pd.Series:
+    return s.astype('string')
+
+
+def normalize_dms_series(s: pd.Series) -> pd.Series:
+    """normalize_dms_string for a whole column (None where empty)."""
+    norm = _as_text(s).str.replace(NON_ALNUM, '', regex=True).fillna('')
+    return norm.astype(object).where(norm != '', None)
+
+
+def dms_to_decimal_series(s: pd.Series) -> pd.Series:
+    """dms_to_decimal for a whole column (NaN where unparsable)."""
+    # Coordinates repeat across rows (shared fixes, runway ends at one airport),
+    # so only the distinct strings go through the regex.
+    codes, uniques = pd.factorize(s)
+    parts = pd.Series(uniques, dtype=object).str.extract(DMS_PATTERN)
+    deg = parts[1].astype(float)
+    mins = parts[2].astype(float)
+    secs = pd.to_numeric(parts[3], errors='coerce')
+    dd = (deg + mins / 60 + secs / 3600).to_numpy()
+    dd = np.where(parts[0].isin(['S', 'W']).to_numpy(), -dd, dd)
+    out = np.append(dd, np.nan)[codes]  # code -1 (missing) picks the NaN
+    return pd.Series(out, index=s.index)
+
+
+def deg_min_arrays(values) -> Tuple[np.ndarray, np.ndarray]:
+    """deg_min for an array of decimal degrees; NaN stays NaN in both outputs."""
+    a = np.abs(np.asarray(values, dtype=float))
+    d = np.floor(a)
+    m = np.floor((a - d) * 60)
+    return d, m
+
+
+def to_number_series(s: pd.Series) -> pd.Series:
+    """float() for a whole column (NaN where empty or invalid)."""
+    return pd.to_numeric(_as_text(s).str.strip(), errors='coerce').astype(float)
+
+
+def invalid_number_mask(raw: pd.Series, parsed: pd.Series) -> pd.Series:
+    """Rows that had a value but did not parse as a number."""
+    text = _as_text(raw).fillna('').str.strip()
+    return (text != '') & parsed.isna()
+
+
+def as_optional(s: pd.Series) -> pd.Series:
+    """Object column with None in place of NaN, ready for sqlite3 parameters."""
+    return s.astype(object).where(s.notna(), None)
+
+
+def format_variation_series(s: pd.Series) -> pd.Series:
+    """format_variation for a whole column (None where empty or invalid)."""
+    v = to_number_series(s)
+    hemi = pd.Series(np.where(v >= 0, 'E', 'W'), index=s.index)
+    mag = np.floor(v.abs() * 10)
+    digits = mag.fillna(0).astype(np.int64).astype(str).str.zfill(4)
+    return (hemi + digits).astype(object).where(v.notna(), None)
+
+
+if __name__ == '__main__':
+    import time
+
+    # Synthetic Navaids-like sheet; the scalar side walks it with iterrows()
+    # the way the migration scripts do.
+    rng = np.random.default_rng(0)
+    n = 100_000
+
+    def dms(hemis, max_deg):
+        return [
+            f"{h} {d:03d}° {m:02d}' {s:05.2f}\""
+            for h, d, m, s in zip(rng.choice(hemis, n), rng.integers(0, max_deg, n),
+                                  rng.integers(0, 60, n), rng.uniform(0, 60, n))
+        ]
+
+    df = pd.DataFrame({
+        'latitude': dms(list('NS'), 90),
+        'longitude': dms(list('EW'), 180),
+        'magvar': rng.uniform(-30, 30, n).round(1).astype(str),
+    })
+
+    t0 = time.perf_counter()
+    rows = []
+    for _, row in df.iterrows():
+        lat = dms_to_decimal(row['latitude'])
+        lon = dms_to_decimal(row['longitude'])
+        rows.append((
+            normalize_dms_string(row['latitude']), normalize_dms_string(row['longitude']),
+            lat, lon, *deg_min(lat), format_variation(row['magvar'])
+        ))
+    t1 = time.perf_counter()
+    lat = dms_to_decimal_series(df['latitude'])
+    d, m = deg_min_arrays(lat)
+    vectorised = pd.DataFrame({
+        'lat_norm': normalize_dms_series(df['latitude']),
+        'lon_norm': normalize_dms_series(df['longitude']),
+        'lat': lat,
+        'lon': dms_to_decimal_series(df['longitude']),
+        'deg': d.astype(int),
+        'min': m.astype(int),
+        'magvar': format_variation_series(df['magvar']),
+    })
+    t2 = time.perf_counter()
+
+    scalar = pd.DataFrame(rows, columns=vectorised.columns)
+    diffs = [c for c in scalar.columns if not (
+        np.allclose(scalar[c], vectorised[c]) if scalar[c].dtype.kind == 'f'
+        else scalar[c].tolist() == vectorised[c].tolist()
+    )]
+    print(f"{n} rows: scalar {t1 - t0:.2f}s, vectorised {t2 - t1:.2f}s "
+          f"(x{(t1 - t0) / (t2 - t1):.1f}), mismatched columns: {diffs or 'none'}")
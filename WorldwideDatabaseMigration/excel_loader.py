@@ -0,0 +1,163 @@
+import csv
+import io
+import logging
+import os
+import sqlite3
+from typing import Sequence, Tuple
+
+import pandas as pd
+
+from audit_log import RejectLog
+from row_fingerprints import ensure_fingerprint_table, record_fingerprints, row_hashes, row_keys, usable_rows
+from sheet_cache import read_excel_cached
+
+# Loader for the navdb Excel exports (Airports.xlsx, Navaids.xlsx, ndb.xlsx),
+# which carry every record as one comma-joined string in the first column.
+# The column is turned back into CSV text and parsed by pandas' C parser in
+# a single pass; rows with the wrong number of fields are collected into a
+# rejected-rows report instead of being split and logged one at a time.
+
+
+def load_embedded_csv(excel_path: str, header_row: int = 0, lowercase: bool = True):
+    """
+    Parse the comma-joined first column of ``excel_path``.
+
+    ``header_row`` is the 0-based sheet row holding the header; data starts on
+    the next row. Returns ``(df, rejected)``: ``df`` holds one string column per
+    header field (quotes and surrounding whitespace stripped, empty values as
+    ''), indexed by Excel row number; ``rejected`` lists malformed rows with
+    their row number, field count and raw text.
+    """
+    raw = read_excel_cached(excel_path, header=None, dtype=str, usecols=[0]).iloc[:, 0]
+
+    cols = [c.strip().strip('"').strip("'") for c in raw.iloc[header_row].split(',')]
+    if lowercase:
+        cols = [c.lower() for c in cols]
+
+    body = raw.iloc[header_row + 1:].dropna()
+    body = body.str.replace(r'[\r\n]', ' ', regex=True)
+    body.index = body.index + 1  # Excel row numbers
+
+    n_fields = body.str.count(',') + 1
+    ok = n_fields == len(cols)
+    rejected = pd.DataFrame({
+        'row': body.index[~ok],
+        'fields': n_fields[~ok].to_numpy(),
+        'line': body[~ok].to_numpy(),
+    })
+
+    good = body[ok]
+    if good.empty:
+        return pd.DataFrame(columns=cols, dtype=str), rejected
+
+    df = pd.read_csv(
+        io.StringIO('\n'.join(good)),
+        header=None,
+        names=cols,
+        dtype=str,
+        quoting=csv.QUOTE_NONE,
+        keep_default_na=False,
+        na_filter=False,
+        skip_blank_lines=False,
+        engine='c',
+    )
+    for c in df.columns:
+        df[c] = df[c].str.strip().str.strip('"').str.strip("'")
+    df.index = good.index.rename('row')
+    return df, rejected
+
+
+def iter_mapped_chunks(excel_path: str, column_mapping: dict, db_columns: list, chunk_rows: int = 5000):
+    """
+    Stream the first sheet of ``excel_path`` in openpyxl read-only mode.
+
+    The first sheet row is the header; sheet columns are mapped to DB columns
+    through ``column_mapping`` (Excel header -> DB column). Yields lists of up
+    to ``chunk_rows`` tuples ordered as ``db_columns``, with None for unmapped
+    columns; fully empty rows are skipped, as pd.read_excel does.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, ())
+        pos = {name: i for i, name in enumerate(header)}
+        source = {db_col: pos[excel_col] for excel_col, db_col in column_mapping.items() if excel_col in pos}
+        src = [source.get(c) for c in db_columns]
+
+        chunk = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            chunk.append(tuple(row[i] if i is not None and i < len(row) else None for i in src))
+            if len(chunk) == chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        wb.close()
+
+
+def map_excel_columns(df: pd.DataFrame, db_columns: list, column_mapping: dict) -> pd.DataFrame:
+    """
+    Frame with one column per ``db_columns`` entry, filled from the sheet
+    columns of ``column_mapping`` (Excel header -> DB column) and NULL (pd.NA)
+    elsewhere.
+    """
+    db_df = pd.DataFrame(columns=db_columns)
+    for excel_col, db_col in column_mapping.items():
+        if excel_col in df.columns and db_col in db_columns:
+            db_df[db_col] = df[excel_col]
+    return db_df.fillna(value=pd.NA)
+
+
+def insert_sql(table_name: str, columns: list) -> str:
+    cols = ", ".join(f'"{c}"' for c in columns)
+    return f'INSERT INTO "{table_name}" ({cols}) VALUES ({", ".join("?" * len(columns))})'
+
+
+def stream_into_table(conn: sqlite3.Connection, excel_path: str, table_name: str, column_mapping: dict,
+                      db_columns: list, key_cols: Sequence[str], chunk_rows: int = 5000) -> Tuple[int, int]:
+    """
+    Insert every row of ``excel_path`` into ``table_name`` on ``conn`` without
+    committing, reading it with iter_mapped_chunks and writing ``chunk_rows``
+    rows per executemany, so memory stays flat whatever the sheet size.
+    ``db_columns`` are the columns written; the table's rowid is left to
+    SQLite. Rows without a ``key_cols`` ident or repeating an earlier key are
+    rejected through the audit table; the others get row fingerprints, as
+    row_fingerprints.apply_delta records them. Returns (inserted, read).
+    """
+    ensure_fingerprint_table(conn)
+    sql = insert_sql(table_name, db_columns)
+    source = os.path.basename(excel_path)
+
+    audit = RejectLog(source)
+    seen = set()
+    inserted = read = 0
+    for chunk in iter_mapped_chunks(excel_path, column_mapping, db_columns, chunk_rows):
+        # Indexed like the sheet's data rows, as in the audit records of a full read
+        frame = pd.DataFrame(chunk, columns=db_columns, index=range(read, read + len(chunk)))
+        read += len(chunk)
+        keys = row_keys(frame[list(key_cols)])
+        usable = usable_rows(keys, audit, seen)
+        rows = [row for row, keep in zip(chunk, usable) if keep]
+        # No rowid is given, so SQLite numbers the batch consecutively after the current max
+        first = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) + 1 FROM "{table_name}"').fetchone()[0]
+        conn.executemany(sql, rows)
+        record_fingerprints(conn, source, keys[usable], row_hashes(frame[usable]), range(first, first + len(rows)))
+        inserted += len(rows)
+    audit.flush(conn)
+    return inserted, read
+
+
+def log_rejected(rejected: pd.DataFrame, expected: int, sample: int = 5):
+    """One summary warning for a rejected-rows report."""
+    if rejected.empty:
+        return
+    rows = ', '.join(str(r) for r in rejected['row'].head(sample))
+    more = f" (+{len(rejected) - sample} more)" if len(rejected) > sample else ''
+    logging.warning(
+        f"Skipped {len(rejected)} malformed rows: expected {expected} values; rows {rows}{more}"
+    )
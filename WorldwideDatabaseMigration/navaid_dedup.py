@@ -0,0 +1,91 @@
+import math
+import sqlite3
+from collections import namedtuple
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from coordinates import deg_min, deg_min_arrays
+
+# Duplicate detection shared by the VHF and NDB merges. Every existing row of
+# the target table is reduced once to two hash keys:
+#   exact:   (ident, normalised lat, normalised lon)
+#   deg/min: (ident, lat deg, lat min, lon deg, lon min)
+# and each incoming row is checked against both sets in a single pass. Rows
+# accepted for insert are added to the sets as they go, so a navaid repeated
+# in the sheet is caught the same way as one already in the database.
+
+# Column names of a navaid table
+NavaidColumns = namedtuple('NavaidColumns', 'ident lat lon lat_wgs84 lon_wgs84')
+
+EMPTY, EXACT, DEGMIN, NEW = 'empty', 'exact', 'degmin', 'new'
+
+
+def _to_float(value) -> float:
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return v if math.isfinite(v) else math.nan
+
+
+class DuplicateIndex:
+    def __init__(self):
+        self.exact = set()
+        self.degmin = set()
+
+    @classmethod
+    def from_table(cls, conn: sqlite3.Connection, table: str, cols: NavaidColumns):
+        """Keys for every row already in ``table``, loaded with one query."""
+        index = cls()
+        for ident, lat, lon, lat_wgs, lon_wgs in conn.execute(f"""
+            SELECT {cols.ident}, {cols.lat}, {cols.lon}, {cols.lat_wgs84}, {cols.lon_wgs84}
+              FROM "{table}"
+        """):
+            index.add(ident, lat, lon, _to_float(lat_wgs), _to_float(lon_wgs))
+        return index
+
+    def add(self, ident, norm_lat, norm_lon, lat: float, lon: float):
+        if norm_lat is not None and norm_lon is not None:
+            self.exact.add((ident, norm_lat, norm_lon))
+        if not (math.isnan(lat) or math.isnan(lon)):
+            self.degmin.add((ident, *deg_min(lat), *deg_min(lon)))
+
+
+def classify_navaids(index: DuplicateIndex, idents: pd.Series,
+                     norm_lats: pd.Series, norm_lons: pd.Series,
+                     lats: pd.Series, lons: pd.Series) -> Tuple[pd.Series, Dict[str, int]]:
+    """
+    Label every incoming row EMPTY, EXACT, DEGMIN or NEW, in order, adding each
+    NEW row to ``index``. ``lats``/``lons`` are decimal degrees (NaN if unknown).
+    Returns the labels (aligned with ``idents``) and a count per label.
+    """
+    lat_d, lat_m = deg_min_arrays(lats)
+    lon_d, lon_m = deg_min_arrays(lons)
+    has_pos = ~(np.isnan(lat_d) | np.isnan(lon_d))
+
+    labels = []
+    for ident, n_lat, n_lon, pos, ld, lm, od, om in zip(
+        idents.fillna(''), norm_lats, norm_lons, has_pos,
+        lat_d.tolist(), lat_m.tolist(), lon_d.tolist(), lon_m.tolist()
+    ):
+        if not ident:
+            labels.append(EMPTY)
+            continue
+        exact_key = (ident, n_lat, n_lon) if n_lat is not None and n_lon is not None else None
+        degmin_key = (ident, int(ld), int(lm), int(od), int(om)) if pos else None
+        if exact_key in index.exact:
+            labels.append(EXACT)
+        elif degmin_key in index.degmin:
+            labels.append(DEGMIN)
+        else:
+            labels.append(NEW)
+            if exact_key:
+                index.exact.add(exact_key)
+            if degmin_key:
+                index.degmin.add(degmin_key)
+
+    labels = pd.Series(labels, index=idents.index, dtype=object)
+    counts = {label: int((labels == label).sum()) for label in (EMPTY, EXACT, DEGMIN, NEW)}
+    return labels, counts
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import argparse
+import importlib
+import inspect
+import logging
+import os
+import sqlite3
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from audit_log import RejectLog
+
+# Parallel ingestion of the navdb workbooks. Parsing a sheet and converting
+# its DMS columns is CPU-bound and independent of every other sheet, so each
+# workbook is parsed and prepared in its own worker process. Results are
+# handed over in completion order to the single writer (this process), which
+# owns the only SQLite connection and runs the database half of each merge --
+# duplicate checks and inserts -- one sheet at a time in one transaction.
+# Each sheet has its own RejectLog: filled by the prepare step in the worker
+# when it takes one, then by the write step, and flushed once by the writer.
+# The report compares the wall time with an estimate of the serial cost (sum
+# of all parse, prepare and write times measured in the workers, which run
+# slower while they compete for cores and disk); --serial measures the real
+# one-after-another time.
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+EXCEL_DIR = os.path.expanduser('~/Downloads/navdb')
+DB_PATH   = os.path.expanduser('~/Dev/MCDUDatabaseWorldwide.db')
+
+# sheet, header row (None = plain sheet read as text), module,
+# prepare function (pure, runs in the worker; None = parse only),
+# write function (runs in the writer; takes conn, df and the prepared result,
+# or conn and df when there is no prepare step). Either step also gets the
+# sheet's RejectLog when it has an ``audit`` parameter.
+IngestJob = namedtuple('IngestJob', 'sheet header_row module prepare write')
+
+JOBS = [
+    IngestJob('Airports.xlsx', 1,    'airportmigration',   'prepare_airports', 'write_airports'),
+    IngestJob('Navaids.xlsx',  0,    'VHFNavaidMigration', 'prepare_vhf',      'write_vhf'),
+    IngestJob('ndb.xlsx',      0,    'NBDMigration',       'prepare_ndb',      'write_ndb'),
+    IngestJob('Runways.xlsx',  None, 'runwayMigration',    'prepare_runways',  'write_runways'),
+]
+
+
+def _call(fn, *args, audit: RejectLog):
+    """fn(*args), passing ``audit`` along when fn records rejections."""
+    if 'audit' in inspect.signature(fn).parameters:
+        return fn(*args, audit)
+    return fn(*args)
+
+
+def prepare_job(job: IngestJob, excel_dir: str):
+    """Parse and prepare one workbook. Runs in a worker process; never touches the database."""
+    from excel_loader import load_embedded_csv, log_rejected
+    from sheet_cache import read_excel_cached
+
+    start = time.perf_counter()
+    path = os.path.join(excel_dir, job.sheet)
+    if job.header_row is None:
+        df = read_excel_cached(path, dtype=str)
+    else:
+        df, rejected = load_embedded_csv(path, header_row=job.header_row)
+        log_rejected(rejected, len(df.columns))
+
+    audit = RejectLog(job.sheet)
+    prepared = None
+    if job.prepare:
+        prepared = _call(getattr(importlib.import_module(job.module), job.prepare), df, audit=audit)
+    return job, df, prepared, audit, time.perf_counter() - start
+
+
+def write_job(conn: sqlite3.Connection, job: IngestJob, df, prepared, audit: RejectLog, audit_csv: str) -> float:
+    start = time.perf_counter()
+    write = getattr(importlib.import_module(job.module), job.write)
+    logging.info(f"Writing {job.sheet} ({len(df)} rows)…")
+    if job.prepare:
+        _call(write, conn, df, prepared, audit=audit)
+    else:
+        _call(write, conn, df, audit=audit)
+    audit.flush(conn, audit_csv)
+    return time.perf_counter() - start
+
+
+def ingest(db_path: str = DB_PATH, excel_dir: str = EXCEL_DIR, workers: int = None, serial: bool = False,
+           audit_csv: str = None):
+    """
+    Merge every workbook found in ``excel_dir`` into ``db_path`` in one
+    transaction; rejections go to the audit table and, if given, ``audit_csv``.
+    Returns {sheet: (prepare seconds, write seconds)} and the wall time.
+    """
+    jobs = [job for job in JOBS if os.path.isfile(os.path.join(excel_dir, job.sheet))]
+    for job in JOBS:
+        if job not in jobs:
+            logging.warning(f"{job.sheet} not found in {excel_dir}; skipped")
+    if not jobs:
+        return {}, 0.0
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA busy_timeout = 30000;')
+    timings = {}
+    start = time.perf_counter()
+
+    if serial:
+        for job in jobs:
+            job, df, prepared, audit, t_prep = prepare_job(job, excel_dir)
+            timings[job.sheet] = (t_prep, write_job(conn, job, df, prepared, audit, audit_csv))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1)) as pool:
+            futures = [pool.submit(prepare_job, job, excel_dir) for job in jobs]
+            # Completion order is the queue: the first sheet ready is the first written
+            for future in as_completed(futures):
+                job, df, prepared, audit, t_prep = future.result()
+                timings[job.sheet] = (t_prep, write_job(conn, job, df, prepared, audit, audit_csv))
+
+    conn.commit()
+    conn.close()
+    return timings, time.perf_counter() - start
+
+
+def report(timings: dict, wall: float, serial: bool):
+    if not timings:
+        logging.warning("No workbooks to ingest")
+        return
+    for sheet, (t_prep, t_write) in timings.items():
+        logging.info(f"{sheet:<14} prepare {t_prep:7.2f}s   write {t_write:7.2f}s")
+    if serial:
+        logging.info(f"Wall time (serial): {wall:.2f}s")
+        return
+    serial_cost = sum(p + w for p, w in timings.values())
+    logging.info(f"Wall time (parallel): {wall:.2f}s; estimated serial cost {serial_cost:.2f}s "
+                 f"(sum of per-sheet times); estimated speedup x{serial_cost / wall if wall else 1:.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Merge all navdb workbooks, parsing them in parallel")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--excel-dir', default=EXCEL_DIR)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--serial', action='store_true', help="parse in this process, one sheet after another")
+    parser.add_argument('--audit-csv', default=None, help="also append rejection records to this CSV")
+    args = parser.parse_args()
+
+    timings, wall = ingest(args.db, args.excel_dir, args.workers, args.serial, args.audit_csv)
+    report(timings, wall, args.serial)
@@ -0,0 +1,202 @@
+import logging
+import math
+import sqlite3
+from typing import Callable, Dict, Sequence
+
+import pandas as pd
+
+from audit_log import RejectLog
+
+# Incremental re-import for the Excel merges. Every source row is reduced to
+# a key (the identity of the record it produces in the target table) and a
+# 64-bit content hash, stored per source in FINGERPRINT_TABLE together with
+# the rowid of the target row the import inserted, if any. A rerun compares
+# the new sheet with the stored fingerprints and only touches the delta:
+#   inserted:  key not seen before           -> merged as usual
+#   changed:   same key, different hash      -> own row deleted, then merged
+#   deleted:   key no longer in the sheet    -> own row deleted
+#   unchanged: same key, same hash           -> not touched
+# Rows the import skipped as duplicates of pre-existing data are fingerprinted
+# without a target rowid, so a later change or deletion never removes data the
+# import did not insert. Sheet rows without a key, or repeating the key of an
+# earlier row, cannot be tracked; they are rejected through the audit log.
+
+FINGERPRINT_TABLE = "source_row_fingerprints"
+
+KEY_SEP = '\x1f'
+
+INSERTED, CHANGED, DELETED, UNCHANGED = 'inserted', 'changed', 'deleted', 'unchanged'
+
+
+def ensure_fingerprint_table(conn: sqlite3.Connection):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{FINGERPRINT_TABLE}" (
+            Source      TEXT    NOT NULL,
+            RowKey      TEXT    NOT NULL,
+            RowHash     INTEGER NOT NULL,
+            TargetRowid INTEGER,
+            PRIMARY KEY (Source, RowKey)
+        ) WITHOUT ROWID
+    """)
+
+
+def row_keys(keys: pd.DataFrame) -> pd.Series:
+    """Join the key columns of every row into one string (None as '')."""
+    text = keys.astype(object).where(keys.notna(), '').astype(str)
+    joined = text.iloc[:, 0]
+    for c in text.columns[1:]:
+        joined = joined + KEY_SEP + text[c]
+    return joined
+
+
+def has_ident(keys: pd.Series) -> pd.Series:
+    """Keys whose first component is not empty."""
+    return (keys != '') & ~keys.str.startswith(KEY_SEP)
+
+
+def usable_rows(keys: pd.Series, audit: RejectLog = None, seen: set = None) -> pd.Series:
+    """
+    Mask of the rows an import can track: the key has an ident and no earlier
+    row (of ``keys``, or already in ``seen``) has it. The others are recorded
+    in ``audit``. ``seen`` is updated, for imports reading a sheet in chunks.
+    """
+    blank = ~has_ident(keys)
+    repeated = ~blank & (keys.duplicated() | keys.isin(seen if seen is not None else ()))
+    if seen is not None:
+        seen.update(keys[~blank])
+    if audit is not None:
+        shown = keys.str.replace(KEY_SEP, '/')
+        audit.add_mask(blank, shown, shown, 'key', 'missing key, row skipped')
+        audit.add_mask(repeated, shown, shown, 'key', 'repeated key, row skipped')
+    return ~(blank | repeated)
+
+
+def _canonical_value(v) -> str:
+    if v is None or v is pd.NA or (isinstance(v, float) and math.isnan(v)):
+        return ''
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v)
+
+
+def _canonical_text(col: pd.Series) -> pd.Series:
+    """
+    Cell values as text, the same whichever reader produced them: missing as
+    '', integral floats without '.0' (pandas widens int columns holding blanks
+    to float; openpyxl keeps ints).
+    """
+    if col.dtype.kind in 'biuf':
+        num = col.astype(float)
+        integral = num.notna() & (num == num.round())
+        text = num.astype(str)
+        text[integral] = num[integral].astype('int64').astype(str)
+        return text.where(num.notna(), '').astype(object)
+    return col.astype(object).map(_canonical_value)
+
+
+def row_hashes(df: pd.DataFrame) -> pd.Series:
+    """64-bit content hash of every row's values as text, independent of column order and cell types."""
+    text = pd.DataFrame({c: _canonical_text(df[c]) for c in sorted(df.columns)}, index=df.index)
+    hashed = pd.util.hash_pandas_object(text, index=False)
+    return pd.Series(hashed.to_numpy().view('int64'), index=df.index)
+
+
+def classify_rows(conn: sqlite3.Connection, source: str,
+                  keys: pd.Series, hashes: pd.Series) -> pd.DataFrame:
+    """
+    Compare a sheet's keys and hashes with the stored fingerprints of ``source``.
+    ``keys`` must be unique and have an ident (see usable_rows).
+    Returns one row per key with columns RowKey, RowHash (new), TargetRowid (stored),
+    Status and Row (the sheet index of the key's row; NaN when deleted).
+    """
+    # Nullable Int64 keeps the full 64 bits through the outer join
+    sheet = pd.DataFrame({'RowKey': keys, 'RowHash': hashes.astype('Int64'), 'Row': keys.index})
+
+    stored = pd.read_sql_query(
+        f'SELECT RowKey, RowHash AS StoredHash, TargetRowid FROM "{FINGERPRINT_TABLE}" WHERE Source = ?',
+        conn, params=(source,), dtype={'StoredHash': 'Int64', 'TargetRowid': 'Int64'}
+    )
+    rows = sheet.merge(stored, on='RowKey', how='outer', indicator=True)
+    rows['Status'] = UNCHANGED
+    rows.loc[rows['_merge'] == 'left_only', 'Status'] = INSERTED
+    rows.loc[rows['_merge'] == 'right_only', 'Status'] = DELETED
+    differs = (rows['RowHash'] != rows['StoredHash']).fillna(False).astype(bool)
+    rows.loc[(rows['_merge'] == 'both') & differs, 'Status'] = CHANGED
+    return rows.drop(columns=['_merge', 'StoredHash'])
+
+
+def apply_delta(conn: sqlite3.Connection, source: str, table: str, df: pd.DataFrame,
+                keys: pd.DataFrame, target_key_cols: Sequence[str],
+                merge: Callable[[sqlite3.Connection, pd.DataFrame], None],
+                audit: RejectLog = None) -> Dict[str, int]:
+    """
+    Apply only the changes between ``df`` and the previous import of ``source``
+    into ``table``, on ``conn`` without committing.
+
+    ``keys`` holds, for every row of ``df``, the values that ``merge`` writes to
+    ``target_key_cols`` of ``table``; they identify the target row a sheet row
+    produced. ``merge`` is the importer's normal merge, called once with the
+    inserted and changed rows, in sheet order. Rows usable_rows() rejects are
+    recorded in ``audit``; without one they are written to the audit table on
+    ``conn``. Returns the number of rows per status.
+    """
+    ensure_fingerprint_table(conn)
+    own_audit = audit is None
+    if own_audit:
+        audit = RejectLog(source)
+    sheet_keys = row_keys(keys)
+    usable = usable_rows(sheet_keys, audit)
+    rows = classify_rows(conn, source, sheet_keys[usable], row_hashes(df[usable]))
+    counts = {status: int((rows['Status'] == status).sum())
+              for status in (INSERTED, CHANGED, DELETED, UNCHANGED)}
+
+    # Remove the target rows this import owns for changed and deleted keys
+    stale = rows[rows['Status'].isin([CHANGED, DELETED]) & rows['TargetRowid'].notna()]
+    conn.executemany(f'DELETE FROM "{table}" WHERE rowid = ?',
+                     ((int(r),) for r in stale['TargetRowid']))
+    conn.executemany(f'DELETE FROM "{FINGERPRINT_TABLE}" WHERE Source = ? AND RowKey = ?',
+                     ((source, k) for k in rows.loc[rows['Status'] == DELETED, 'RowKey']))
+
+    # Merge inserted and changed rows; whatever lands above the old max rowid is ours
+    todo = rows[rows['Status'].isin([INSERTED, CHANGED])].sort_values('Row')
+    owned = {}
+    if not todo.empty:
+        before = conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table}"').fetchone()[0]
+        merge(conn, df.loc[todo['Row'].astype(int).tolist()])
+        added = pd.read_sql_query(
+            f'SELECT rowid AS TargetRowid, {", ".join(target_key_cols)} FROM "{table}" WHERE rowid > ?',
+            conn, params=(before,)
+        )
+        owned = dict(zip(row_keys(added[list(target_key_cols)]), added['TargetRowid']))
+
+    record_fingerprints(conn, source, todo['RowKey'], todo['RowHash'],
+                        [owned.get(key) for key in todo['RowKey']])
+    if own_audit:
+        audit.flush(conn)
+    return counts
+
+
+def record_fingerprints(conn: sqlite3.Connection, source: str,
+                        keys: pd.Series, hashes: pd.Series, target_rowids: Sequence):
+    """Store (or replace) the fingerprints of rows keyed ``keys``; keys without an ident are skipped."""
+    conn.executemany(f"""
+        INSERT INTO "{FINGERPRINT_TABLE}" (Source, RowKey, RowHash, TargetRowid)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (Source, RowKey) DO UPDATE
+           SET RowHash = excluded.RowHash, TargetRowid = excluded.TargetRowid
+    """, (
+        (source, key, int(h), None if rowid is None else int(rowid))
+        for key, h, rowid, keep in zip(keys, hashes, target_rowids, has_ident(keys))
+        if keep
+    ))
+
+
+def log_delta(counts: Dict[str, int]):
+    logging.info(f"Delta vs previous import: {counts[INSERTED]} inserted, {counts[CHANGED]} changed, "
+                 f"{counts[DELETED]} deleted, {counts[UNCHANGED]} unchanged")
+
+
+def clear_fingerprints(conn: sqlite3.Connection, source: str):
+    """Forget ``source``'s previous import, so the next run treats every row as new."""
+    ensure_fingerprint_table(conn)
+    conn.execute(f'DELETE FROM "{FINGERPRINT_TABLE}" WHERE Source = ?', (source,))
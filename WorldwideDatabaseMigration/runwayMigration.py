@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 
+import argparse
 import os
-import re
+import numpy as np
 import pandas as pd
 import sqlite3
 import logging
-from typing import Optional
+from typing import Tuple
+
+import coordinates
+from audit_log import RejectLog
+from sheet_cache import read_excel_cached
+from row_fingerprints import apply_delta, log_delta
 
 # Configure logging
 logging.basicConfig(
@@ -19,144 +25,225 @@ logger = logging.getLogger(__name__)
 XLSX_PATH   = os.path.expanduser('~/Downloads/navdb/Runways.xlsx')
 DB_PATH     = os.path.expanduser('~/Dev/MCDUDatabaseWorldwide.db')
 TABLE_NAME  = 'primary_P_G_base_Airport - Runways'
+SOURCE      = 'Runways.xlsx'
+
+STAGE = "temp.runway_stage"
+
+# Target columns, in staging-table order
+TARGET_COLS = [
+    'LandingFacilityIcaoIdentifier',
+    'RunwayIdentifier',
+    'RunwayLatitude',
+    'RunwayLongitude',
+    'LandingThresholdElevation',
+    'RunwayMagneticBearing',
+    'RunwayLength',
+    'RunwayWidth',
+    'ThresholdCrossingHeight',
+    'DisplacedThresholdDistance',
+    'RunwayGradient',
+    'RunwayLongitude_WGS84',
+    'RunwayLatitude_WGS84',
+]
+
+# Sheet column -> (target column, zero-padded width) for the integer codes
+PADDED_COLS = {
+    'Elevation':                       ('LandingThresholdElevation', 5),
+    'Threshold Displacement Distance': ('DisplacedThresholdDistance', 4),
+}
+
+# Sheet column -> target column for plain numbers (blank = NULL, invalid = 0)
+FLOAT_COLS = {
+    'Length':                    'RunwayLength',
+    'Width':                     'RunwayWidth',
+    'Threshold Crossing Height': 'ThresholdCrossingHeight',
+    'Gradient':                  'RunwayGradient',
+}
+
+# Sheet column -> audit reason when its value was replaced by a default
+DEFAULT_REASONS = {
+    'Elevation':                       'invalid elevation, 00000 used',
+    'Bearing':                         'invalid bearing, 0000 used',
+    'Threshold Displacement Distance': 'invalid displaced threshold, 0000 used',
+    **{name: f"invalid {name.lower()}, 0 used" for name in FLOAT_COLS},
+}
+
+def sheet_col(df: pd.DataFrame, name: str) -> pd.Series:
+    """Column ``name`` as object values with None for missing, or all-None if the sheet lacks it."""
+    if name in df.columns:
+        return coordinates.as_optional(df[name])
+    return pd.Series(None, index=df.index, dtype=object)
+
+def key_col(df: pd.DataFrame, name: str) -> pd.Series:
+    """Stripped text of column ``name``, '' where missing."""
+    return sheet_col(df, name).astype('string').fillna('').str.strip().astype(object)
+
+def padded_int_series(raw: pd.Series, width: int) -> Tuple[pd.Series, pd.Series]:
+    """
+    str(int(float(v))).zfill(width) for a whole column; returns the codes
+    and a mask of rows that did not convert (those get ``width`` zeros).
+    """
+    num = coordinates.to_number_series(raw)
+    bad = ~np.isfinite(num)
+    codes = num.where(~bad, 0).astype('int64').astype(str).str.zfill(width)
+    return codes.astype(object), bad
 
-# Regex to parse DMS strings (e.g. N 61° 09' 15.85")
-DMS_RE = re.compile(
-    r"""^\s*([NSEW])\s*        # Hemisphere
-        (\d+)[°\s]+           # Degrees
-        (\d+)[\'\s]+          # Minutes
-        ([0-9.]+)"?           # Seconds
-        \s*$""",
-    re.VERBOSE
-)
+def bearing_series(raw: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """
+    Strip any trailing letters (e.g. " M"), parse as float, multiply by 10 and
+    zero-pad to 4 digits; returns the bearings and a mask of rows that did not
+    parse (those get 0000).
+    """
+    cleaned = raw.astype('string').fillna('').str.strip().str.replace(r'[^0-9.]+$', '', regex=True)
+    num = pd.to_numeric(cleaned, errors='coerce').astype(float)
+    bad = num.isna()
+    codes = (num.where(~bad, 0) * 10).round().astype('int64').astype(str).str.zfill(4)
+    return codes.astype(object), bad
 
-def dms_to_decimal(s: str) -> Optional[float]:
-    if not isinstance(s, str):
-        return None
-    m = DMS_RE.match(s.strip())
-    if not m:
-        logger.warning(f"Cannot parse DMS coordinate: '{s}'")
-        return None
-    hemi, deg, mins, secs = m.groups()
-    dd = float(deg) + float(mins) / 60 + float(secs) / 3600
-    return -dd if hemi in ('S', 'W') else dd
-
-def parse_bearing(raw: str) -> str:
+def prepare_runways(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the sheet into TARGET_COLS rows, one per input row, column by column.
+    Validation results travel along as boolean columns: 'Missing' (no Airport
+    or Id), 'BadCoords' (unparsable DMS) and one 'Invalid <sheet column>' per
+    value replaced by its default. Pure; nothing is written or logged.
     """
-    Strip any trailing letters (e.g. " M"), parse as float,
-    multiply by 10, and zero-pad to 4 digits.
+    idents = key_col(df, 'Airport')
+    rwy_ids = key_col(df, 'Id')
+    lat = coordinates.dms_to_decimal_series(sheet_col(df, 'Latitude'))
+    lon = coordinates.dms_to_decimal_series(sheet_col(df, 'Longitude'))
+
+    out = pd.DataFrame({
+        'LandingFacilityIcaoIdentifier': idents,
+        'RunwayIdentifier':              rwy_ids,
+        'RunwayLatitude':                coordinates.as_optional(lat),
+        'RunwayLongitude':               coordinates.as_optional(lon),
+        'RunwayLongitude_WGS84':         coordinates.as_optional(lon),
+        'RunwayLatitude_WGS84':          coordinates.as_optional(lat),
+    }, index=df.index)
+    invalid = {}
+
+    for name, (target, width) in PADDED_COLS.items():
+        out[target], bad = padded_int_series(sheet_col(df, name), width)
+        # A sheet without the column means 0, as before; a blank or bad cell is recorded
+        invalid[name] = bad & (name in df.columns)
+
+    out['RunwayMagneticBearing'], invalid['Bearing'] = bearing_series(sheet_col(df, 'Bearing'))
+
+    for name, target in FLOAT_COLS.items():
+        raw = sheet_col(df, name)
+        num = coordinates.to_number_series(raw)
+        invalid[name] = coordinates.invalid_number_mask(raw, num)
+        # A blank cell stays NULL (unknown); a sheet without the column means 0, as before
+        out[target] = num.mask(invalid[name], 0.0) if name in df.columns else 0.0
+
+    out = out[TARGET_COLS]
+    out['Missing'] = (idents == '') | (rwy_ids == '')
+    out['BadCoords'] = lat.isna() | lon.isna()
+    for name, bad in invalid.items():
+        out[f"Invalid {name}"] = bad
+    return out
+
+def write_runways(conn: sqlite3.Connection, df: pd.DataFrame, prepared: pd.DataFrame, audit: RejectLog = None):
     """
-    if not isinstance(raw, str):
-        raw = ''
-    # remove any non-numeric/trailing characters
-    cleaned = re.sub(r'[^0-9.]+$', '', raw.strip())
-    try:
-        val = float(cleaned)
-        bearing_val = int(round(val * 10))
-        return str(bearing_val).zfill(4)
-    except Exception:
-        logger.warning(f"Invalid Bearing '{raw}', defaulting to 0000")
-        return '0000'
+    Insert the rows converted by prepare_runways into TABLE_NAME with one staged
+    INSERT ... SELECT, in the caller's transaction. A row is skipped if its
+    (airport, runway) is already in TABLE_NAME or on an earlier inserted row of
+    the sheet, else if its coordinates are invalid -- the order the checks ran
+    in row by row. Skipped rows and defaulted values go to ``audit``.
+    """
+    own_audit = audit is None
+    if own_audit:
+        audit = RejectLog(SOURCE)
+    cur = conn.cursor()
+    cols = ', '.join(TARGET_COLS)
+    idents = prepared['LandingFacilityIcaoIdentifier']
+
+    missing = prepared['Missing']
+    audit.add_mask(missing, idents, prepared['RunwayIdentifier'], 'Airport/Id', 'missing Airport or Id, skipped')
+    keyed = prepared[~missing]
+
+    cur.execute(f"DROP TABLE IF EXISTS {STAGE}")
+    cur.execute(f"CREATE TABLE {STAGE} (Seq INTEGER PRIMARY KEY, Valid INTEGER, {cols})")
+    cur.executemany(
+        f"INSERT INTO {STAGE} VALUES (?, ?, {', '.join('?' * len(TARGET_COLS))})",
+        ((seq, int(valid), *row) for seq, (valid, row) in enumerate(zip(
+            ~keyed['BadCoords'], keyed[TARGET_COLS].itertuples(index=False, name=None))))
+    )
+    cur.execute("CREATE INDEX temp.runway_stage_key ON runway_stage "
+                "(LandingFacilityIcaoIdentifier, RunwayIdentifier, Valid, Seq)")
+    cur.execute(f"""
+        CREATE INDEX IF NOT EXISTS "idx_runways_airport_runway"
+            ON "{TABLE_NAME}" (LandingFacilityIcaoIdentifier, RunwayIdentifier)
+    """)
+
+    # Anti-join: not in TABLE_NAME and not on an earlier row that gets inserted
+    not_dup = f"""
+        NOT EXISTS (SELECT 1 FROM "{TABLE_NAME}" t
+                     WHERE t.LandingFacilityIcaoIdentifier = s.LandingFacilityIcaoIdentifier
+                       AND t.RunwayIdentifier = s.RunwayIdentifier)
+        AND NOT EXISTS (SELECT 1 FROM {STAGE} e
+                         WHERE e.LandingFacilityIcaoIdentifier = s.LandingFacilityIcaoIdentifier
+                           AND e.RunwayIdentifier = s.RunwayIdentifier
+                           AND e.Valid = 1 AND e.Seq < s.Seq)
+    """
+    dup = np.zeros(len(keyed), dtype=bool)
+    dup[[seq for (seq,) in cur.execute(f"SELECT s.Seq FROM {STAGE} s WHERE NOT ({not_dup})")]] = True
+    dup = pd.Series(dup, index=keyed.index).reindex(prepared.index, fill_value=False)
+    bad_coords = ~missing & prepared['BadCoords'] & ~dup
+
+    cur.execute(f"""
+        INSERT INTO "{TABLE_NAME}" ({cols})
+        SELECT {cols}
+          FROM {STAGE} s
+         WHERE s.Valid = 1 AND {not_dup}
+         ORDER BY s.Seq
+    """)
+    inserted = cur.rowcount
+    cur.execute(f"DROP TABLE {STAGE}")
+
+    audit.add_mask(dup, idents, prepared['RunwayIdentifier'], 'Id', 'duplicate runway, skipped')
+    audit.add_mask(bad_coords, idents,
+                   sheet_col(df, 'Latitude').astype(str) + ' / ' + sheet_col(df, 'Longitude').astype(str),
+                   'Latitude/Longitude', 'invalid coordinates, skipped')
+    done = ~(missing | dup | prepared['BadCoords'])
+    for name, reason in DEFAULT_REASONS.items():
+        audit.add_mask(done & prepared[f"Invalid {name}"], idents, sheet_col(df, name), name, reason)
+
+    if own_audit:
+        audit.flush(conn)
+    logger.info(f"Runway data import complete: {inserted} inserted, {len(prepared) - inserted} skipped.")
+
+def merge_runways(conn: sqlite3.Connection, df: pd.DataFrame, audit: RejectLog = None):
+    """
+    Insert the sheet's new runways into TABLE_NAME on ``conn`` without committing.
+    Skipped rows and defaulted values are recorded in ``audit``; without one
+    they are written to the audit table on ``conn``.
+    """
+    write_runways(conn, df, prepare_runways(df), audit)
+
+def sync_runways(conn: sqlite3.Connection, df: pd.DataFrame):
+    """Merge only the rows changed since the last sync into TABLE_NAME on ``conn`` without committing."""
+    keys = pd.DataFrame({
+        'airport': key_col(df, 'Airport'),
+        'id':      key_col(df, 'Id'),
+    })
+    log_delta(apply_delta(conn, SOURCE, TABLE_NAME, df, keys,
+                          ['LandingFacilityIcaoIdentifier', 'RunwayIdentifier'], merge_runways))
 
 def main():
-    df = pd.read_excel(XLSX_PATH, dtype=str)
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    inserted = 0
-    skipped = 0
-
-    for _, row in df.iterrows():
-        ident  = row.get('Airport', '').strip()
-        rwy_id = row.get('Id',      '').strip()
-        if not ident or not rwy_id:
-            logger.warning("Skipping row with missing Airport or Id")
-            skipped += 1
-            continue
-
-        cursor.execute(
-            f"SELECT 1 FROM \"{TABLE_NAME}\" WHERE LandingFacilityIcaoIdentifier=? AND RunwayIdentifier=?",
-            (ident, rwy_id)
-        )
-        if cursor.fetchone():
-            logger.info(f"Skipping duplicate: {ident} / {rwy_id}")
-            skipped += 1
-            continue
-
-        # Parse latitude/longitude DMS → decimal
-        raw_lat = row.get('Latitude', '')
-        raw_lon = row.get('Longitude','')
-        dec_lat = dms_to_decimal(raw_lat)
-        dec_lon = dms_to_decimal(raw_lon)
-        if dec_lat is None or dec_lon is None:
-            logger.error(f"Invalid coords for {ident}/{rwy_id}: '{raw_lat}', '{raw_lon}'")
-            skipped += 1
-            continue
-
-        # Elevation → 5-digit zero-padded
-        try:
-            elev = str(int(float(row.get('Elevation', 0)))).zfill(5)
-        except:
-            elev = '00000'
-            logger.warning(f"Invalid Elevation for {ident}/{rwy_id}")
-
-        # Bearing → cleaned, *10, zero-pad to 4
-        bearing = parse_bearing(row.get('Bearing', ''))
-
-        # Other numeric fields
-        length = float(row.get('Length', 0) or 0)
-        width  = float(row.get('Width', 0)  or 0)
-        tch    = float(row.get('Threshold Crossing Height', 0) or 0)
-
-        try:
-            dtd = str(int(float(row.get('Threshold Displacement Distance', 0)))).zfill(4)
-        except:
-            dtd = '0000'
-            logger.warning(f"Invalid DisplacedThresholdDistance for {ident}/{rwy_id}")
-
-        grad = float(row.get('Gradient', 0) or 0)
-
-        # Insert into the database
-        cursor.execute(
-            f"""
-            INSERT INTO "{TABLE_NAME}" (
-                LandingFacilityIcaoIdentifier,
-                RunwayIdentifier,
-                RunwayLatitude,
-                RunwayLongitude,
-                LandingThresholdElevation,
-                RunwayMagneticBearing,
-                RunwayLength,
-                RunwayWidth,
-                ThresholdCrossingHeight,
-                DisplacedThresholdDistance,
-                RunwayGradient,
-                RunwayLongitude_WGS84,
-                RunwayLatitude_WGS84
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (
-                ident,
-                rwy_id,
-                dec_lat,
-                dec_lon,
-                elev,
-                bearing,
-                length,
-                width,
-                tch,
-                dtd,
-                grad,
-                dec_lon,
-                dec_lat
-            )
-        )
-        logger.info(f"Inserted: {ident} / {rwy_id}")
-        inserted += 1
+    parser = argparse.ArgumentParser(description="Merge Runways.xlsx into the worldwide database")
+    parser.add_argument('--incremental', action='store_true',
+                        help='apply only rows inserted, changed or deleted since the last --incremental run')
+    args = parser.parse_args()
 
+    df = read_excel_cached(XLSX_PATH, dtype=str)
+    conn = sqlite3.connect(DB_PATH)
+    if args.incremental:
+        sync_runways(conn, df)
+    else:
+        merge_runways(conn, df)
     conn.commit()
     conn.close()
-    logger.info(f"Runway data import complete: {inserted} inserted, {skipped} skipped.")
 
 if __name__ == '__main__':
     main()
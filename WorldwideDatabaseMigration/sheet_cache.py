@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAVE_ARROW = True
+except ImportError:
+    HAVE_ARROW = False
+
+# Cache of parsed Excel sheets. pd.read_excel goes through openpyxl and is by
+# far the slowest step of every import, so each parse is stored once as
+# Parquet (NumPy .npz when pyarrow is not installed) and reused until the
+# workbook changes. Entries are keyed by the workbook's content hash plus the
+# read_excel arguments; an index maps (path, size, mtime) to the content hash,
+# so an unchanged file is not even re-hashed.
+#
+# Numeric and datetime columns are stored as they are; every other column is
+# stored as text (None for missing), so a column mixing numbers and text comes
+# back as text. A cache miss returns the same normalised frame as a hit.
+
+# Cache lives outside the repo and the navdb, next to the declination cache
+CACHE_DIR = os.path.expanduser('~/Dev/SheetCache')
+
+INDEX_FILE = 'index.json'
+
+HASH_CHUNK = 1 << 20
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _load_index(cache_dir: str) -> dict:
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(cache_dir: str, index: dict):
+    # Per-process temp name: parallel ingestion workers may save at the same time
+    tmp = os.path.join(cache_dir, f"{INDEX_FILE}.{os.getpid()}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp, os.path.join(cache_dir, INDEX_FILE))
+
+
+def content_digest(path: str, cache_dir: str = CACHE_DIR) -> str:
+    """Content hash of ``path``, recomputed only when its size or mtime changed."""
+    st = os.stat(path)
+    stat_key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    index = _load_index(cache_dir)
+    digest = index.get(stat_key)
+    if digest is None:
+        digest = file_digest(path)
+        index = {k: v for k, v in index.items() if not k.startswith(os.path.abspath(path) + '|')}
+        index[stat_key] = digest
+        _save_index(cache_dir, index)
+    return digest
+
+
+def entry_key(digest: str, read_kwargs: dict) -> str:
+    args = json.dumps(read_kwargs, sort_keys=True, default=repr)
+    return hashlib.blake2b(f"{digest}|{args}".encode(), digest_size=16).hexdigest()
+
+
+# ——— Storage ———
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """Non-numeric columns as object text with None for missing values."""
+    df = df.copy()
+    for c, col in df.items():
+        if col.dtype.kind not in 'biufM':
+            mask = col.isna()
+            df[c] = col.astype(object).where(mask, col.astype(str)).where(~mask, None).astype(object)
+    return df
+
+
+def _store_parquet(df: pd.DataFrame, stem: str):
+    df.set_axis([f"c{i}" for i in range(df.shape[1])], axis=1).to_parquet(stem + '.parquet')
+
+
+def _load_parquet(stem: str) -> pd.DataFrame:
+    # Arrow strings come back as pandas' string dtype; restore object text
+    return _normalize(pd.read_parquet(stem + '.parquet'))
+
+
+def _store_npz(df: pd.DataFrame, stem: str):
+    arrays = {}
+    for i, (_, col) in enumerate(df.items()):
+        if col.dtype.kind in 'biufM':
+            arrays[f"c{i}"] = col.to_numpy()
+        else:
+            mask = col.isna().to_numpy()
+            arrays[f"c{i}"] = col.where(~mask, '').to_numpy(dtype=str)
+            arrays[f"m{i}"] = mask
+    index = df.index.to_numpy()
+    arrays['index'] = index if index.dtype.kind in 'biuf' else index.astype(str)
+    with open(stem + '.npz', 'wb') as f:
+        np.savez(f, **arrays)
+
+
+def _load_npz(stem: str, n_cols: int) -> pd.DataFrame:
+    with np.load(stem + '.npz', allow_pickle=False) as data:
+        cols = {}
+        for i in range(n_cols):
+            values = data[f"c{i}"]
+            if f"m{i}" in data:
+                values = pd.Series(values, dtype=object).where(~data[f"m{i}"], None)
+            cols[f"c{i}"] = values
+        return pd.DataFrame(cols, index=data['index'])
+
+
+def _store(df: pd.DataFrame, stem: str) -> str:
+    fmt = 'parquet' if HAVE_ARROW else 'npz'
+    (_store_parquet if HAVE_ARROW else _store_npz)(df, stem)
+    meta = {
+        'format': fmt,
+        'columns': list(df.columns),
+        'index_name': df.index.name,
+    }
+    # The meta file is written last; an entry without it is ignored
+    with open(stem + '.json', 'w') as f:
+        json.dump(meta, f, default=str)
+    return fmt
+
+
+def _load(stem: str):
+    try:
+        with open(stem + '.json') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta['format'] == 'parquet':
+        if not HAVE_ARROW:
+            return None
+        df = _load_parquet(stem)
+    else:
+        df = _load_npz(stem, len(meta['columns']))
+    df.columns = meta['columns']
+    df.index.name = meta['index_name']
+    return df
+
+
+# ——— Public ———
+
+def read_excel_cached(path: str, cache_dir: str = CACHE_DIR, **read_kwargs) -> pd.DataFrame:
+    """
+    pd.read_excel(path, **read_kwargs), served from the cache when the same
+    workbook was already parsed with the same arguments.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    start = time.perf_counter()
+    stem = os.path.join(cache_dir, entry_key(content_digest(path, cache_dir), read_kwargs))
+
+    df = _load(stem)
+    if df is not None:
+        logging.info(f"Loaded {os.path.basename(path)} from sheet cache in {time.perf_counter() - start:.3f}s")
+        return df
+
+    df = _normalize(pd.read_excel(path, **read_kwargs))
+    fmt = _store(df, stem)
+    logging.info(f"Parsed {os.path.basename(path)} in {time.perf_counter() - start:.1f}s; cached as {fmt}")
+    return df
+
+
+def clear_cache(cache_dir: str = CACHE_DIR):
+    shutil.rmtree(cache_dir, ignore_errors=True)
@@ -1,28 +1,25 @@
 import sqlite3
 import logging
 import os
+import time
+
+from declination_propagation import build_fix_declinations, propagate_declination
 
 # ——— CONFIGURATION ———
 DB_PATH = os.path.expanduser('~/Dev/MCDUDatabase.db')
 
-# The two tables you want to update:
+# The tables you want to update:
 TARGET_TABLES = [
     "primary_E_R_base_Enroute - Airways and Routes"
 ]
 
-# In order, the source tables and their matching columns:
-SOURCES = [
-    ("primary_P_C_base_Airport - Terminal Waypoints",
-     "WaypointIdentifier", "WaypointLatitude_WGS84", "WaypointLongitude_WGS84"),
-    ("primary_E_A_base_Enroute - Grid Waypoints",
-     "WaypointIdentifier", "WaypointLatitude_WGS84", "WaypointLongitude_WGS84"),
-    ("primary_D_B_base_Navaid_Enroute - NDB Navaid",
-     "NDBIdentifier",      "NDBLatitude_WGS84",      "NDBLongitude_WGS84"),
-    ("primary_D_B_base_Navaid_Terminal - NDB Navaid",
-     "NDBIdentifier",      "NDBLatitude_WGS84",      "NDBLongitude_WGS84"),
-    ("primary_D__base_Navaid - VHF Navaid",
-     "VORIdentifier",      "VORLatitude_WGS84",      "VORLongitude_WGS84")
-]
+# Leg coordinate columns matched against the source fixes
+LAT_COL = "WaypointLatitude_WGS84"
+LON_COL = "WaypointLongitude_WGS84"
+
+# Legs within this many degrees of a same-ident fix still match it;
+# set to 0 for exact coordinate matching only
+MATCH_TOLERANCE_DEG = 0.001
 
 # ——— LOGGING SETUP ———
 logging.basicConfig(
@@ -32,81 +29,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def ensure_declination_column(cur, table_name):
-    """Add Declination column if it doesn't exist."""
-    cols = [r["name"].lower() for r in cur.execute(f"PRAGMA table_info([{table_name}])")]
-    if "declination" not in cols:
-        logger.info(f"Adding Declination column to [{table_name}]")
-        cur.execute(f"ALTER TABLE [{table_name}] ADD COLUMN Declination REAL;")
-    else:
-        logger.info(f"Declination column already exists in [{table_name}]")
-
-def find_declination(cur, ident, lat, lon):
-    """Search each source table in order; return first Declination found or None."""
-    for tbl, idcol, latcol, loncol in SOURCES:
-        row = cur.execute(
-            f"""SELECT Declination
-                  FROM [{tbl}]
-                 WHERE {idcol} = ?
-                   AND {latcol} = ?
-                   AND {loncol} = ?
-                 LIMIT 1""",
-            (ident, lat, lon)
-        ).fetchone()
-        if row:
-            logger.debug(f"Matched in [{tbl}] → Declination={row[0]}")
-            return row[0]
-    return None
-
-def update_table(db_path, table_name):
-    logger.info(f"--- Starting update for [{table_name}] ---")
+def propagate_tables(conn, table_names):
+    start = time.perf_counter()
+    fixes = build_fix_declinations(conn)
+    logger.info(f"Indexed {fixes} distinct fixes in {time.perf_counter() - start:.2f}s")
+
+    for table_name in table_names:
+        logger.info(f"--- Starting update for [{table_name}] ---")
+        start = time.perf_counter()
+        exact, nearby, no_match, skipped, total = propagate_declination(
+            conn, table_name, LAT_COL, LON_COL, tolerance=MATCH_TOLERANCE_DEG
+        )
+        conn.commit()
+        logger.info(
+            f"--- Finished [{table_name}]: {exact} exact and {nearby} nearby matches, "
+            f"{no_match} no-match, {skipped} skipped out of {total} rows "
+            f"in {time.perf_counter() - start:.2f}s ---"
+        )
+
+def update_tables(db_path, table_names):
     conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-
-    ensure_declination_column(cur, table_name)
-    conn.commit()
-
-    # fetch all relevant rows
-    cur.execute(f"""
-        SELECT rowid, FixIdentifier, WaypointLatitude_WGS84 AS lat, WaypointLongitude_WGS84 AS lon
-          FROM [{table_name}]
-    """)
-    rows = cur.fetchall()
-    total = len(rows)
-    logger.info(f"Found {total} rows to process in [{table_name}]")
-
-    # counters
-    updated = 0
-    skipped = 0
-    no_match = 0
-
-    for idx, row in enumerate(rows, 1):
-        ident, lat, lon = row["FixIdentifier"], row["lat"], row["lon"]
-        if not (ident and lat is not None and lon is not None):
-            skipped += 1
-            logger.warning(f"Row {idx}/{total} (rowid={row['rowid']}) missing key data; skipping")
-            continue
-
-        decl = find_declination(cur, ident, lat, lon)
-        if decl is not None:
-            cur.execute(
-                f"UPDATE [{table_name}] SET Declination = ? WHERE rowid = ?",
-                (decl, row["rowid"])
-            )
-            updated += 1
-            logger.info(f"Row {idx}/{total} (rowid={row['rowid']}): set Declination={decl}")
-        else:
-            no_match += 1
-            logger.info(f"Row {idx}/{total} (rowid={row['rowid']}): no matching declination found")
-
-    conn.commit()
+    propagate_tables(conn, table_names)
     conn.close()
-    logger.info(
-        f"--- Finished [{table_name}]: {updated} updated, "
-        f"{no_match} no-match, {skipped} skipped out of {total} rows ---"
-    )
 
 if __name__ == "__main__":
-    for tbl in TARGET_TABLES:
-        update_table(DB_PATH, tbl)
+    update_tables(DB_PATH, TARGET_TABLES)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+One-shot build of the worldwide navdb.
+
+Runs every stage that used to be a separate script -- table/column renames,
+SID/STAR runway expansion, offline declination, declination propagation and
+clustering of the procedure tables -- in dependency order over a single
+connection, then compiles the procedures into the packed records the MCDU
+loads. The Excel merges are not a stage: they write the V1 schema (DMS
+text columns, one NDB table) that the V2 tables do not have, so they stay
+with the V1 scripts and parallel_ingest.py.
+
+The source database is first copied to a scratch file, so the build can use
+unsafe but fast settings (in-memory journal, synchronous=OFF, large page
+cache) and drop user indexes until the end. The result is integrity-checked
+and written to OUTPUT_PATH with VACUUM INTO; the source database is never
+modified. Renames, runway expansion and clustering go through the migration
+registry, so steps the source database already has are skipped.
+"""
+import argparse
+import importlib
+import os
+import re
+import sqlite3
+import sys
+import time
+
+SOURCE_PATH = os.path.expanduser('~/Dev/MCDUWorldwideDatabase.db')
+OUTPUT_PATH = os.path.expanduser('~/Dev/MCDUWorldwideDatabase-build.db')
+
+# Page cache for the build connection, in KiB (negative cache_size)
+CACHE_KIB = 1024 * 1024
+
+BUILD_PRAGMAS = [
+    "PRAGMA journal_mode = MEMORY",
+    "PRAGMA synchronous = OFF",
+    f"PRAGMA cache_size = -{CACHE_KIB}",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA locking_mode = EXCLUSIVE",
+]
+
+PROPAGATION_MODULES = [
+    "sid_star_declination",
+    "airways_routes_declination",
+]
+
+
+def table_exists(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def table_rows(conn, name):
+    return conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+
+
+# ——— Stages ———
+
+def apply_migrations(conn, prefix):
+    """Apply the registered migrations whose name starts with ``prefix`` and are not applied yet."""
+    from migration_registry import apply_pending, registry
+
+    results = apply_pending(conn, [m for m in registry() if m.name.startswith(prefix)])
+    counts = {}
+    for migration, status, detail in results:
+        if status == "not found":
+            print(f"  [{migration.table}] not found, skipped")
+        elif status == "applied":
+            print(f"  [{migration.table}] {detail}")
+        counts[status] = counts.get(status, 0) + 1
+    return ", ".join(f"{n} {status}" for status, n in counts.items()) or "nothing to do"
+
+
+def rename_tables(conn):
+    return apply_migrations(conn, "rename ")
+
+
+def expand_procedures(conn):
+    return apply_migrations(conn, "expand runways ")
+
+
+def cluster_procedures(conn):
+    return apply_migrations(conn, "cluster ")
+
+
+def compile_procedures(conn):
+    from procedure_blobs import compile_procedures as compile_blobs, print_counts
+
+    results = compile_blobs(conn)
+    for table, counts in results.items():
+        print_counts(table, counts)
+    return f"{sum(c.procedures for c in results.values())} procedure records"
+
+
+def fill_declination(conn):
+    from wmm import load_model, decimal_year
+    from declination_grid import load_or_build
+    import offlineDeclination as offline
+
+    try:
+        model = load_model()
+    except FileNotFoundError as e:
+        print(f"  {e}; declination stage skipped", file=sys.stderr)
+        return "skipped"
+    year = decimal_year(offline.startYear, offline.startMonth, offline.startDay)
+    if offline.USE_GRID:
+        offline.fill_declinations(conn, load_or_build(model, year), year)
+    else:
+        cache = offline.offline_cache(model)
+        offline.fill_declinations(conn, model, year, cache)
+        cache.close()
+    return f"{model.name} at {year:.4f}"
+
+
+def propagate_declinations(conn):
+    for name in PROPAGATION_MODULES:
+        module = importlib.import_module(name)
+        tables = [t for t in module.TARGET_TABLES if table_exists(conn, t)]
+        if tables:
+            module.propagate_tables(conn, tables)
+    return "procedure and airway legs"
+
+
+# ——— Index deferral ———
+
+def drop_user_indexes(conn):
+    """Drop every explicit index and return the statements to recreate them."""
+    indexes = conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    ).fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX "{name}"')
+    return [sql for _, sql in indexes]
+
+
+def recreate_indexes(conn, statements):
+    created = 0
+    for sql in statements:
+        sql = re.sub(r'^CREATE\s+(UNIQUE\s+)?INDEX\s+(?!IF\s+NOT\s+EXISTS)',
+                     lambda m: f"CREATE {m.group(1) or ''}INDEX IF NOT EXISTS ",
+                     sql, flags=re.IGNORECASE)
+        try:
+            conn.execute(sql)
+            created += 1
+        except sqlite3.OperationalError as e:
+            # Index on a table or column a stage removed
+            print(f"  Could not recreate index: {e}", file=sys.stderr)
+    return created
+
+
+# ——— Driver ———
+
+def run_stage(conn, label, func, *args):
+    before = conn.total_changes
+    start = time.perf_counter()
+    detail = func(conn, *args)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    changed = conn.total_changes - before
+    print(f"{label:<14} {elapsed:8.2f}s {changed:>10} rows changed  {detail}")
+    return label, elapsed, changed
+
+
+def build(source_path=SOURCE_PATH, output_path=OUTPUT_PATH):
+    if not os.path.isfile(source_path):
+        print(f"Error: database file not found at {source_path}", file=sys.stderr)
+        sys.exit(1)
+
+    work_path = output_path + ".work"
+    for path in (work_path, output_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+    src = sqlite3.connect(source_path)
+    conn = sqlite3.connect(work_path)
+    src.backup(conn)
+    src.close()
+    for pragma in BUILD_PRAGMAS:
+        conn.execute(pragma)
+
+    total_start = time.perf_counter()
+    report = [run_stage(conn, "rename", rename_tables)]
+
+    # Renames rewrite index definitions, so indexes are deferred only after them
+    indexes = drop_user_indexes(conn)
+    conn.commit()
+    print(f"Deferred {len(indexes)} indexes")
+
+    report.append(run_stage(conn, "expansion", expand_procedures))
+    report.append(run_stage(conn, "declination", fill_declination))
+    report.append(run_stage(conn, "propagation", propagate_declinations))
+    # Clustering rewrites the procedure tables, so it runs once their content is final
+    report.append(run_stage(conn, "clustering", cluster_procedures))
+    report.append(run_stage(conn, "blobs", compile_procedures))
+    report.append(run_stage(conn, "indexes", lambda c: f"{recreate_indexes(c, indexes)} recreated"))
+
+    start = time.perf_counter()
+    problems = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+    if problems != ["ok"]:
+        conn.close()
+        print("Integrity check failed:\n  " + "\n  ".join(problems), file=sys.stderr)
+        print(f"Scratch database kept at {work_path}", file=sys.stderr)
+        sys.exit(1)
+    conn.execute("VACUUM INTO ?", (output_path,))
+    conn.close()
+    os.remove(work_path)
+    report.append(("check+vacuum", time.perf_counter() - start, 0))
+    print(f"{'check+vacuum':<14} {report[-1][1]:8.2f}s")
+
+    print(f"Built {output_path} in {time.perf_counter() - total_start:.2f}s")
+    out = sqlite3.connect(output_path)
+    for (name,) in out.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    ).fetchall():
+        print(f"  [{name}]: {table_rows(out, name)} rows")
+    out.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--source", default=SOURCE_PATH, help="database to build from (left unchanged)")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="deliverable database to write")
+    args = parser.parse_args()
+    build(os.path.expanduser(args.source), os.path.expanduser(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Persistent declination cache shared by every declination script.
+
+Values are stored in a small SQLite side database keyed by model, epoch
+(the startYear/startMonth/startDay of params_template) and the coordinate
+quantised to CACHE_PRECISION decimal places. A VOR, the SID legs that
+reference it and the airway legs that pass through it therefore cost one
+lookup between them, and reruns start from what is already known.
+"""
+import sqlite3
+import os
+
+# Cache lives outside the navdb so it survives database rebuilds
+CACHE_PATH = os.path.expanduser('~/Dev/DeclinationCache.db')
+
+# Decimal places kept in the key (3 ≈ 110 m, far below declination gradients)
+CACHE_PRECISION = 3
+
+
+def epoch_of(params):
+    """Epoch string for a NOAA params_template, e.g. '2025-01-29'."""
+    return f"{params['startYear']:04d}-{params['startMonth']:02d}-{params['startDay']:02d}"
+
+
+class DeclinationCache:
+    def __init__(self, model, epoch, path=CACHE_PATH, precision=CACHE_PRECISION):
+        self.model = model
+        self.epoch = epoch
+        self.scale = 10 ** precision
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS DeclinationCache (
+                Model       TEXT    NOT NULL,
+                Epoch       TEXT    NOT NULL,
+                LatKey      INTEGER NOT NULL,
+                LonKey      INTEGER NOT NULL,
+                Declination REAL    NOT NULL,
+                PRIMARY KEY (Model, Epoch, LatKey, LonKey)
+            ) WITHOUT ROWID
+        """)
+        self.conn.commit()
+
+    @classmethod
+    def for_params(cls, params, **kwargs):
+        """Cache for the model/date in a NOAA params_template."""
+        return cls(params["model"], epoch_of(params), **kwargs)
+
+    def _key(self, lat, lon):
+        return round(lat * self.scale), round(lon * self.scale)
+
+    def get(self, lat, lon):
+        """Cached declination for one coordinate, or None."""
+        lat_key, lon_key = self._key(lat, lon)
+        row = self.conn.execute("""
+            SELECT Declination FROM DeclinationCache
+             WHERE Model = ? AND Epoch = ? AND LatKey = ? AND LonKey = ?
+        """, (self.model, self.epoch, lat_key, lon_key)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def get_many(self, lats, lons):
+        """Cached declinations for parallel coordinate sequences (None where missing)."""
+        keys = [self._key(lat, lon) for lat, lon in zip(lats, lons)]
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS _lookup (Idx INTEGER PRIMARY KEY, LatKey INTEGER, LonKey INTEGER)")
+        self.conn.execute("DELETE FROM _lookup")
+        self.conn.executemany(
+            "INSERT INTO _lookup (Idx, LatKey, LonKey) VALUES (?, ?, ?)",
+            ((i, lat_key, lon_key) for i, (lat_key, lon_key) in enumerate(keys))
+        )
+        result = [None] * len(keys)
+        for idx, decl in self.conn.execute("""
+            SELECT l.Idx, c.Declination
+              FROM _lookup l
+              JOIN DeclinationCache c
+                ON c.Model = ? AND c.Epoch = ? AND c.LatKey = l.LatKey AND c.LonKey = l.LonKey
+        """, (self.model, self.epoch)):
+            result[idx] = decl
+        found = sum(d is not None for d in result)
+        self.hits += found
+        self.misses += len(result) - found
+        return result
+
+    def put(self, lat, lon, declination):
+        self.put_many([lat], [lon], [declination])
+
+    def put_many(self, lats, lons, declinations):
+        """Store values; call commit() to make them durable."""
+        self.conn.executemany("""
+            INSERT OR REPLACE INTO DeclinationCache (Model, Epoch, LatKey, LonKey, Declination)
+            VALUES (?, ?, ?, ?, ?)
+        """, (
+            (self.model, self.epoch, *self._key(lat, lon), decl)
+            for lat, lon, decl in zip(lats, lons, declinations)
+            if decl is not None
+        ))
+
+    def commit(self):
+        self.conn.commit()
+
+    def evict(self, before=None):
+        """
+        Drop this cache's model's entries for other epochs. With ``before``
+        (an epoch string) only its epochs older than that are removed. Other
+        models, such as the offline:<model> entries, are never touched.
+        Returns the number of rows deleted.
+        """
+        if before is None:
+            cur = self.conn.execute(
+                "DELETE FROM DeclinationCache WHERE Model = ? AND Epoch <> ?",
+                (self.model, self.epoch)
+            )
+        else:
+            cur = self.conn.execute(
+                "DELETE FROM DeclinationCache WHERE Model = ? AND Epoch < ?",
+                (self.model, before)
+            )
+        self.conn.commit()
+        return cur.rowcount
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"Declination cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate)"
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or prune the declination cache.")
+    parser.add_argument("--evict-before", metavar="YYYY-MM-DD",
+                        help="delete cached values for epochs older than this date")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(CACHE_PATH)
+    if args.evict_before:
+        deleted = 0
+        for (model,) in conn.execute("SELECT DISTINCT Model FROM DeclinationCache").fetchall():
+            cache = DeclinationCache(model, args.evict_before)
+            deleted += cache.evict(before=args.evict_before)
+            cache.close()
+        print(f"Evicted {deleted} cached values older than {args.evict_before}")
+    for model, epoch, count in conn.execute(
+        "SELECT Model, Epoch, COUNT(*) FROM DeclinationCache GROUP BY Model, Epoch ORDER BY Epoch"
+    ):
+        print(f"{model} {epoch}: {count} values")
+    conn.close()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Streaming declination fetcher shared by the NOAA-backed declination scripts.
+
+Rows flow through a producer -> worker pool -> writer pipeline instead of
+fixed asyncio.gather batches: a slow response only occupies one worker,
+transient failures are retried with exponential backoff, requests are
+paced by a token bucket, and every written row is recorded in a checkpoint
+table in the same transaction so an interrupted run resumes where it
+stopped. Checkpoints are keyed by model and epoch, so a run for another
+epoch starts over; they are cleared once a table finishes without
+failures, and the checkpoint table is dropped once it is empty, so it does
+not ship in the navdb. ``api_url`` can point at any stand-in server
+speaking the same JSON format (test_declination_fetcher.py runs one).
+"""
+import asyncio
+import json
+import random
+import sqlite3
+import time
+import aiohttp
+
+from declination_cache import epoch_of
+
+API_URL = "https://www.ngdc.noaa.gov/geomag-web/calculators/calculateDeclination"
+
+# Rows already written, per table, model and epoch; lives in the navdb next
+# to the data until the run completes
+CHECKPOINT_TABLE = "_declination_checkpoint"
+
+# Statuses worth retrying; anything else non-200 is treated as permanent
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_DONE = object()
+
+
+class TokenBucket:
+    """Async token bucket allowing ``rate`` requests/second with bursts up to ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def ensure_declination_column(cur, table_name):
+    """Add Declination column if it doesn't exist."""
+    cols = [r[1].lower() for r in cur.execute(f'PRAGMA table_info("{table_name}")')]
+    if "declination" not in cols:
+        cur.execute(f'ALTER TABLE "{table_name}" ADD COLUMN Declination REAL')
+
+
+def ensure_checkpoint_table(cur):
+    cols = [r[1] for r in cur.execute(f"PRAGMA table_info({CHECKPOINT_TABLE})")]
+    if cols and "Model" not in cols:
+        # Written before checkpoints recorded the model; its epoch is unknown
+        cur.execute(f"DROP TABLE {CHECKPOINT_TABLE}")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+            TableName TEXT    NOT NULL,
+            Model     TEXT    NOT NULL,
+            Epoch     TEXT    NOT NULL,
+            RowId     INTEGER NOT NULL,
+            PRIMARY KEY (TableName, Model, Epoch, RowId)
+        ) WITHOUT ROWID
+    """)
+
+
+def reset_checkpoint(conn, table_name):
+    """
+    Forget progress for one table, for every model and epoch, so the next run
+    fetches every row again. Drops the checkpoint table once it is empty.
+    """
+    cur = conn.cursor()
+    ensure_checkpoint_table(cur)
+    cur.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE TableName = ?", (table_name,))
+    if cur.execute(f"SELECT 1 FROM {CHECKPOINT_TABLE} LIMIT 1").fetchone() is None:
+        cur.execute(f"DROP TABLE {CHECKPOINT_TABLE}")
+    conn.commit()
+
+
+async def request_declination(session, api_url, params_template, label, lat, lon,
+                              bucket, retries, backoff):
+    """One declination from the calculator, retrying transient failures; None if it gives up."""
+    params = {
+        **params_template,
+        "lat1": abs(lat),
+        "lat1Hemisphere": "N" if lat >= 0 else "S",
+        "lon1": abs(lon),
+        "lon1Hemisphere": "E" if lon >= 0 else "W"
+    }
+
+    for attempt in range(retries + 1):
+        await bucket.acquire()
+        try:
+            async with session.get(api_url, params=params) as response:
+                if response.status == 200:
+                    # A malformed answer will not improve on retry; only this point is lost
+                    try:
+                        return float(json.loads(await response.text())["result"][0]["declination"])
+                    except (UnicodeDecodeError, ValueError, KeyError, IndexError, TypeError) as e:
+                        print(f"[bad response] {label}: {type(e).__name__}: {e}")
+                        return None
+                if response.status not in RETRY_STATUSES:
+                    print(f"[HTTP {response.status}] {label}")
+                    return None
+                reason = f"HTTP {response.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            reason = type(e).__name__
+
+        if attempt < retries:
+            delay = backoff * 2 ** attempt * (1 + random.random())
+            await asyncio.sleep(delay)
+
+    print(f"[gave up] {label}: {reason} after {retries + 1} attempts")
+    return None
+
+
+async def fetch_table_declinations(db_path, table_name, label_col, lat_expr, lon_expr,
+                                   params_template, api_url=API_URL, cache=None,
+                                   workers=20, rate=20.0, retries=5, backoff=0.5,
+                                   batch_size=200, timeout=30, restart=False):
+    """
+    Fill the Declination column of ``table_name`` from the calculator.
+    Rows checkpointed for the same model and epoch are skipped, unless
+    ``restart`` is set. Once no row is left failed, the table's checkpoint
+    is cleared. Returns a dict of counters.
+    """
+    model, epoch = params_template["model"], epoch_of(params_template)
+    conn = sqlite3.connect(db_path)
+    if restart:
+        reset_checkpoint(conn, table_name)
+    cur = conn.cursor()
+    ensure_declination_column(cur, table_name)
+    ensure_checkpoint_table(cur)
+    conn.commit()
+
+    cur.execute(f"""
+        SELECT t.rowid, {label_col}, {lat_expr}, {lon_expr}
+          FROM "{table_name}" t
+         WHERE NOT EXISTS (
+               SELECT 1 FROM {CHECKPOINT_TABLE} c
+                WHERE c.TableName = ? AND c.Model = ? AND c.Epoch = ? AND c.RowId = t.rowid)
+    """, (table_name, model, epoch))
+    rows = cur.fetchall()
+    total = len(rows)
+    print(f"[{table_name}]: {total} rows to process ({model} {epoch})")
+
+    counts = {"updated": 0, "failed": 0, "skipped": 0}
+    jobs = asyncio.Queue(maxsize=workers * 4)
+    results = asyncio.Queue(maxsize=batch_size * 2)
+    bucket = TokenBucket(rate)
+
+    async def produce():
+        for rowid, label, lat_s, lon_s in rows:
+            try:
+                lat, lon = float(lat_s), float(lon_s)
+            except (TypeError, ValueError):
+                print(f"Skipping {label}: missing or invalid coords")
+                counts["skipped"] += 1
+                continue
+            await jobs.put((rowid, label, lat, lon))
+        for _ in range(workers):
+            await jobs.put(_DONE)
+
+    async def work(session):
+        while True:
+            job = await jobs.get()
+            if job is _DONE:
+                await results.put(_DONE)
+                return
+            rowid, label, lat, lon = job
+            decl = cache.get(lat, lon) if cache else None
+            if decl is None:
+                decl = await request_declination(
+                    session, api_url, params_template, label, lat, lon, bucket, retries, backoff
+                )
+                if decl is not None and cache:
+                    cache.put(lat, lon, decl)
+            await results.put((rowid, decl))
+
+    def flush(batch):
+        cur.executemany(
+            f'UPDATE "{table_name}" SET Declination = ? WHERE rowid = ?',
+            [(decl, rowid) for rowid, decl in batch]
+        )
+        cur.executemany(
+            f"INSERT OR IGNORE INTO {CHECKPOINT_TABLE} (TableName, Model, Epoch, RowId) VALUES (?, ?, ?, ?)",
+            [(table_name, model, epoch, rowid) for rowid, _ in batch]
+        )
+        conn.commit()
+        if cache:
+            cache.commit()
+
+    async def write():
+        batch = []
+        finished = 0
+        started = time.monotonic()
+        while finished < workers:
+            item = await results.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            rowid, decl = item
+            if decl is None:
+                counts["failed"] += 1
+                continue
+            batch.append((rowid, decl))
+            counts["updated"] += 1
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch.clear()
+                done = counts["updated"] + counts["failed"] + counts["skipped"]
+                elapsed = time.monotonic() - started
+                print(f"[{table_name}]: {done}/{total} processed "
+                      f"({counts['updated'] / elapsed:.1f} rows/s)")
+        if batch:
+            flush(batch)
+
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    try:
+        async with aiohttp.ClientSession(timeout=client_timeout) as session:
+            await asyncio.gather(
+                produce(),
+                write(),
+                *(work(session) for _ in range(workers))
+            )
+        if counts["failed"] == 0:
+            # Every row is written; a rerun starts over (from the cache)
+            reset_checkpoint(conn, table_name)
+    finally:
+        conn.close()
+
+    print(f"[{table_name}]: {counts['updated']} updated, {counts['failed']} failed, "
+          f"{counts['skipped']} skipped out of {total} rows")
+    return counts
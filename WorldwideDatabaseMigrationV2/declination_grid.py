@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Precomputed global declination grid.
+
+Declination varies smoothly, so instead of evaluating the WMM at each of
+the hundreds of thousands of fixes, the grid is evaluated once per cycle
+at GRID_SPACING degrees, stored as a compact float32 .npz, and every table
+is filled by vectorised bilinear interpolation. ``error_report`` compares
+the grid with exact evaluation at random sample points.
+"""
+import os
+import numpy as np
+
+GRID_SPACING = 0.5
+GRID_DIR = os.path.expanduser('~/Dev/declination_grids')
+
+
+class DeclinationGrid:
+    def __init__(self, values, spacing, year, model_name):
+        self.values = values
+        self.spacing = spacing
+        self.year = year
+        self.model_name = model_name
+
+    @classmethod
+    def build(cls, model, year, spacing=GRID_SPACING):
+        lats = np.arange(-90.0, 90.0 + spacing / 2, spacing)
+        lons = np.arange(-180.0, 180.0 + spacing / 2, spacing)
+        lat_mesh, lon_mesh = np.meshgrid(lats, lons, indexing="ij")
+        values = model.declination(lat_mesh, lon_mesh, year).astype(np.float32)
+        return cls(values, spacing, year, model.name)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["values"], float(data["spacing"]), float(data["year"]), str(data["model"]))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, values=self.values, spacing=self.spacing,
+                            year=self.year, model=self.model_name)
+
+    def declination(self, lat, lon, year=None):
+        """
+        Bilinear interpolation of the grid. Corners are blended as unit
+        vectors so cells straddling the ±180° jump near the magnetic poles
+        stay sensible. ``year`` is accepted for compatibility with
+        MagneticModel and ignored: the grid is fixed to its build date.
+        """
+        lat = np.clip(np.asarray(lat, dtype=float), -90.0, 90.0)
+        lon = (np.asarray(lon, dtype=float) + 180.0) % 360.0 - 180.0
+        n_lat, n_lon = self.values.shape
+
+        fi = (lat + 90.0) / self.spacing
+        fj = (lon + 180.0) / self.spacing
+        i0 = np.clip(np.floor(fi).astype(int), 0, n_lat - 2)
+        j0 = np.clip(np.floor(fj).astype(int), 0, n_lon - 2)
+        ti = fi - i0
+        tj = fj - j0
+
+        corners = np.radians(np.stack([
+            self.values[i0, j0], self.values[i0, j0 + 1],
+            self.values[i0 + 1, j0], self.values[i0 + 1, j0 + 1]
+        ]).astype(float))
+        weights = np.stack([
+            (1 - ti) * (1 - tj), (1 - ti) * tj,
+            ti * (1 - tj), ti * tj
+        ])
+        s = (weights * np.sin(corners)).sum(axis=0)
+        c = (weights * np.cos(corners)).sum(axis=0)
+        return np.degrees(np.arctan2(s, c))
+
+    def error_report(self, model, samples=20000, max_abs_lat=89.0, seed=0):
+        """Compare against exact WMM at random points; returns (max, mean, p99) abs error in degrees."""
+        rng = np.random.default_rng(seed)
+        lat = np.degrees(np.arcsin(rng.uniform(-1, 1, samples)))
+        lat = lat[np.abs(lat) <= max_abs_lat]
+        lon = rng.uniform(-180.0, 180.0, lat.size)
+        exact = model.declination(lat, lon, self.year)
+        err = np.abs((self.declination(lat, lon) - exact + 180.0) % 360.0 - 180.0)
+        return float(err.max()), float(err.mean()), float(np.percentile(err, 99))
+
+
+def grid_path(model, year, spacing=GRID_SPACING, directory=GRID_DIR):
+    return os.path.join(directory, f"{model.name}_{year:.4f}_{spacing:g}.npz")
+
+
+def load_or_build(model, year, spacing=GRID_SPACING, directory=GRID_DIR):
+    """Grid for this model/date, built and saved on first use in a cycle."""
+    path = grid_path(model, year, spacing, directory)
+    if os.path.isfile(path):
+        return DeclinationGrid.load(path)
+    grid = DeclinationGrid.build(model, year, spacing)
+    grid.save(path)
+    return grid
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Set-based propagation of fix declinations onto procedure and airway legs.
+
+Instead of probing every SOURCES table once per leg, the sources are
+collapsed once into a temporary (ident, lat, lon) -> declination table,
+filled in SOURCES order with INSERT OR IGNORE so the first source to know a
+fix wins, exactly like the old per-row search. Each target table is then
+updated with a single UPDATE ... FROM join against that table's primary key.
+
+Legs whose coordinates differ from every same-ident fix by rounding noise
+fall back to the nearest same-ident fix within MATCH_TOLERANCE_DEG, found
+through an R*Tree over all fix positions rather than a table scan.
+"""
+import logging
+
+# In order, the source tables and their matching columns:
+SOURCES = [
+    ("primary_P_C_base_Airport - Terminal Waypoints",
+     "WaypointIdentifier", "WaypointLatitude_WGS84", "WaypointLongitude_WGS84"),
+    ("primary_E_A_base_Enroute - Grid Waypoints",
+     "WaypointIdentifier", "WaypointLatitude_WGS84", "WaypointLongitude_WGS84"),
+    ("primary_D_B_base_Navaid_Enroute - NDB Navaid",
+     "NDBIdentifier",      "NDBLatitude_WGS84",      "NDBLongitude_WGS84"),
+    ("primary_D_B_base_Navaid_Terminal - NDB Navaid",
+     "NDBIdentifier",      "NDBLatitude_WGS84",      "NDBLongitude_WGS84"),
+    ("primary_D__base_Navaid - VHF Navaid",
+     "VORIdentifier",      "VORLatitude_WGS84",      "VORLongitude_WGS84")
+]
+
+FIX_TABLE = "temp.fix_declination"
+POINT_TABLE = "temp.fix_points"
+RTREE_TABLE = "temp.fix_rtree"
+
+# Largest lat/lon difference (degrees) still treated as the same fix
+MATCH_TOLERANCE_DEG = 0.001
+
+logger = logging.getLogger(__name__)
+
+
+def _numeric(col):
+    """SQL condition: column holds a plain decimal number (text or numeric)."""
+    return (f"(trim({col}) GLOB '*[0-9]*' "
+            f"AND trim({col}) NOT GLOB '*[^0-9.+-]*')")
+
+
+def row_key_columns(cur, table_name):
+    """Columns identifying a row: rowid, or the primary key of a WITHOUT ROWID table."""
+    sql = cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone()
+    if sql is None or "WITHOUT ROWID" not in sql[0].upper():
+        return ["rowid"]
+    pk = sorted((r[5], r[1]) for r in cur.execute(f"PRAGMA table_info([{table_name}])") if r[5])
+    return [f"[{name}]" for _, name in pk]
+
+
+def ensure_declination_column(cur, table_name):
+    """Add Declination column if it doesn't exist."""
+    cols = [r[1].lower() for r in cur.execute(f"PRAGMA table_info([{table_name}])")]
+    if "declination" not in cols:
+        logger.info(f"Adding Declination column to [{table_name}]")
+        cur.execute(f"ALTER TABLE [{table_name}] ADD COLUMN Declination REAL;")
+    else:
+        logger.info(f"Declination column already exists in [{table_name}]")
+
+
+def build_fix_declinations(conn, sources=SOURCES):
+    """
+    Collapse the source tables into FIX_TABLE, keyed by (Ident, Lat, Lon).
+    Earlier sources take priority. Returns the number of distinct fixes.
+    """
+    cur = conn.cursor()
+    cur.execute(f"DROP TABLE IF EXISTS {FIX_TABLE}")
+    cur.execute(f"""
+        CREATE TABLE {FIX_TABLE} (
+            Ident, Lat, Lon, Declination,
+            PRIMARY KEY (Ident, Lat, Lon)
+        ) WITHOUT ROWID
+    """)
+    for tbl, idcol, latcol, loncol in sources:
+        cur.execute(f"""
+            INSERT OR IGNORE INTO {FIX_TABLE} (Ident, Lat, Lon, Declination)
+            SELECT {idcol}, {latcol}, {loncol}, Declination
+              FROM [{tbl}]
+             WHERE {idcol} IS NOT NULL
+               AND {latcol} IS NOT NULL
+               AND {loncol} IS NOT NULL
+             ORDER BY rowid
+        """)
+        logger.info(f"Loaded {cur.rowcount} fixes from [{tbl}]")
+
+    # Every fix position with a declination, for tolerant matching
+    cur.execute(f"DROP TABLE IF EXISTS {POINT_TABLE}")
+    cur.execute(f"DROP TABLE IF EXISTS {RTREE_TABLE}")
+    cur.execute(f"""
+        CREATE TABLE {POINT_TABLE} (
+            Id INTEGER PRIMARY KEY, Ident, Lat REAL, Lon REAL, Declination, Priority INTEGER
+        )
+    """)
+    cur.execute(f"CREATE VIRTUAL TABLE {RTREE_TABLE} USING rtree(Id, MinLat, MaxLat, MinLon, MaxLon)")
+    for priority, (tbl, idcol, latcol, loncol) in enumerate(sources):
+        cur.execute(f"""
+            INSERT INTO {POINT_TABLE} (Ident, Lat, Lon, Declination, Priority)
+            SELECT {idcol}, CAST({latcol} AS REAL), CAST({loncol} AS REAL), Declination, ?
+              FROM [{tbl}]
+             WHERE {idcol} IS NOT NULL
+               AND Declination IS NOT NULL
+               AND {_numeric(latcol)}
+               AND {_numeric(loncol)}
+        """, (priority,))
+    cur.execute(f"""
+        INSERT INTO {RTREE_TABLE} (Id, MinLat, MaxLat, MinLon, MaxLon)
+        SELECT Id, Lat, Lat, Lon, Lon FROM {POINT_TABLE}
+    """)
+    return cur.execute(f"SELECT COUNT(*) FROM {FIX_TABLE}").fetchone()[0]
+
+
+def propagate_declination(conn, table_name, lat_col, lon_col, ident_col="FixIdentifier",
+                          tolerance=MATCH_TOLERANCE_DEG):
+    """
+    Copy declinations from FIX_TABLE onto every matching row of ``table_name``:
+    exact (ident, lat, lon) matches first, then the nearest same-ident fix
+    within ``tolerance`` degrees for legs with no exact match. A leg whose
+    exact match has no declination keeps none, as the highest-priority
+    source decides; the fallback is not used for it.
+    build_fix_declinations() must have run on this connection.
+    Returns (exact, nearby, no_match, skipped, total).
+    """
+    cur = conn.cursor()
+    ensure_declination_column(cur, table_name)
+
+    total, skipped = cur.execute(f"""
+        SELECT COUNT(*),
+               COALESCE(SUM({ident_col} IS NULL OR {ident_col} = ''
+                            OR {lat_col} IS NULL OR {lon_col} IS NULL), 0)
+          FROM [{table_name}]
+    """).fetchone()
+
+    cur.execute(f"""
+        UPDATE [{table_name}]
+           SET Declination = f.Declination
+          FROM {FIX_TABLE} f
+         WHERE f.Ident = [{table_name}].{ident_col}
+           AND f.Lat   = [{table_name}].{lat_col}
+           AND f.Lon   = [{table_name}].{lon_col}
+           AND f.Declination IS NOT NULL
+    """)
+    exact = cur.rowcount
+
+    nearby = 0
+    if tolerance:
+        t = f"[{table_name}]"
+        key = row_key_columns(cur, table_name)
+        key_select = ", ".join(f"t.{col} AS k{i}" for i, col in enumerate(key))
+        key_match = " AND ".join(f"{t}.{col} = c.k{i}" for i, col in enumerate(key))
+        # rowcount is not reported for WITH ... UPDATE, so count via total_changes
+        before = conn.total_changes
+        cur.execute(f"""
+            WITH candidates AS (
+                SELECT {key_select},
+                       p.Declination AS decl,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY {", ".join(f"t.{col}" for col in key)}
+                           ORDER BY (p.Lat - t.{lat_col}) * (p.Lat - t.{lat_col})
+                                  + (p.Lon - t.{lon_col}) * (p.Lon - t.{lon_col}),
+                                    p.Priority
+                       ) AS rn
+                  FROM {t} t
+                  JOIN {RTREE_TABLE} r
+                    ON r.MinLat <= t.{lat_col} + :tol AND r.MaxLat >= t.{lat_col} - :tol
+                   AND r.MinLon <= t.{lon_col} + :tol AND r.MaxLon >= t.{lon_col} - :tol
+                  JOIN {POINT_TABLE} p
+                    ON p.Id = r.Id AND p.Ident = t.{ident_col}
+                 WHERE {_numeric("t." + lat_col)}
+                   AND {_numeric("t." + lon_col)}
+                   AND abs(p.Lat - t.{lat_col}) <= :tol
+                   AND abs(p.Lon - t.{lon_col}) <= :tol
+                   AND NOT EXISTS (
+                       SELECT 1 FROM {FIX_TABLE} f
+                        WHERE f.Ident = t.{ident_col}
+                          AND f.Lat = t.{lat_col}
+                          AND f.Lon = t.{lon_col})
+            )
+            UPDATE {t}
+               SET Declination = c.decl
+              FROM candidates c
+             WHERE c.rn = 1 AND {key_match}
+        """, {"tol": tolerance})
+        nearby = conn.total_changes - before
+
+    return exact, nearby, total - exact - nearby - skipped, skipped, total
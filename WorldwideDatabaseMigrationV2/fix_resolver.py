@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+In-memory fix resolver for jobs that look fixes up leg by leg in Python.
+
+Loads every SOURCES table once into parallel arrays (one slot per distinct
+fix) with two hash indexes on top: (identifier, lat, lon) and
+(identifier, ICAO region). Lookups are O(1) dictionary hits instead of a
+query per leg, and follow SOURCES priority: when several tables know the
+same key, the earliest table wins. procedure_blobs resolves leg positions
+through it; the declination propagation jobs do their lookups in SQL (see
+declination_propagation) and do not need it.
+"""
+import math
+from array import array
+from collections import namedtuple
+
+from declination_propagation import SOURCES
+
+# ICAO region column of each SOURCES table
+REGION_COLUMNS = {
+    "primary_P_C_base_Airport - Terminal Waypoints": "WaypointIcaoRegionCode",
+    "primary_E_A_base_Enroute - Grid Waypoints":     "WaypointIcaoRegionCode",
+    "primary_D_B_base_Navaid_Enroute - NDB Navaid":  "NdbIcaoRegionCode",
+    "primary_D_B_base_Navaid_Terminal - NDB Navaid": "NdbIcaoRegionCode",
+    "primary_D__base_Navaid - VHF Navaid":           "VorIcaoRegionCode",
+}
+
+Fix = namedtuple("Fix", "ident region lat lon declination source")
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class FixResolver:
+    def __init__(self, conn, sources=SOURCES):
+        self.sources = [tbl for tbl, *_ in sources]
+        self.ident = []
+        self.region = []
+        self.source = array("B")
+        self.lat = array("d")
+        self.lon = array("d")
+        self.declination = array("d")
+        self._by_position = {}
+        self._by_region = {}
+
+        existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for priority, (tbl, idcol, latcol, loncol) in enumerate(sources):
+            if tbl not in existing:
+                continue
+            cols = {r[1] for r in conn.execute(f"PRAGMA table_info([{tbl}])")}
+            region_expr = REGION_COLUMNS.get(tbl) if REGION_COLUMNS.get(tbl) in cols else "NULL"
+            decl_expr = "Declination" if "Declination" in cols else "NULL"
+            for ident, region, lat, lon, decl in conn.execute(f"""
+                SELECT {idcol}, {region_expr}, {latcol}, {loncol}, {decl_expr}
+                  FROM [{tbl}]
+                 WHERE {idcol} IS NOT NULL
+                 ORDER BY rowid
+            """):
+                self._add(priority, ident, region, _to_float(lat), _to_float(lon), decl)
+
+    def _add(self, priority, ident, region, lat, lon, decl):
+        has_position = not (math.isnan(lat) or math.isnan(lon))
+        pos_key = (ident, lat, lon)
+        region_key = (ident, region or None)
+        if ((not has_position or pos_key in self._by_position)
+                and (region_key[1] is None or region_key in self._by_region)):
+            return
+        idx = len(self.ident)
+        self.ident.append(ident)
+        self.region.append(region)
+        self.source.append(priority)
+        self.lat.append(lat)
+        self.lon.append(lon)
+        self.declination.append(_to_float(decl))
+        if has_position:
+            self._by_position.setdefault(pos_key, idx)
+        if region_key[1] is not None:
+            self._by_region.setdefault(region_key, idx)
+
+    def __len__(self):
+        return len(self.ident)
+
+    def fix(self, idx):
+        decl = self.declination[idx]
+        return Fix(
+            self.ident[idx], self.region[idx], self.lat[idx], self.lon[idx],
+            None if math.isnan(decl) else decl, self.sources[self.source[idx]]
+        )
+
+    def index_of(self, ident, lat, lon):
+        """Slot of the highest-priority fix at exactly this position, or None."""
+        lat, lon = _to_float(lat), _to_float(lon)
+        if math.isnan(lat) or math.isnan(lon):
+            return None
+        return self._by_position.get((ident, lat, lon))
+
+    def index_in_region(self, ident, region):
+        """Slot of the highest-priority fix with this ident in an ICAO region, or None."""
+        return self._by_region.get((ident, region))
+
+    def resolve(self, ident, lat, lon):
+        idx = self.index_of(ident, lat, lon)
+        return None if idx is None else self.fix(idx)
+
+    def resolve_in_region(self, ident, region):
+        idx = self.index_in_region(ident, region)
+        return None if idx is None else self.fix(idx)
+
+    def declination_at(self, ident, lat, lon):
+        idx = self.index_of(ident, lat, lon)
+        if idx is None or math.isnan(self.declination[idx]):
+            return None
+        return self.declination[idx]
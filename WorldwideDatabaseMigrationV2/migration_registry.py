@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Versioned registry of the navdb schema migrations.
+
+Every rename, "modify" and layout step is registered here once, in the order the
+build applies them, under a stable name. Applied steps are recorded in
+MIGRATIONS_TABLE of the database itself, and PRAGMA user_version holds the
+highest version applied so far, so rerunning a script or the build skips
+what is already done instead of failing half-way (a second table rename) or
+repeating a multi-minute rewrite (a second runway expansion). A database
+migrated before the registry existed is recognised by each step's ``done``
+check, and the step is recorded without being run again.
+"""
+import argparse
+import functools
+import os
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+
+from procedure_clustering import cluster_with_benchmark, is_clustered
+from procedure_expansion import PROCEDURE_TABLES, expand_table, print_counts
+from schema_migration import load_specs, rename_table, table_exists
+
+db_path = os.path.expanduser('~/Dev/MCDUWorldwideDatabase.db')
+
+MIGRATIONS_TABLE = "schema_migrations"
+
+# version: position in the build order; table: what the step works on
+# (absent = nothing to do); apply(conn) -> detail text;
+# done(conn) -> True if the step's effect is already present
+Migration = namedtuple("Migration", "version name table apply done")
+
+
+# ——— Steps ———
+
+def _rename_migration(version, spec):
+    def apply(conn):
+        return rename_table(conn, *spec)
+
+    def done(conn):
+        return not table_exists(conn, spec.old_table) and table_exists(conn, spec.new_table)
+
+    return Migration(version, f"rename {spec.old_table}", spec.old_table, apply, done)
+
+
+def _expansion_migration(version, table):
+    def apply(conn):
+        counts = expand_table(conn, table)
+        print_counts(table, counts)
+        return f"{counts.kept + counts.all_runways + counts.both_sides} rows"
+
+    def done(conn):
+        # Expanded tables have no ALL or RW..B transitions left
+        return table_exists(conn, table) and conn.execute(
+            f'SELECT 1 FROM "{table}" WHERE TransitionIdentifier = \'ALL\' '
+            f'OR TransitionIdentifier GLOB \'RW*B\' LIMIT 1'
+        ).fetchone() is None
+
+    return Migration(version, f"expand runways {table}", table, apply, done)
+
+
+def _cluster_migration(version, table):
+    def apply(conn):
+        return cluster_with_benchmark(conn, table)
+
+    def done(conn):
+        return is_clustered(conn, table)
+
+    return Migration(version, f"cluster {table}", table, apply, done)
+
+
+@functools.lru_cache(maxsize=None)
+def registry():
+    """Every migration in build order. Built on first use: the step modules import this one."""
+    specs = load_specs()
+    migrations = [_rename_migration(version, spec) for version, spec in enumerate(specs, 1)]
+    migrations += [_expansion_migration(version, table)
+                   for version, table in enumerate(PROCEDURE_TABLES, len(migrations) + 1)]
+    migrations += [_cluster_migration(version, table)
+                   for version, table in enumerate(PROCEDURE_TABLES, len(migrations) + 1)]
+    return tuple(migrations)
+
+
+# ——— Bookkeeping ———
+
+def ensure_migrations_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{MIGRATIONS_TABLE}" (
+            Version   INTEGER NOT NULL,
+            Name      TEXT    PRIMARY KEY,
+            AppliedAt TEXT    DEFAULT (datetime('now')),
+            Seconds   REAL,
+            Detail    TEXT
+        )
+    """)
+
+
+def applied_names(conn):
+    ensure_migrations_table(conn)
+    return {name for (name,) in conn.execute(f'SELECT Name FROM "{MIGRATIONS_TABLE}"')}
+
+
+def record(conn, migration, seconds, detail):
+    conn.execute(
+        f'INSERT OR REPLACE INTO "{MIGRATIONS_TABLE}" (Version, Name, Seconds, Detail) VALUES (?, ?, ?, ?)',
+        (migration.version, migration.name, seconds, detail)
+    )
+    if migration.version > conn.execute("PRAGMA user_version").fetchone()[0]:
+        conn.execute(f"PRAGMA user_version = {migration.version}")
+
+
+def find(names):
+    """The registered migrations called ``names``, in registry order."""
+    unknown = set(names) - {m.name for m in registry()}
+    if unknown:
+        raise KeyError(f"unknown migration(s): {', '.join(sorted(unknown))}")
+    return [m for m in registry() if m.name in names]
+
+
+# ——— Runner ———
+
+def apply_pending(conn, migrations=None):
+    """
+    Run every migration of ``migrations`` (default: all) not yet applied to
+    ``conn``, in registry order, on ``conn`` without committing: a transaction
+    is begun if none is open, and left for the caller to commit. Each step and
+    its record share a savepoint, so a failing step is undone on its own and
+    the error re-raised with the earlier steps still pending commit. Returns
+    [(migration, status, detail)]; status is 'applied', 'recorded' (effect
+    already present), 'skipped' (already applied) or 'not found'.
+    """
+    results = []
+    # A SAVEPOINT outside a transaction would commit on its RELEASE
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    conn.execute("SAVEPOINT migrations")
+    applied = applied_names(conn)
+    for migration in migrations or registry():
+        if migration.name in applied:
+            results.append((migration, "skipped", ""))
+        elif migration.done(conn):
+            record(conn, migration, 0.0, "found applied")
+            results.append((migration, "recorded", ""))
+        elif not table_exists(conn, migration.table):
+            results.append((migration, "not found", ""))
+        else:
+            start = time.perf_counter()
+            conn.execute("SAVEPOINT migration_step")
+            try:
+                detail = str(migration.apply(conn))
+                record(conn, migration, time.perf_counter() - start, detail)
+            except BaseException:
+                conn.execute("ROLLBACK TO migration_step")
+                conn.execute("RELEASE migration_step")
+                conn.execute("RELEASE migrations")
+                raise
+            conn.execute("RELEASE migration_step")
+            results.append((migration, "applied", detail))
+    conn.execute("RELEASE migrations")
+    return results
+
+
+def print_results(results):
+    for migration, status, detail in results:
+        print(f"  {migration.version:>3} {migration.name:<62} {status}" + (f"  {detail}" if detail else ""))
+
+
+def run_script(path, names):
+    """Entry point of the individual rename/modify scripts: apply ``names`` on the database at ``path``."""
+    if not os.path.isfile(path):
+        print(f"Error: database file not found at {path}", file=sys.stderr)
+        sys.exit(1)
+    conn = sqlite3.connect(path)
+    try:
+        results = apply_pending(conn, find(names))
+    except sqlite3.Error as e:
+        # Keep the steps that completed before the failing one
+        conn.commit()
+        print("SQLite error during migration:", e, file=sys.stderr)
+        sys.exit(1)
+    except BaseException:
+        conn.commit()
+        raise
+    else:
+        conn.commit()
+    finally:
+        conn.close()
+    print_results(results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the pending navdb schema migrations")
+    parser.add_argument("--db", default=db_path)
+    parser.add_argument("--list", action="store_true", help="show every migration and whether it is applied")
+    parser.add_argument("--only", action="append", metavar="NAME", help="apply just this migration (repeatable)")
+    args = parser.parse_args()
+
+    path = os.path.expanduser(args.db)
+    if args.list:
+        conn = sqlite3.connect(path)
+        applied = applied_names(conn)
+        print(f"user_version = {conn.execute('PRAGMA user_version').fetchone()[0]}")
+        for m in registry():
+            print(f"  {m.version:>3} {m.name:<62} {'applied' if m.name in applied else 'pending'}")
+        conn.close()
+        return
+    run_script(path, args.only or [m.name for m in registry()])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import sqlite3
+import os
+import sys
+import time
+import numpy as np
+
+from wmm import load_model, decimal_year
+from declination_cache import DeclinationCache
+from declination_grid import load_or_build, GRID_SPACING
+
+# Database path
+db_path = os.path.expanduser('~/Dev/MCDUWorldwideDatabase.db')
+
+# Same model date as params_template in the NOAA-backed scripts
+startYear = 2025
+startMonth = 1
+startDay = 29
+
+# Interpolate from a precomputed global grid instead of evaluating the
+# model at every fix (much faster for the ~300k grid waypoints)
+USE_GRID = False
+
+# (table, latitude expression, longitude expression)
+# VHF navaids fall back to the DME position when the VOR position is blank.
+DECLINATION_TABLES = [
+    ("primary_P_A_base_Airport - Reference Points",
+     "AirportReferencePtLatitude_WGS84", "AirportReferencePtLongitude_WGS84"),
+    ("primary_P_G_base_Airport - Runways",
+     "RunwayLatitude_WGS84", "RunwayLongitude_WGS84"),
+    ("primary_D_B_base_Navaid_Enroute - NDB Navaid",
+     "NDBLatitude_WGS84", "NDBLongitude_WGS84"),
+    ("primary_D_B_base_Navaid_Terminal - NDB Navaid",
+     "NDBLatitude_WGS84", "NDBLongitude_WGS84"),
+    ("primary_D__base_Navaid - VHF Navaid",
+     "COALESCE(NULLIF(VORLatitude_WGS84, ''), DMELatitude_WGS84)",
+     "COALESCE(NULLIF(VORLongitude_WGS84, ''), DMELongitude_WGS84)"),
+    ("primary_E_A_base_Enroute - Grid Waypoints",
+     "WaypointLatitude_WGS84", "WaypointLongitude_WGS84"),
+    ("primary_P_C_base_Airport - Terminal Waypoints",
+     "WaypointLatitude_WGS84", "WaypointLongitude_WGS84"),
+]
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def table_exists(cur, table_name):
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+    return cur.fetchone() is not None
+
+
+def ensure_declination_column(cur, table_name):
+    """Add Declination column if it doesn't exist."""
+    cols = [r[1].lower() for r in cur.execute(f'PRAGMA table_info("{table_name}")')]
+    if "declination" not in cols:
+        cur.execute(f'ALTER TABLE "{table_name}" ADD COLUMN Declination REAL')
+
+
+def read_coordinates(cur, table_name, lat_expr, lon_expr):
+    """Return (rowids, lat, lon) arrays; unparsable coordinates become NaN."""
+    cur.execute(f'SELECT rowid, {lat_expr}, {lon_expr} FROM "{table_name}"')
+    rows = cur.fetchall()
+    rowids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    lat = np.fromiter((_to_float(r[1]) for r in rows), dtype=float, count=len(rows))
+    lon = np.fromiter((_to_float(r[2]) for r in rows), dtype=float, count=len(rows))
+    return rowids, lat, lon
+
+
+def write_declinations(cur, table_name, rowids, decl):
+    cur.executemany(
+        f'UPDATE "{table_name}" SET Declination = ? WHERE rowid = ?',
+        zip(decl.tolist(), rowids.tolist())
+    )
+
+
+def offline_cache(model):
+    """
+    Shared cache for exact values of ``model``. Keyed by the coefficient
+    file's model name under an "offline:" prefix, so local results never mix
+    with the NOAA calculator's (model "WMM") or another WMM release's.
+    """
+    return DeclinationCache(f"offline:{model.name}", f"{startYear:04d}-{startMonth:02d}-{startDay:02d}")
+
+
+def cached_declination(model, year, lat, lon, cache):
+    """Declination for coordinate arrays, computing only what the cache lacks."""
+    if cache is None:
+        return model.declination(lat, lon, year)
+    cached = cache.get_many(lat.tolist(), lon.tolist())
+    decl = np.array([np.nan if d is None else d for d in cached], dtype=float)
+    missing = np.isnan(decl)
+    if missing.any():
+        decl[missing] = model.declination(lat[missing], lon[missing], year)
+        cache.put_many(lat[missing].tolist(), lon[missing].tolist(), decl[missing].tolist())
+        cache.commit()
+    return decl
+
+
+def fill_table_declination(conn, table_name, lat_expr, lon_expr, model, year, cache=None):
+    """
+    Compute declination for every row of one table; returns (updated, skipped).
+    ``model`` is a MagneticModel or a DeclinationGrid.
+    """
+    cur = conn.cursor()
+    ensure_declination_column(cur, table_name)
+
+    rowids, lat, lon = read_coordinates(cur, table_name, lat_expr, lon_expr)
+    valid = np.isfinite(lat) & np.isfinite(lon)
+    decl = cached_declination(model, year, lat[valid], lon[valid], cache)
+
+    write_declinations(cur, table_name, rowids[valid], decl)
+    conn.commit()
+    return int(valid.sum()), int((~valid).sum())
+
+
+def main():
+    if not os.path.isfile(db_path):
+        print(f"Error: database file not found at {db_path}", file=sys.stderr)
+        sys.exit(1)
+
+    model = load_model()
+    year = decimal_year(startYear, startMonth, startDay)
+    print(f"Using {model.name} (epoch {model.epoch}) at {year:.4f}")
+
+    source = model
+    cache = None
+    if USE_GRID:
+        start = time.perf_counter()
+        source = load_or_build(model, year)
+        max_err, mean_err, p99_err = source.error_report(model)
+        print(
+            f"Declination grid {GRID_SPACING}° ready in {time.perf_counter() - start:.2f}s; "
+            f"error vs exact: max {max_err:.4f}°, mean {mean_err:.4f}°, p99 {p99_err:.4f}°"
+        )
+    else:
+        # Only exact model values go into the shared cache
+        cache = offline_cache(model)
+
+    conn = sqlite3.connect(db_path)
+    fill_declinations(conn, source, year, cache)
+    conn.close()
+    if cache is not None:
+        print(cache.stats())
+        cache.close()
+    print("Offline declination update completed.")
+
+
+def fill_declinations(conn, source, year, cache=None):
+    """Fill every DECLINATION_TABLES table present in the database."""
+    cur = conn.cursor()
+    for table_name, lat_expr, lon_expr in DECLINATION_TABLES:
+        if not table_exists(cur, table_name):
+            print(f"Skipping [{table_name}]: table not found")
+            continue
+        start = time.perf_counter()
+        updated, skipped = fill_table_declination(
+            conn, table_name, lat_expr, lon_expr, source, year, cache
+        )
+        print(
+            f"[{table_name}]: {updated} updated, {skipped} skipped "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Precompiled procedure records for the MCDU.
+
+Loading a SID, STAR or approach used to mean reading dozens of wide TEXT
+rows and parsing them again on every load. compile_procedures() packs the
+legs of each (airport, procedure, transition) once, at build time, into one
+BLOB of fixed-width little-endian LEG_DTYPE records:
+
+- coordinates resolved: the leg's own, or else the fix looked up by ident
+  and ICAO region through FixResolver;
+- leg course (true, initial great-circle) and distance (NM) computed from
+  the previous leg with a position in the same transition;
+- numbers parsed once (altitudes in feet, FLnnn included); missing values
+  are NaN, missing text is zero bytes.
+
+The records go in BLOB_TABLE keyed by (Kind, airport, procedure,
+transition), Kind being the ARINC 424 subsection (D SID, E STAR, F
+approach). A route loads with one primary-key lookup, and decode_legs()
+views the BLOB as a NumPy record array without copying it. The BLOBs are
+too large for a WITHOUT ROWID table (SQLite advises rows under ~1/20 of a
+page there), so BLOB_TABLE is a rowid table with a primary-key index.
+FORMAT_TABLE lists the field offsets for readers not written in Python.
+"""
+import argparse
+import math
+import os
+import sqlite3
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from fix_resolver import FixResolver
+from procedure_clustering import is_clustered
+
+db_path = os.path.expanduser('~/Dev/MCDUWorldwideDatabase.db')
+
+BLOB_TABLE = "procedure_blobs"
+FORMAT_TABLE = "procedure_blob_format"
+
+# Procedure table -> ARINC 424 subsection code stored as Kind
+PROCEDURE_KINDS = {
+    "primary_P_D_base_Airport - SIDs": "D",
+    "primary_P_E_base_Airport - STARs": "E",
+    "primary_P_F_base_Airport - Approach Procedures": "F",
+}
+
+PROCEDURE_KEY = [
+    "LandingFacilityIcaoIdentifier",
+    "SIDSTARApproachIdentifier",
+    "TransitionIdentifier",
+]
+
+# One leg; packed (no padding), little-endian
+LEG_DTYPE = np.dtype([
+    ("seq", "<u2"),
+    ("fix", "S5"),
+    ("region", "S2"),
+    ("path_term", "S2"),
+    ("turn", "S1"),
+    ("desc", "S4"),
+    ("lat", "<f8"),
+    ("lon", "<f8"),
+    ("course_true", "<f4"),
+    ("distance_nm", "<f4"),
+    ("mag_course", "<f4"),
+    ("route_distance", "<f4"),
+    ("alt_desc", "S1"),
+    ("alt1_ft", "<f4"),
+    ("alt2_ft", "<f4"),
+    ("speed_desc", "S1"),
+    ("speed_kt", "<f4"),
+    ("vertical_angle", "<f4"),
+    ("rnp", "<f4"),
+    ("arc_radius", "<f4"),
+    ("navaid", "S4"),
+    ("theta", "<f4"),
+    ("rho", "<f4"),
+    ("declination", "<f4"),
+])
+
+# Record field -> source column, for the fields copied from the leg row
+TEXT_FIELDS = {
+    "fix": "FixIdentifier",
+    "region": "FixIcaoRegionCode",
+    "path_term": "PathAndTermination",
+    "turn": "TurnDirection",
+    "desc": "WaypointDescriptionCodes",
+    "alt_desc": "AltitudeDescription",
+    "speed_desc": "SpeedLimitDescription",
+    "navaid": "RecommendedNavaid",
+}
+NUMBER_FIELDS = {
+    "mag_course": "MagneticCourse",
+    "route_distance": "RouteDistanceHoldingDistanceOrTime",
+    "speed_kt": "SpeedLimit",
+    "vertical_angle": "VerticalAngle",
+    "rnp": "RNP",
+    "arc_radius": "ARCRadius",
+    "theta": "Theta",
+    "rho": "Rho",
+    "declination": "Declination",
+}
+ALTITUDE_FIELDS = {
+    "alt1_ft": "Altitude_1",
+    "alt2_ft": "Altitude_2",
+}
+LAT_COL = "FixIdentifierLatitude_WGS84"
+LON_COL = "FixIdentifierLongitude_WGS84"
+SEQ_COL = "SequenceNumber"
+
+EARTH_RADIUS_NM = 3440.065
+
+CompileCounts = namedtuple("CompileCounts", "procedures legs resolved unresolved")
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _altitude_ft(value):
+    """Feet from '5000', '05000' or 'FL150'; NaN if blank or unreadable."""
+    if isinstance(value, str) and value.strip().upper().startswith("FL"):
+        return 100 * _to_float(value.strip()[2:])
+    return _to_float(value)
+
+
+def _text(value):
+    return b"" if value is None else str(value).strip().encode("ascii", "replace")
+
+
+def _seq(value):
+    number = _to_float(value)
+    return int(number) if 0 <= number <= 0xFFFF else 0
+
+
+# ——— Geometry ———
+
+def leg_geometry(lat, lon, group_start):
+    """
+    True course and distance (NM) from the last earlier leg with a position
+    to each leg, within its procedure; NaN where either end has no position.
+    ``group_start[i]`` is the index of the first leg of leg i's procedure.
+    """
+    n = len(lat)
+    has_position = np.isfinite(lat) & np.isfinite(lon)
+    last = np.maximum.accumulate(np.where(has_position, np.arange(n), -1)) if n else np.empty(0, dtype=int)
+    prev = np.concatenate(([-1], last[:-1])) if n else last
+    prev[prev < group_start] = -1
+    valid = has_position & (prev >= 0)
+
+    course = np.full(n, np.nan)
+    distance = np.full(n, np.nan)
+    p = prev[valid]
+    lat1, lon1 = np.radians(lat[p]), np.radians(lon[p])
+    lat2, lon2 = np.radians(lat[valid]), np.radians(lon[valid])
+    dlon = lon2 - lon1
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    distance[valid] = 2 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+    course[valid] = np.degrees(np.arctan2(
+        np.sin(dlon) * np.cos(lat2),
+        np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    )) % 360
+    return course, distance
+
+
+# ——— Compile ———
+
+def ensure_blob_tables(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{BLOB_TABLE}" (
+            Kind                          TEXT    NOT NULL,
+            LandingFacilityIcaoIdentifier TEXT    NOT NULL,
+            SIDSTARApproachIdentifier     TEXT    NOT NULL,
+            TransitionIdentifier          TEXT    NOT NULL,
+            Legs                          INTEGER NOT NULL,
+            Data                          BLOB    NOT NULL,
+            PRIMARY KEY (Kind, LandingFacilityIcaoIdentifier, SIDSTARApproachIdentifier, TransitionIdentifier)
+        )
+    """)
+    conn.execute(f'DROP TABLE IF EXISTS "{FORMAT_TABLE}"')
+    conn.execute(f'CREATE TABLE "{FORMAT_TABLE}" (Field TEXT PRIMARY KEY, Offset INTEGER, Type TEXT, Size INTEGER)')
+    conn.executemany(
+        f'INSERT INTO "{FORMAT_TABLE}" VALUES (?, ?, ?, ?)',
+        [(name, offset, dtype.str, dtype.itemsize) for name, (dtype, offset) in LEG_DTYPE.fields.items()]
+        + [("record", 0, "", LEG_DTYPE.itemsize)]
+    )
+
+
+def read_legs(conn, table):
+    """
+    Every leg of ``table`` in procedure and sequence order. Returns (columns,
+    rows); each row is the PROCEDURE_KEY values followed by ``columns``.
+    """
+    present = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+    columns = [SEQ_COL, LAT_COL, LON_COL, *TEXT_FIELDS.values(), *NUMBER_FIELDS.values(), *ALTITUDE_FIELDS.values()]
+    # Clustered tables hold no NULL keys and are stored in this order, so the sort is free there
+    key = [f'"{c}"' if is_clustered(conn, table) else f"COALESCE(\"{c}\", '')" for c in PROCEDURE_KEY]
+    select = key + [f'"{c}"' if c in present else "NULL" for c in columns]
+    return columns, conn.execute(
+        f'SELECT {", ".join(select)} FROM "{table}" ORDER BY {", ".join(key)}, "{SEQ_COL}"'
+    ).fetchall()
+
+
+def compile_table(conn, table, resolver):
+    """
+    Replace the BLOB_TABLE records of ``table`` with freshly compiled ones, on
+    ``conn`` without committing. Returns CompileCounts.
+    """
+    kind = PROCEDURE_KINDS[table]
+    columns, rows = read_legs(conn, table)
+    col = {name: i + len(PROCEDURE_KEY) for i, name in enumerate(columns)}
+    n = len(rows)
+    legs = np.zeros(n, dtype=LEG_DTYPE)
+
+    lat = np.fromiter((_to_float(r[col[LAT_COL]]) for r in rows), dtype=float, count=n)
+    lon = np.fromiter((_to_float(r[col[LON_COL]]) for r in rows), dtype=float, count=n)
+    # Legs published without coordinates take their fix's position
+    resolved = 0
+    fix_col, region_col = col[TEXT_FIELDS["fix"]], col[TEXT_FIELDS["region"]]
+    for i in np.flatnonzero(~(np.isfinite(lat) & np.isfinite(lon))):
+        fix = resolver.resolve_in_region(rows[i][fix_col], rows[i][region_col])
+        if fix is not None and not (math.isnan(fix.lat) or math.isnan(fix.lon)):
+            lat[i], lon[i] = fix.lat, fix.lon
+            resolved += 1
+        else:
+            lat[i] = lon[i] = math.nan
+
+    starts = [i for i in range(n) if i == 0 or rows[i][:3] != rows[i - 1][:3]]
+    group_start = np.repeat(starts, np.diff(starts + [n])) if n else np.empty(0, dtype=int)
+    legs["course_true"], legs["distance_nm"] = leg_geometry(lat, lon, group_start)
+    legs["lat"], legs["lon"] = lat, lon
+    legs["seq"] = [_seq(r[col[SEQ_COL]]) for r in rows]
+    for field, column in TEXT_FIELDS.items():
+        legs[field] = [_text(r[col[column]]) for r in rows]
+    for field, column in NUMBER_FIELDS.items():
+        legs[field] = [_to_float(r[col[column]]) for r in rows]
+    for field, column in ALTITUDE_FIELDS.items():
+        legs[field] = [_altitude_ft(r[col[column]]) for r in rows]
+
+    conn.execute(f'DELETE FROM "{BLOB_TABLE}" WHERE Kind = ?', (kind,))
+    bounds = starts + [n]
+    conn.executemany(
+        f'INSERT INTO "{BLOB_TABLE}" VALUES (?, ?, ?, ?, ?, ?)',
+        ((kind, *rows[lo][:3], hi - lo, legs[lo:hi].tobytes()) for lo, hi in zip(bounds, bounds[1:]))
+    )
+    with_fix = np.array([bool(r[fix_col]) for r in rows], dtype=bool)
+    unresolved = int((with_fix & ~(np.isfinite(lat) & np.isfinite(lon))).sum())
+    return CompileCounts(len(starts), n, resolved, unresolved)
+
+
+def compile_procedures(conn, tables=tuple(PROCEDURE_KINDS)):
+    """compile_table for each of ``tables`` present; returns {table: CompileCounts}."""
+    ensure_blob_tables(conn)
+    existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in tables:
+        if table not in existing:
+            conn.execute(f'DELETE FROM "{BLOB_TABLE}" WHERE Kind = ?', (PROCEDURE_KINDS[table],))
+    resolver = FixResolver(conn)
+    return {table: compile_table(conn, table, resolver) for table in tables if table in existing}
+
+
+# ——— Load ———
+
+def decode_legs(blob):
+    """The legs of one record as a LEG_DTYPE array viewing ``blob`` (no copy)."""
+    return np.frombuffer(memoryview(blob), dtype=LEG_DTYPE)
+
+
+def load_procedure(conn, kind, airport, procedure, transition):
+    """Legs of one procedure transition, or None if it has no record."""
+    row = conn.execute(
+        f'SELECT Data FROM "{BLOB_TABLE}" WHERE Kind = ? AND LandingFacilityIcaoIdentifier = ? '
+        f'AND SIDSTARApproachIdentifier = ? AND TransitionIdentifier = ?',
+        (kind, airport, procedure, transition)
+    ).fetchone()
+    return None if row is None else decode_legs(row[0])
+
+
+def print_counts(table, counts):
+    print(f"  [{table}] {counts.procedures} procedures, {counts.legs} legs, "
+          f"{counts.resolved} positions resolved by fix, {counts.unresolved} fixes without position")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the procedure tables into packed per-transition records")
+    parser.add_argument("--db", default=db_path)
+    args = parser.parse_args()
+
+    path = os.path.expanduser(args.db)
+    if not os.path.isfile(path):
+        print(f"Error: database file not found at {path}", file=sys.stderr)
+        sys.exit(1)
+    conn = sqlite3.connect(path)
+    for table, counts in compile_procedures(conn).items():
+        print_counts(table, counts)
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
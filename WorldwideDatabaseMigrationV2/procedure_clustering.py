@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Clustered storage for the procedure leg tables.
+
+The MCDU always reads the legs of one procedure in order: airport, then
+SIDSTARApproachIdentifier, then TransitionIdentifier, then SequenceNumber.
+Stored as rowid tables in insertion order, the legs of one procedure are
+scattered over many pages. Each table is rewritten here as a WITHOUT ROWID
+table whose primary key is that natural key, so the legs of a procedure sit
+next to each other in the b-tree and a fetch reads a handful of adjacent
+pages.
+
+Primary key columns cannot hold NULL, so a missing key value is stored as ''.
+Where the natural key is not unique (e.g. an expanded ALL transition next to
+an explicit one for the same runway), a tiebreaker is appended: the table's
+INTEGER PRIMARY KEY column if it has one, else a LegOrdinal column numbering
+the duplicates in their original order.
+
+benchmark_fetch() times the procedure fetch; the build runs it before and
+after the rewrite. The "before" figure is taken with a secondary index on the
+natural key, i.e. against the best the rowid layout can do.
+"""
+import argparse
+import os
+import random
+import time
+from collections import namedtuple
+
+from procedure_expansion import PROCEDURE_TABLES
+
+db_path = os.path.expanduser('~/Dev/MCDUWorldwideDatabase.db')
+
+CLUSTER_KEY = [
+    "LandingFacilityIcaoIdentifier",
+    "SIDSTARApproachIdentifier",
+    "TransitionIdentifier",
+    "SequenceNumber",
+]
+
+# Tiebreak column added when the natural key has duplicates and no _id-style key exists
+ORDINAL_COLUMN = "LegOrdinal"
+
+# Procedures fetched per benchmark run
+BENCH_SAMPLES = 500
+
+BENCH_INDEX = "bench_procedure_key"
+
+FetchTiming = namedtuple("FetchTiming", "procedures mean_us p95_us")
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def is_clustered(conn, table):
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    return sql is not None and "WITHOUT ROWID" in sql[0].upper()
+
+
+def _key_list(cols):
+    return ", ".join(_quote(c) for c in cols)
+
+
+# ——— Rewrite ———
+
+def tiebreak_column(conn, table, cols_info):
+    """
+    None if the natural key is unique, else the column that makes it unique:
+    the rowid alias column if there is one, otherwise ORDINAL_COLUMN (to be added).
+    """
+    key = ", ".join(f"COALESCE({_quote(c)}, '')" for c in CLUSTER_KEY)
+    if conn.execute(f'SELECT 1 FROM {_quote(table)} GROUP BY {key} HAVING COUNT(*) > 1 LIMIT 1').fetchone() is None:
+        return None
+    pk = [row for row in cols_info if row[5]]
+    if len(pk) == 1 and pk[0][2].upper() == "INTEGER":
+        return pk[0][1]
+    return ORDINAL_COLUMN
+
+
+def cluster_table(conn, table):
+    """
+    Rewrite ``table`` as a WITHOUT ROWID table clustered on CLUSTER_KEY, on
+    ``conn`` without committing; its indexes are recreated. Returns
+    (rows, tiebreak column or None).
+    """
+    cols_info = conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+    col_names = [row[1] for row in cols_info]
+    tiebreak = tiebreak_column(conn, table, cols_info)
+    indexes = [sql for (sql,) in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+    )]
+
+    scratch = f"{table}-clustered"
+    defs = [f"{_quote(name)} {ctype}" for _, name, ctype, *_ in cols_info]
+    pk = CLUSTER_KEY + ([tiebreak] if tiebreak else [])
+    select = [f"COALESCE({_quote(c)}, '') AS {_quote(c)}" if c in CLUSTER_KEY else _quote(c) for c in col_names]
+    if tiebreak == ORDINAL_COLUMN:
+        defs.append(f"{_quote(ORDINAL_COLUMN)} INTEGER")
+        col_names.append(ORDINAL_COLUMN)
+        partition = ", ".join(f"COALESCE({_quote(c)}, '')" for c in CLUSTER_KEY)
+        select.append(f"ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY rowid) - 1 AS {_quote(ORDINAL_COLUMN)}")
+
+    conn.execute(f"DROP TABLE IF EXISTS {_quote(scratch)}")
+    conn.execute(f"CREATE TABLE {_quote(scratch)} ({', '.join(defs)}, PRIMARY KEY ({_key_list(pk)})) WITHOUT ROWID")
+    # Inserting in key order appends to the b-tree instead of splitting pages
+    conn.execute(f"""
+        INSERT INTO {_quote(scratch)} ({_key_list(col_names)})
+        SELECT * FROM (SELECT {', '.join(select)} FROM {_quote(table)})
+         ORDER BY {_key_list(pk)}
+    """)
+    rows = conn.execute(f"SELECT COUNT(*) FROM {_quote(scratch)}").fetchone()[0]
+
+    conn.execute(f"DROP TABLE {_quote(table)}")
+    conn.execute(f"ALTER TABLE {_quote(scratch)} RENAME TO {_quote(table)}")
+    for sql in indexes:
+        conn.execute(sql)
+    return rows, tiebreak
+
+
+# ——— Benchmark ———
+
+def sample_procedures(conn, table, samples=BENCH_SAMPLES, seed=0):
+    """Up to ``samples`` random (airport, procedure, transition) keys of ``table``."""
+    keys = conn.execute(f"SELECT DISTINCT {_key_list(CLUSTER_KEY[:3])} FROM {_quote(table)}").fetchall()
+    random.Random(seed).shuffle(keys)
+    return keys[:samples]
+
+
+def benchmark_fetch(conn, table, keys):
+    """
+    Time fetching every leg of each procedure in ``keys`` in sequence order.
+    A rowid table is given a temporary index on the natural key for the run.
+    """
+    temp_index = not is_clustered(conn, table)
+    if temp_index:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {BENCH_INDEX} ON {_quote(table)} ({_key_list(CLUSTER_KEY)})")
+    sql = (f"SELECT * FROM {_quote(table)} "
+           f"WHERE {' AND '.join(f'{_quote(c)} IS ?' for c in CLUSTER_KEY[:3])} "
+           f"ORDER BY {_quote(CLUSTER_KEY[3])}")
+    times = []
+    for key in keys:
+        start = time.perf_counter()
+        conn.execute(sql, key).fetchall()
+        times.append(time.perf_counter() - start)
+    if temp_index:
+        conn.execute(f"DROP INDEX {BENCH_INDEX}")
+    if not times:
+        return FetchTiming(0, 0.0, 0.0)
+    times.sort()
+    return FetchTiming(len(times), 1e6 * sum(times) / len(times), 1e6 * times[int(0.95 * (len(times) - 1))])
+
+
+def cluster_with_benchmark(conn, table, samples=BENCH_SAMPLES):
+    """cluster_table with the procedure fetch timed before and after; returns a one-line report."""
+    keys = sample_procedures(conn, table, samples)
+    before = benchmark_fetch(conn, table, keys)
+    rows, tiebreak = cluster_table(conn, table)
+    # Missing key values are stored as '' from now on
+    after = benchmark_fetch(conn, table, [tuple('' if v is None else v for v in key) for key in keys])
+    return (f"{rows} rows{f', tiebreak {tiebreak}' if tiebreak else ''}; "
+            f"fetch of {after.procedures} procedures mean {before.mean_us:.0f} -> {after.mean_us:.0f} us, "
+            f"p95 {before.p95_us:.0f} -> {after.p95_us:.0f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite the procedure tables as clustered WITHOUT ROWID tables")
+    parser.add_argument("--db", default=db_path)
+    args = parser.parse_args()
+
+    from migration_registry import run_script
+    run_script(os.path.expanduser(args.db), [f"cluster {table}" for table in PROCEDURE_TABLES])
+
+
+if __name__ == "__main__":
+    main()
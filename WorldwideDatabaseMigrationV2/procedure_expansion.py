@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Runway expansion of the SID, STAR and Approach procedure tables.
+
+A procedure leg whose TransitionIdentifier is 'ALL' applies to every runway
+of its airport and one whose transition is 'RWnnB' to both RWnnL and RWnnR.
+Each table is rewritten by one engine that only knows the column names it
+needs (LandingFacilityIcaoIdentifier, TransitionIdentifier); every other
+column is copied as is. The rewrite streams through the source in rowid
+batches of BATCH_ROWS, each one INSERT ... SELECT over a UNION ALL of the
+kept rows, the 'ALL' rows joined to the (indexed) runway table and the
+'RW..B' rows crossed with a two-row L/R mapping CTE, so the sort that keeps
+source order never holds more than one batch. The rows each rule produces
+are counted beforehand with one aggregate query.
+
+Run as a script, it expands every table in PROCEDURE_TABLES not yet expanded
+(through the migration registry).
+"""
+import argparse
+import os
+import re
+from collections import namedtuple
+
+db_path = os.path.expanduser('~/Dev/MCDUWorldwideDatabase.db')
+
+PROCEDURE_TABLES = [
+    "primary_P_D_base_Airport - SIDs",
+    "primary_P_E_base_Airport - STARs",
+    "primary_P_F_base_Airport - Approach Procedures",
+]
+
+RUNWAY_TABLE = "primary_P_G_base_Airport - Runways"
+
+# Same index the V1 runway merge creates for its duplicate check
+RUNWAY_INDEX = "idx_runways_airport_runway"
+
+# Source rows per INSERT ... SELECT
+BATCH_ROWS = 50_000
+
+# Rows produced per rule; 'dropped' counts 'ALL' rows at airports without runways
+RuleCounts = namedtuple("RuleCounts", "kept all_runways both_sides dropped")
+
+IS_ALL = "s.TransitionIdentifier = 'ALL'"
+IS_BOTH = "s.TransitionIdentifier GLOB 'RW*B'"
+
+
+def scratch_name(source_table):
+    return f"{source_table}-new"
+
+
+def rule_counts(conn, source_table):
+    """How many rows each rule will produce for ``source_table``."""
+    return RuleCounts(*conn.execute(f"""
+        SELECT COALESCE(SUM(NOT ({IS_ALL} OR {IS_BOTH}) OR s.TransitionIdentifier IS NULL), 0),
+               (SELECT COUNT(*)
+                  FROM "{source_table}" s
+                  JOIN "{RUNWAY_TABLE}" r ON r.LandingFacilityIcaoIdentifier = s.LandingFacilityIcaoIdentifier
+                 WHERE {IS_ALL}),
+               2 * COALESCE(SUM({IS_BOTH}), 0),
+               COALESCE(SUM({IS_ALL} AND NOT EXISTS (
+                   SELECT 1 FROM "{RUNWAY_TABLE}" r
+                    WHERE r.LandingFacilityIcaoIdentifier = s.LandingFacilityIcaoIdentifier)), 0)
+          FROM "{source_table}" s
+    """).fetchone())
+
+
+def create_scratch(conn, source_table, scratch_table):
+    """Create ``scratch_table`` with ``source_table``'s definition; returns the columns to copy."""
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+                       (source_table,)).fetchone()[0]
+    conn.execute(f'DROP TABLE IF EXISTS "{scratch_table}"')
+    conn.execute(re.sub(r'^\s*CREATE\s+TABLE\s+("(?:[^"]|"")*"|\[[^\]]*\]|\S+)',
+                        lambda m: f'CREATE TABLE "{scratch_table}"', sql, count=1, flags=re.IGNORECASE))
+    cols_info = conn.execute(f'PRAGMA table_info("{source_table}")').fetchall()
+    pk = [row[1] for row in cols_info if row[5]]
+    # A lone INTEGER PRIMARY KEY is the rowid; expanded rows get fresh ones
+    if len(pk) == 1 and next(row[2] for row in cols_info if row[1] == pk[0]).upper() == "INTEGER":
+        return [row[1] for row in cols_info if row[1] != pk[0]]
+    return [row[1] for row in cols_info]
+
+
+def expand_table(conn, source_table, batch_rows=BATCH_ROWS):
+    """
+    Rewrite ``source_table`` with ALL / RW..B transitions expanded, building it
+    as its scratch table and swapping it in; on ``conn`` without committing.
+    The table's indexes are recreated. Returns the RuleCounts.
+    """
+    conn.execute(f'CREATE INDEX IF NOT EXISTS "{RUNWAY_INDEX}" '
+                 f'ON "{RUNWAY_TABLE}" (LandingFacilityIcaoIdentifier, RunwayIdentifier)')
+    counts = rule_counts(conn, source_table)
+    indexes = [sql for (sql,) in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (source_table,)
+    )]
+
+    scratch_table = scratch_name(source_table)
+    col_names = create_scratch(conn, source_table, scratch_table)
+    cols_list = ", ".join(f'"{c}"' for c in col_names)
+    # Every column as is, except the transition, which comes from the rule
+    select_list = ", ".join('t.NewTransition' if c == "TransitionIdentifier" else f't."{c}"' for c in col_names)
+    insert_sql = f"""
+        WITH side(Suffix, Pos) AS (VALUES ('L', 1), ('R', 2)),
+        batch AS (
+            SELECT rowid AS SrcRow, * FROM "{source_table}" WHERE rowid BETWEEN :lo AND :hi
+        ),
+        expanded AS (
+            SELECT s.SrcRow, 0 AS Pos, s.TransitionIdentifier AS NewTransition, s.*
+              FROM batch s
+             WHERE NOT ({IS_ALL} OR {IS_BOTH}) OR s.TransitionIdentifier IS NULL
+            UNION ALL
+            SELECT s.SrcRow, r.rowid, r.RunwayIdentifier, s.*
+              FROM batch s
+              JOIN "{RUNWAY_TABLE}" r ON r.LandingFacilityIcaoIdentifier = s.LandingFacilityIcaoIdentifier
+             WHERE {IS_ALL}
+            UNION ALL
+            SELECT s.SrcRow, side.Pos,
+                   substr(s.TransitionIdentifier, 1, length(s.TransitionIdentifier) - 1) || side.Suffix, s.*
+              FROM batch s, side
+             WHERE {IS_BOTH}
+        )
+        INSERT INTO "{scratch_table}" ({cols_list})
+        SELECT {select_list}
+          FROM expanded t
+         ORDER BY t.SrcRow, t.Pos
+    """
+
+    lo, hi = conn.execute(f'SELECT MIN(rowid), MAX(rowid) FROM "{source_table}"').fetchone()
+    if lo is not None:
+        for start in range(lo, hi + 1, batch_rows):
+            conn.execute(insert_sql, {"lo": start, "hi": start + batch_rows - 1})
+
+    conn.execute(f'DROP TABLE "{source_table}"')
+    conn.execute(f'ALTER TABLE "{scratch_table}" RENAME TO "{source_table}"')
+    for sql in indexes:
+        conn.execute(sql)
+    return counts
+
+
+def expand_procedures(conn, tables=PROCEDURE_TABLES, batch_rows=BATCH_ROWS):
+    """expand_table for each of ``tables``, in one run; returns {table: RuleCounts}."""
+    return {table: expand_table(conn, table, batch_rows) for table in tables}
+
+
+def print_counts(source_table, counts):
+    print(f"  [{source_table}] kept {counts.kept}, ALL -> {counts.all_runways} runway rows, "
+          f"RW..B -> {counts.both_sides} L/R rows, {counts.dropped} ALL rows without runways dropped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expand ALL / RW..B transitions of the procedure tables")
+    parser.add_argument("--db", default=db_path)
+    args = parser.parse_args()
+
+    from migration_registry import run_script
+    run_script(os.path.expanduser(args.db), [f"expand runways {table}" for table in PROCEDURE_TABLES])
+
+
+if __name__ == "__main__":
+    main()
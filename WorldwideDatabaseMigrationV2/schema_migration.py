@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Declarative table/column renames for the navdb.
+
+Every rename_*.py script declares old_table_name, new_table_name and
+column_renames. Applying one as ALTER TABLE RENAME plus a RENAME COLUMN per
+column makes SQLite rewrite and re-parse the whole schema 15-35 times per
+table. Here each table is instead rebuilt once: the new table is created
+with the renamed columns (types, NOT NULL, defaults, primary key and unique
+constraints kept), filled with a single INSERT ... SELECT old AS new,
+rowids included, and the old table's indexes are recreated on the renamed
+columns. All tables are migrated in one pass inside one savepoint, so a
+failure leaves the database as it was.
+
+Tables a plain rebuild cannot reproduce exactly -- referenced by views,
+triggers or foreign keys, or carrying CHECK constraints, column collations
+(which PRAGMA table_info does not report), generated columns, partial or
+expression indexes -- fall back to the ALTER statements.
+"""
+import argparse
+import importlib
+import os
+import re
+import sqlite3
+import sys
+from collections import namedtuple
+
+db_path = os.path.expanduser('~/Dev/MCDUWorldwideDatabase.db')
+
+# rename_*.py modules, each defining old_table_name, new_table_name, column_renames
+RENAME_MODULES = [
+    "rename_airport_table",
+    "rename_runway_table",
+    "rename_localizer_glidescope_table",
+    "rename_vhfnavaids_table",
+    "rename_enroute_ndbnavaids_table",
+    "rename_terminal_ndbnavaids_table",
+    "rename_enroute_waypoints",
+    "rename_terminal_waypoints",
+    "rename_airways_table",
+    "rename_sids_table",
+    "rename_stars_table",
+    "rename_approach_table",
+]
+
+TableRename = namedtuple("TableRename", "old_table new_table column_renames")
+
+# How a table was migrated
+REBUILT, ALTERED, DONE, MISSING = "rebuilt", "altered", "already renamed", "not found"
+
+
+def load_specs(modules=RENAME_MODULES):
+    specs = []
+    for name in modules:
+        module = importlib.import_module(name)
+        specs.append(TableRename(module.old_table_name, module.new_table_name, module.column_renames))
+    return specs
+
+
+def table_exists(conn, name):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+# ——— Rebuild planning ———
+
+def alter_reason(conn, table):
+    """Why ``table`` has to be renamed with ALTER rather than rebuilt; None if it can be rebuilt."""
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    if re.search(r'\bCHECK\s*\(', sql, re.IGNORECASE):
+        return "CHECK constraint"
+    if re.search(r'\bCOLLATE\b', sql, re.IGNORECASE):
+        return "column collation"
+    if conn.execute(f"PRAGMA foreign_key_list({_quote(table)})").fetchone():
+        return "foreign key"
+    if any(col[6] for col in conn.execute(f"PRAGMA table_xinfo({_quote(table)})")):
+        return "generated or hidden column"
+    for name, entry_sql in conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type IN ('view', 'trigger', 'table') AND name != ?", (table,)
+    ):
+        if entry_sql and re.search(r'(?<![\w"])' + re.escape(table) + r'(?![\w"])|' + re.escape(_quote(table)),
+                                   entry_sql):
+            return f"referenced by {name}"
+    for _, name, _, origin, partial in conn.execute(f"PRAGMA index_list({_quote(table)})"):
+        if partial:
+            return f"partial index {name}"
+        if any(col[1] < 0 for col in conn.execute(f"PRAGMA index_xinfo({_quote(name)})") if col[5]):
+            return f"expression index {name}"
+    return None
+
+
+def _index_columns(conn, index, renamed):
+    cols = []
+    for _, _, name, desc, coll, key in conn.execute(f"PRAGMA index_xinfo({_quote(index)})"):
+        if key:
+            col = _quote(renamed.get(name, name))
+            if coll != "BINARY":
+                col += f" COLLATE {coll}"
+            cols.append(col + (" DESC" if desc else ""))
+    return ", ".join(cols)
+
+
+def rebuild_statements(conn, spec):
+    """CREATE TABLE, INSERT ... SELECT, DROP and CREATE INDEX statements that rebuild ``spec.old_table``."""
+    old, new = spec.old_table, spec.new_table
+    renamed = dict(spec.column_renames)
+    table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (old,)).fetchone()[0]
+    columns = conn.execute(f"PRAGMA table_info({_quote(old)})").fetchall()
+    names = [col[1] for col in columns]
+    missing = [c for c in renamed if c not in names]
+    if missing:
+        raise sqlite3.OperationalError(f"no such column: \"{missing[0]}\"")
+    without_rowid = bool(re.search(r'\bWITHOUT\s+ROWID\s*$', table_sql.strip().rstrip(';'), re.IGNORECASE))
+
+    pk = [col[1] for col in sorted(columns, key=lambda c: c[5]) if col[5]]
+    # A lone INTEGER PRIMARY KEY aliases the rowid and has to stay inline
+    rowid_alias = (len(pk) == 1 and not without_rowid
+                   and next(c[2] for c in columns if c[1] == pk[0]).upper() == "INTEGER")
+
+    defs = []
+    for _, name, ctype, notnull, default, _ in columns:
+        col = _quote(renamed.get(name, name))
+        if ctype:
+            col += f" {ctype}"
+        if rowid_alias and name == pk[0]:
+            col += " PRIMARY KEY"
+            if re.search(r'\bAUTOINCREMENT\b', table_sql, re.IGNORECASE):
+                col += " AUTOINCREMENT"
+        if notnull:
+            col += " NOT NULL"
+        if default is not None:
+            col += f" DEFAULT {default}"
+        defs.append(col)
+    if pk and not rowid_alias:
+        defs.append(f"PRIMARY KEY ({', '.join(_quote(renamed.get(c, c)) for c in pk)})")
+
+    indexes = []
+    for _, index, unique, origin, _ in conn.execute(f"PRAGMA index_list({_quote(old)})").fetchall():
+        if origin == "u":
+            defs.append(f"UNIQUE ({_index_columns(conn, index, renamed)})")
+        elif origin == "c":
+            indexes.append(f"CREATE {'UNIQUE ' if unique else ''}INDEX {_quote(index)} "
+                           f"ON {_quote(new)} ({_index_columns(conn, index, renamed)})")
+
+    new_cols = ", ".join(_quote(renamed.get(n, n)) for n in names)
+    old_cols = ", ".join(_quote(n) for n in names)
+    if not without_rowid:
+        new_cols, old_cols = "rowid, " + new_cols, "rowid, " + old_cols
+    return [
+        f"CREATE TABLE {_quote(new)} (\n    " + ",\n    ".join(defs) + "\n)" + (" WITHOUT ROWID" if without_rowid else ""),
+        f"INSERT INTO {_quote(new)} ({new_cols}) SELECT {old_cols} FROM {_quote(old)}",
+        f"DROP TABLE {_quote(old)}",
+    ] + indexes
+
+
+def alter_statements(spec):
+    """The ALTER TABLE RENAME / RENAME COLUMN chain the rename scripts used to run."""
+    return [f'ALTER TABLE {_quote(spec.old_table)} RENAME TO {_quote(spec.new_table)}'] + [
+        f'ALTER TABLE {_quote(spec.new_table)} RENAME COLUMN {_quote(old)} TO {_quote(new)}'
+        for old, new in spec.column_renames
+    ]
+
+
+# ——— Migration ———
+
+def rename_table(conn, old_table, new_table, column_renames):
+    """Rename one table and its columns on ``conn`` without committing; returns REBUILT or ALTERED."""
+    spec = TableRename(old_table, new_table, column_renames)
+    reason = alter_reason(conn, old_table)
+    statements = alter_statements(spec) if reason else rebuild_statements(conn, spec)
+    for sql in statements:
+        conn.execute(sql)
+    return ALTERED if reason else REBUILT
+
+
+def migrate(conn, specs):
+    """
+    Apply every spec on ``conn`` in one savepoint, without committing; tables
+    already renamed or absent are skipped. Returns [(spec, how)].
+    """
+    done = []
+    conn.execute("SAVEPOINT schema_migration")
+    try:
+        for spec in specs:
+            if not table_exists(conn, spec.old_table):
+                done.append((spec, DONE if table_exists(conn, spec.new_table) else MISSING))
+                continue
+            done.append((spec, rename_table(conn, *spec)))
+    except sqlite3.Error:
+        conn.execute("ROLLBACK TO schema_migration")
+        conn.execute("RELEASE schema_migration")
+        raise
+    conn.execute("RELEASE schema_migration")
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply every rename_*.py table/column rename in one pass")
+    parser.add_argument("--db", default=db_path)
+    args = parser.parse_args()
+
+    path = os.path.expanduser(args.db)
+    if not os.path.isfile(path):
+        print(f"Error: database file not found at {path}", file=sys.stderr)
+        sys.exit(1)
+
+    conn = sqlite3.connect(path)
+    try:
+        results = migrate(conn, load_specs())
+        conn.commit()
+    except sqlite3.Error as e:
+        print("SQLite error during renaming:", e, file=sys.stderr)
+        sys.exit(1)
+    finally:
+        conn.close()
+    for spec, how in results:
+        print(f"  [{spec.old_table}] -> [{spec.new_table}]: {how}")
+
+
+if __name__ == "__main__":
+    main()
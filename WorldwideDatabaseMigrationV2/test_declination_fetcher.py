@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+fetch_table_declinations against a local stand-in for the NOAA calculator.
+
+StandInServer answers the calculator's JSON format with a made-up
+declination, fails chosen coordinates with retryable or permanent HTTP
+errors and logs when each request arrived, so rate limiting, retries and
+checkpoint resume can be checked without touching ngdc.noaa.gov.
+Run with pytest, or directly as a script.
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from aiohttp import web
+
+from declination_fetcher import CHECKPOINT_TABLE, fetch_table_declinations
+
+TABLE = "primary_D__base_Navaid - VHF Navaid"
+
+PARAMS = {"model": "WMM", "startYear": 2025, "startMonth": 1, "startDay": 29, "resultFormat": "json"}
+
+
+def fake_declination(lat, lon):
+    return round(lat / 10 + lon / 100, 6)
+
+
+class StandInServer:
+    """
+    ``failures`` maps a (lat, lon) to a list of HTTP statuses returned, one
+    per request, before the coordinate is answered normally. ``bodies`` maps
+    a (lat, lon) to the raw bytes of a 200 answer sent instead of the JSON.
+    """
+
+    def __init__(self, failures=None, bodies=None):
+        self.failures = {key: list(statuses) for key, statuses in (failures or {}).items()}
+        self.bodies = dict(bodies or {})
+        self.requests = []
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        q = request.query
+        lat = float(q["lat1"]) * (1 if q["lat1Hemisphere"] == "N" else -1)
+        lon = float(q["lon1"]) * (1 if q["lon1Hemisphere"] == "E" else -1)
+        self.requests.append((time.monotonic(), lat, lon))
+        statuses = self.failures.get((lat, lon))
+        if statuses:
+            return web.Response(status=statuses.pop(0))
+        if (lat, lon) in self.bodies:
+            return web.Response(body=self.bodies[(lat, lon)], content_type="application/json", charset="utf-8")
+        return web.json_response({"result": [{"declination": fake_declination(lat, lon)}]})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get("/calculateDeclination", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}/calculateDeclination"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def make_db(rows):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    conn = sqlite3.connect(path)
+    conn.execute(f'CREATE TABLE "{TABLE}" (VORIdentifier TEXT, Lat TEXT, Lon TEXT)')
+    conn.executemany(f'INSERT INTO "{TABLE}" VALUES (?, ?, ?)',
+                     [(f"V{i}", str(lat), str(lon)) for i, (lat, lon) in enumerate(rows)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def coordinates(n):
+    return [(round(-60 + i * 0.37, 2), round(-170 + i * 1.13, 2)) for i in range(n)]
+
+
+async def fetch(server, path, **kwargs):
+    options = dict(workers=8, rate=1000.0, retries=3, backoff=0.01, batch_size=7)
+    options.update(kwargs)
+    return await fetch_table_declinations(path, TABLE, "VORIdentifier", "Lat", "Lon", PARAMS,
+                                          api_url=server.url, **options)
+
+
+def declinations(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(f'SELECT Lat, Lon, Declination FROM "{TABLE}" ORDER BY rowid').fetchall()
+    has_checkpoint = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = ?", (CHECKPOINT_TABLE,)).fetchone() is not None
+    conn.close()
+    return rows, has_checkpoint
+
+
+def test_rate_limit():
+    async def run():
+        path = make_db(coordinates(150))
+        try:
+            async with StandInServer() as server:
+                counts = await fetch(server, path, rate=100.0)
+            assert counts["updated"] == 150
+            # The bucket starts with one second's worth of tokens, then refills at ``rate``
+            times = sorted(t for t, _, _ in server.requests)
+            assert times[-1] - times[0] >= 0.9 * (150 - 100) / 100.0
+        finally:
+            os.remove(path)
+
+    asyncio.run(run())
+
+
+def test_retry_transient_errors():
+    rows = coordinates(30)
+    failures = {rows[0]: [503, 503], rows[1]: [429], rows[2]: [500, 502, 504]}
+
+    async def run():
+        path = make_db(rows)
+        try:
+            async with StandInServer(failures) as server:
+                counts = await fetch(server, path)
+            assert counts == {"updated": 30, "failed": 0, "skipped": 0}
+            assert len(server.requests) == 30 + 2 + 1 + 3
+            result, has_checkpoint = declinations(path)
+            assert all(decl == fake_declination(float(lat), float(lon)) for lat, lon, decl in result)
+            assert not has_checkpoint
+        finally:
+            os.remove(path)
+
+    asyncio.run(run())
+
+
+def test_resume_after_failures():
+    rows = coordinates(40)
+    # Permanent errors on two rows, more 503s than retries on a third
+    failures = {rows[5]: [404], rows[17]: [400], rows[30]: [503] * 10}
+
+    async def run():
+        path = make_db(rows)
+        try:
+            async with StandInServer(failures) as server:
+                first = await fetch(server, path)
+            assert first["updated"] == 37 and first["failed"] == 3
+            _, has_checkpoint = declinations(path)
+            assert has_checkpoint
+
+            # The resumed run only asks for the three missing rows
+            async with StandInServer() as server:
+                second = await fetch(server, path)
+            assert second == {"updated": 3, "failed": 0, "skipped": 0}
+            assert sorted((lat, lon) for _, lat, lon in server.requests) == sorted(
+                [rows[5], rows[17], rows[30]])
+
+            result, has_checkpoint = declinations(path)
+            assert all(decl == fake_declination(float(lat), float(lon)) for lat, lon, decl in result)
+            assert not has_checkpoint
+        finally:
+            os.remove(path)
+
+    asyncio.run(run())
+
+
+def test_malformed_answers():
+    rows = coordinates(20)
+    bodies = {
+        rows[2]: b'{"result": [{"declination": 1.0}]}\xff\xfe',  # not UTF-8
+        rows[7]: b'{"result": {"declination": 1.0}}',  # result is not a list
+        rows[11]: b'{"result": [{"declination": "east"}]}',
+        rows[15]: b'<html>maintenance</html>',
+    }
+
+    async def run():
+        path = make_db(rows)
+        try:
+            async with StandInServer(bodies=bodies) as server:
+                counts = await fetch(server, path)
+            # Each bad answer costs its own point only, without retries
+            assert counts == {"updated": 16, "failed": 4, "skipped": 0}
+            assert len(server.requests) == 20
+        finally:
+            os.remove(path)
+
+    asyncio.run(run())
+
+
+def test_checkpoint_keyed_by_epoch():
+    rows = coordinates(10)
+
+    async def run():
+        path = make_db(rows)
+        try:
+            async with StandInServer({rows[0]: [404]}) as server:
+                await fetch(server, path)
+            # Another epoch ignores the first run's checkpoint
+            async with StandInServer() as server:
+                await fetch_table_declinations(path, TABLE, "VORIdentifier", "Lat", "Lon",
+                                               {**PARAMS, "startYear": 2026}, api_url=server.url,
+                                               backoff=0.01)
+            assert len(server.requests) == 10
+            # So does a restart
+            async with StandInServer({rows[0]: [404]}) as server:
+                await fetch(server, path)
+            async with StandInServer() as server:
+                await fetch(server, path, restart=True)
+            assert len(server.requests) == 10
+        finally:
+            os.remove(path)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")
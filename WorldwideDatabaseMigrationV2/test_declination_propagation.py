@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+propagate_declination on small in-memory databases: SOURCES priority for
+exact matches and the R*Tree tolerance fallback.
+Run with pytest, or directly as a script.
+"""
+import sqlite3
+
+from declination_propagation import SOURCES, build_fix_declinations, propagate_declination
+
+LEG_TABLE = "legs"
+
+TERMINAL, GRID = SOURCES[0], SOURCES[1]
+
+
+def make_db(fixes, legs):
+    """``fixes`` maps a SOURCES entry to [(ident, lat, lon, declination)]; ``legs`` is [(ident, lat, lon)]."""
+    conn = sqlite3.connect(":memory:")
+    for tbl, idcol, latcol, loncol in SOURCES:
+        conn.execute(f"CREATE TABLE [{tbl}] ({idcol}, {latcol}, {loncol}, Declination)")
+    for (tbl, *_), rows in fixes.items():
+        conn.executemany(f"INSERT INTO [{tbl}] VALUES (?, ?, ?, ?)", rows)
+    conn.execute(f"CREATE TABLE {LEG_TABLE} (FixIdentifier, Lat, Lon)")
+    conn.executemany(f"INSERT INTO {LEG_TABLE} VALUES (?, ?, ?)", legs)
+    build_fix_declinations(conn)
+    return conn
+
+
+def leg_declinations(conn):
+    return [d for (d,) in conn.execute(f"SELECT Declination FROM {LEG_TABLE} ORDER BY rowid")]
+
+
+def test_null_top_priority_not_overridden():
+    # The terminal waypoint knows the fix but has no declination; the grid
+    # waypoint at the same position must not fill it in
+    conn = make_db(
+        {TERMINAL: [("ABC", "10.0", "20.0", None)],
+         GRID: [("ABC", "10.0", "20.0", 4.5)]},
+        [("ABC", "10.0", "20.0")],
+    )
+    exact, nearby, no_match, skipped, total = propagate_declination(conn, LEG_TABLE, "Lat", "Lon")
+    assert leg_declinations(conn) == [None]
+    assert (exact, nearby, no_match, skipped, total) == (0, 0, 1, 0, 1)
+
+
+def test_exact_and_nearby_counted_separately():
+    conn = make_db(
+        {TERMINAL: [("ABC", "10.0", "20.0", 1.5)],
+         GRID: [("ABC", "10.0", "20.0", 9.9), ("XYZ", "30.0", "40.0", -3.0)]},
+        [("ABC", "10.0", "20.0"),      # exact, terminal wins over grid
+         ("XYZ", "30.0004", "40.0"),   # within tolerance of the grid fix
+         ("XYZ", "30.5", "40.0"),      # too far away
+         ("", "10.0", "20.0")],        # no ident
+    )
+    exact, nearby, no_match, skipped, total = propagate_declination(conn, LEG_TABLE, "Lat", "Lon")
+    assert leg_declinations(conn) == [1.5, -3.0, None, None]
+    assert (exact, nearby, no_match, skipped, total) == (1, 1, 1, 1, 4)
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+FixResolver on a small in-memory database: SOURCES priority for the
+(ident, lat, lon) and (ident, region) indexes, and loading of unusable
+declination values.
+Run with pytest, or directly as a script.
+"""
+import sqlite3
+
+from declination_propagation import SOURCES
+from fix_resolver import REGION_COLUMNS, FixResolver
+
+TERMINAL, GRID, NDB_ENROUTE = SOURCES[0][0], SOURCES[1][0], SOURCES[2][0]
+
+
+def make_db(fixes):
+    """``fixes`` maps a SOURCES table to [(ident, region, lat, lon, declination)]."""
+    conn = sqlite3.connect(":memory:")
+    for tbl, idcol, latcol, loncol in SOURCES:
+        conn.execute(f"CREATE TABLE [{tbl}] ({idcol}, {REGION_COLUMNS[tbl]}, {latcol}, {loncol}, Declination)")
+    for tbl, rows in fixes.items():
+        conn.executemany(f"INSERT INTO [{tbl}] VALUES (?, ?, ?, ?, ?)", rows)
+    return conn
+
+
+def test_position_priority():
+    resolver = FixResolver(make_db({
+        TERMINAL: [("ABC", "K1", "10.0", "20.0", 1.5)],
+        GRID: [("ABC", "K1", "10.0", "20.0", 9.9), ("ABC", "K2", "11.0", "21.0", 2.5)],
+        NDB_ENROUTE: [("ABC", "K3", "11.0", "21.0", 7.0)],
+    }))
+    assert resolver.resolve("ABC", "10.0", "20.0").source == TERMINAL
+    assert resolver.declination_at("ABC", 10.0, 20.0) == 1.5
+    # Only the grid waypoint and the NDB share this position; the grid waypoint comes first
+    assert resolver.resolve("ABC", 11.0, 21.0).source == GRID
+    assert resolver.resolve("ABC", 12.0, 22.0) is None
+    # The grid copy of the terminal fix adds neither a position nor a region, so it gets no slot
+    assert len(resolver) == 3
+
+
+def test_region_priority():
+    resolver = FixResolver(make_db({
+        TERMINAL: [("ABC", "K1", "10.0", "20.0", 1.5)],
+        GRID: [("ABC", "K1", "10.5", "20.5", 9.9), ("ABC", "K2", "11.0", "21.0", 2.5)],
+    }))
+    k1 = resolver.resolve_in_region("ABC", "K1")
+    assert (k1.source, k1.lat, k1.declination) == (TERMINAL, 10.0, 1.5)
+    assert resolver.resolve_in_region("ABC", "K2").source == GRID
+    assert resolver.resolve_in_region("ABC", "K9") is None
+    # The grid K1 fix is kept for its own position even though its region key is taken
+    assert resolver.resolve("ABC", 10.5, 20.5).source == GRID
+
+
+def test_unusable_declination_loads_as_none():
+    resolver = FixResolver(make_db({
+        TERMINAL: [("ABC", "K1", "10.0", "20.0", ""), ("XYZ", "K1", "30.0", "40.0", "n/a")],
+    }))
+    assert resolver.resolve("ABC", 10.0, 20.0).declination is None
+    assert resolver.declination_at("XYZ", 30.0, 40.0) is None
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")
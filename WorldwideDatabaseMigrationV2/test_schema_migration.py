@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+rename_table on small in-memory tables: what a rebuild keeps, and the
+tables that fall back to ALTER.
+Run with pytest, or directly as a script.
+"""
+import sqlite3
+
+from schema_migration import ALTERED, REBUILT, alter_reason, rename_table
+
+
+def test_rebuild_keeps_rows_and_indexes():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE old (id INTEGER PRIMARY KEY, a TEXT NOT NULL DEFAULT 'x', b REAL)")
+    conn.execute("CREATE INDEX old_a ON old (a DESC)")
+    conn.executemany("INSERT INTO old VALUES (?, ?, ?)", [(5, "p", 1.0), (9, "q", None)])
+    assert rename_table(conn, "old", "new", [("a", "A2")]) == REBUILT
+    assert conn.execute('SELECT rowid, A2, b FROM new ORDER BY rowid').fetchall() == [(5, "p", 1.0), (9, "q", None)]
+    assert conn.execute("SELECT sql FROM sqlite_master WHERE name = 'old_a'").fetchone()[0] \
+        == 'CREATE INDEX "old_a" ON "new" ("A2" DESC)'
+
+
+def test_column_collation_falls_back_to_alter():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE old (a TEXT COLLATE NOCASE)")
+    conn.execute("INSERT INTO old VALUES ('X')")
+    assert alter_reason(conn, "old") == "column collation"
+    assert rename_table(conn, "old", "new", [("a", "A2")]) == ALTERED
+    assert conn.execute("SELECT COUNT(*) FROM new WHERE A2 = 'x'").fetchone()[0] == 1
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} passed")
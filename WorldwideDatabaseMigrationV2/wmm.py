@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Offline World Magnetic Model (WMM) evaluator.
+
+Reads the standard NOAA coefficient file (WMM.COF, shipped with every WMM
+release) and evaluates the spherical-harmonic expansion for whole NumPy
+arrays of positions at once. Filling the Declination column of a table is
+then one vectorised call instead of one HTTP request per fix to the
+ngdc.noaa.gov calculator.
+"""
+import os
+import datetime
+import numpy as np
+
+# Default coefficient file: WMM.COF next to this script, or $WMM_COF
+COF_PATH = os.environ.get(
+    "WMM_COF",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "WMM.COF")
+)
+
+# WGS84 ellipsoid (km) and the geomagnetic reference radius
+WGS84_A = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+REFERENCE_RADIUS = 6371.2
+
+
+def decimal_year(year, month, day):
+    """Convert a calendar date to a decimal year, as the NOAA calculator does."""
+    start = datetime.date(year, 1, 1)
+    days_in_year = (datetime.date(year + 1, 1, 1) - start).days
+    return year + (datetime.date(year, month, day) - start).days / days_in_year
+
+
+class MagneticModel:
+    """Gauss coefficients of one WMM release, evaluated with NumPy."""
+
+    def __init__(self, name, epoch, g, h, g_dot, h_dot):
+        self.name = name
+        self.epoch = epoch
+        self.g = g
+        self.h = h
+        self.g_dot = g_dot
+        self.h_dot = h_dot
+        self.nmax = g.shape[0] - 1
+        self._schmidt = self._schmidt_factors(self.nmax)
+
+    @classmethod
+    def from_cof(cls, path=COF_PATH):
+        """Load a WMM.COF file (header line, then ``n m g h gdot hdot`` rows)."""
+        if not os.path.isfile(path):
+            raise FileNotFoundError(
+                f"WMM coefficient file not found at {path}; download WMM.COF "
+                f"from NOAA or set $WMM_COF"
+            )
+        with open(path) as f:
+            header = f.readline().split()
+            epoch, name = float(header[0]), header[1]
+            terms = []
+            for line in f:
+                if line.startswith("9999"):
+                    break
+                parts = line.split()
+                if len(parts) < 6:
+                    continue
+                n, m = int(parts[0]), int(parts[1])
+                terms.append((n, m, *map(float, parts[2:6])))
+
+        nmax = max(t[0] for t in terms)
+        g, h, g_dot, h_dot = (np.zeros((nmax + 1, nmax + 1)) for _ in range(4))
+        for n, m, gnm, hnm, gd, hd in terms:
+            g[n, m], h[n, m], g_dot[n, m], h_dot[n, m] = gnm, hnm, gd, hd
+        return cls(name, epoch, g, h, g_dot, h_dot)
+
+    @staticmethod
+    def _schmidt_factors(nmax):
+        """Factors turning Gauss-normalised Legendre functions into Schmidt semi-normalised ones."""
+        s = np.zeros((nmax + 1, nmax + 1))
+        s[0, 0] = 1.0
+        for n in range(1, nmax + 1):
+            s[n, 0] = s[n - 1, 0] * (2 * n - 1) / n
+            for m in range(1, n + 1):
+                s[n, m] = s[n, m - 1] * np.sqrt((n - m + 1) * (2 if m == 1 else 1) / (n + m))
+        return s
+
+    def field(self, lat, lon, year, alt_km=0.0):
+        """
+        Return the geodetic (X north, Y east, Z down) field in nT for arrays of
+        geodetic latitude/longitude (degrees), decimal year and altitude (km).
+        """
+        lat, lon, year, alt_km = np.broadcast_arrays(
+            np.asarray(lat, dtype=float), np.asarray(lon, dtype=float),
+            np.asarray(year, dtype=float), np.asarray(alt_km, dtype=float)
+        )
+        phi = np.radians(lat)
+        lam = np.radians(lon)
+        sin_phi, cos_phi = np.sin(phi), np.cos(phi)
+
+        # Geodetic -> geocentric spherical coordinates
+        rc = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_phi ** 2)
+        p = (rc + alt_km) * cos_phi
+        z = (rc * (1 - WGS84_E2) + alt_km) * sin_phi
+        r = np.hypot(p, z)
+        phi_c = np.arcsin(z / r)
+
+        # Colatitude terms; nudge the poles so the east component stays finite
+        cos_t = np.sin(phi_c)
+        sin_t = np.maximum(np.cos(phi_c), 1e-12)
+
+        dt = year - self.epoch
+        ratio = REFERENCE_RADIUS / r
+        nmax = self.nmax
+
+        # Gauss-normalised associated Legendre functions and their theta derivatives
+        P = [[None] * (nmax + 1) for _ in range(nmax + 1)]
+        dP = [[None] * (nmax + 1) for _ in range(nmax + 1)]
+        P[0][0] = np.ones_like(cos_t)
+        dP[0][0] = np.zeros_like(cos_t)
+        cos_ml = [np.cos(m * lam) for m in range(nmax + 1)]
+        sin_ml = [np.sin(m * lam) for m in range(nmax + 1)]
+
+        x = np.zeros_like(cos_t)
+        y = np.zeros_like(cos_t)
+        zc = np.zeros_like(cos_t)
+        ar_n = ratio ** 2
+
+        for n in range(1, nmax + 1):
+            ar_n = ar_n * ratio
+            for m in range(n + 1):
+                if n == m:
+                    P[n][m] = sin_t * P[n - 1][m - 1]
+                    dP[n][m] = sin_t * dP[n - 1][m - 1] + cos_t * P[n - 1][m - 1]
+                elif n == 1 or m == n - 1:
+                    P[n][m] = cos_t * P[n - 1][m]
+                    dP[n][m] = cos_t * dP[n - 1][m] - sin_t * P[n - 1][m]
+                else:
+                    k = ((n - 1) ** 2 - m ** 2) / ((2 * n - 1) * (2 * n - 3))
+                    P[n][m] = cos_t * P[n - 1][m] - k * P[n - 2][m]
+                    dP[n][m] = cos_t * dP[n - 1][m] - sin_t * P[n - 1][m] - k * dP[n - 2][m]
+
+                gnm = self.g[n, m] + dt * self.g_dot[n, m]
+                hnm = self.h[n, m] + dt * self.h_dot[n, m]
+                s = self._schmidt[n, m]
+                t1 = gnm * cos_ml[m] + hnm * sin_ml[m]
+                t2 = gnm * sin_ml[m] - hnm * cos_ml[m]
+
+                x += ar_n * t1 * s * dP[n][m]
+                y += ar_n * m * t2 * s * P[n][m] / sin_t
+                zc -= (n + 1) * ar_n * t1 * s * P[n][m]
+
+        # Rotate from geocentric back to geodetic axes
+        psi = phi_c - phi
+        x_geo = x * np.cos(psi) - zc * np.sin(psi)
+        z_geo = x * np.sin(psi) + zc * np.cos(psi)
+        return x_geo, y, z_geo
+
+    def declination(self, lat, lon, year, alt_km=0.0):
+        """Declination in degrees (east positive) for arrays of positions."""
+        x, y, _ = self.field(lat, lon, year, alt_km)
+        return np.degrees(np.arctan2(y, x))
+
+
+_default_model = None
+
+
+def load_model(path=None):
+    """Load (and memoise) the default WMM coefficients."""
+    global _default_model
+    if path is not None:
+        return MagneticModel.from_cof(path)
+    if _default_model is None:
+        _default_model = MagneticModel.from_cof()
+    return _default_model
+
+
+def declination(lat, lon, year, alt_km=0.0):
+    """Declination in degrees for arrays of lat/lon using the default model."""
+    return load_model().declination(lat, lon, year, alt_km)
@@ -0,0 +1,16 @@
+import os
+import sys
+
+# Helpers the Airops importers share with the worldwide migration scripts:
+# the row fingerprint store, sheet cache, audit log and the Excel readers
+# and writers. They live in WorldwideDatabaseMigration/ and import each other
+# by name, so that folder goes on sys.path here, once for both importers.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "WorldwideDatabaseMigration"))
+
+from audit_log import RejectLog  # noqa: E402
+from excel_loader import insert_sql, map_excel_columns, stream_into_table  # noqa: E402
+from row_fingerprints import (  # noqa: E402
+    CHANGED, INSERTED, KEY_SEP, apply_delta, classify_rows, ensure_fingerprint_table, has_ident, log_delta,
+    record_fingerprints, row_hashes, row_keys, usable_rows,
+)
+from sheet_cache import read_excel_cached  # noqa: E402